@@ -5,7 +5,7 @@ from api.data import on_startup, on_shutdown
 from api.endpoints import (authservice, roleservice, userservice, tournaments, tournament_registration, 
                            tournament_placements, player_registry, player_bans, team_registry, 
                            user_settings, notifications, moderation, posts, admin, time_trials)
-from api.utils.middleware import IPLoggingMiddleware, RateLimitByIPMiddleware, ProblemExceptionMiddleware, exception_handlers
+from api.utils.middleware import DBRequestScopeMiddleware, IPLoggingMiddleware, RateLimitByIPMiddleware, ProblemExceptionMiddleware, exception_handlers
 from api.utils.schema_gen import schema_route
 from opentelemetry.instrumentation.starlette import StarletteInstrumentor
 
@@ -40,6 +40,7 @@ routes = [
 
 middleware = [
     Middleware(ProblemExceptionMiddleware),
+    Middleware(DBRequestScopeMiddleware),
     Middleware(IPLoggingMiddleware),
     Middleware(RateLimitByIPMiddleware),
 ]
@@ -7,6 +7,8 @@ config = Config()
 DEBUG = config("DEBUG", cast=bool, default=False)
 RESET_DATABASE = config("RESET_DATABASE", cast=bool, default=False)
 RESET_DUCK_DB = config("RESET_DUCK_DB", cast=bool, default=False)
+DUCKDB_THREADS = config("DUCKDB_THREADS", cast=int, default=None)
+DUCKDB_MEMORY_LIMIT = config("DUCKDB_MEMORY_LIMIT", default=None)
 S3_ACCESS_KEY = config("S3_ACCESS_KEY")
 S3_SECRET_KEY = config("S3_SECRET_KEY", cast=Secret)
 S3_ENDPOINT = config("S3_ENDPOINT")
@@ -1,5 +1,8 @@
+import asyncio
+import logging
+import time
 from api import appsettings
-from common.auth import pw_hasher
+from common.auth import pw_hashing_pool
 from common.data.command_handler import CommandHandler
 from common.data.commands import *
 from common.data.db.utils import get_db_paths
@@ -35,12 +38,38 @@ _command_handler = CommandHandler(
     appsettings.DISCORD_CLIENT_ID,
     str(appsettings.DISCORD_CLIENT_SECRET),
     appsettings.DISCORD_OAUTH_CALLBACK,
-    email_service
+    email_service,
+    duckdb_threads=appsettings.DUCKDB_THREADS,
+    duckdb_memory_limit=appsettings.DUCKDB_MEMORY_LIMIT
 )
 
+PLAYERS_DIM_SYNC_SECONDS = 10
+PLAYERS_DIM_FULL_SYNC_SECONDS = 60 * 60
+
+_players_dim_task: asyncio.Task[None] | None = None
+
 async def handle[T](command: Command[T]) -> T:
     return await _command_handler.handle(command)
 
+def request_scope():
+    return _command_handler.request_scope()
+
+async def _sync_players_dim():
+    """
+    Keep DuckDB's copy of the players table up to date. This runs in the API rather than the worker
+    since DuckDB only allows one process to open the database for writing.
+    """
+    last_full_sync = time.monotonic()
+    while True:
+        await asyncio.sleep(PLAYERS_DIM_SYNC_SECONDS)
+        full = time.monotonic() - last_full_sync >= PLAYERS_DIM_FULL_SYNC_SECONDS
+        try:
+            await handle(SyncPlayersDimCommand(full=full))
+            if full:
+                last_full_sync = time.monotonic()
+        except Exception:
+            logging.exception("Failed to sync players_dim")
+
 async def on_startup():
     await _command_handler.__aenter__()
 
@@ -49,6 +78,7 @@ async def on_startup():
         for db_name in db_paths.keys():
             await handle(ResetDbCommand(db_name=db_name))
     await handle(UpdateDbSchemaCommand())
+    await handle(RefreshAltFlagCountsCommand())
     
     if appsettings.RESET_DUCK_DB:
         await handle(ResetDuckDbCommand())
@@ -56,13 +86,20 @@ async def on_startup():
     await handle(SetupDuckDBSchemaCommand())
 
     # Seed DB
-    hashed_pw = pw_hasher.hash(str(appsettings.ADMIN_PASSWORD))
+    hashed_pw = await pw_hashing_pool.hash(str(appsettings.ADMIN_PASSWORD))
     await handle(SeedDatabasesCommand(appsettings.ADMIN_EMAIL, hashed_pw))
 
     # Initialize S3
     if appsettings.ENV == "Development":
         await handle(InitializeS3BucketsCommand())
 
+    await handle(SyncPlayersDimCommand(full=True))
+    global _players_dim_task
+    _players_dim_task = asyncio.create_task(_sync_players_dim())
+
 
 async def on_shutdown():
-    await _command_handler.__aexit__(None, None, None)
\ No newline at end of file
+    if _players_dim_task is not None:
+        _players_dim_task.cancel()
+    await _command_handler.__aexit__(None, None, None)
+    pw_hashing_pool.shutdown()
\ No newline at end of file
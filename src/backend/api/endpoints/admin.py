@@ -1,7 +1,7 @@
 from starlette.requests import Request
 from starlette.routing import Route
 from api.auth import require_permission
-from api.utils.responses import JSONResponse
+from api.utils.responses import JSONResponse, bind_request_query
 from api.data import handle
 from common.data.models import *
 from common.data.commands import *
@@ -12,6 +12,21 @@ async def create_db_backup(request: Request) -> JSONResponse:
     await handle(BackupDatabasesCommand())
     return JSONResponse({})
 
+@bind_request_query(TimeTrialImportFilter)
+@require_permission(permissions.IMPORT_V1_DATA)
+async def import_time_trials(request: Request, filter: TimeTrialImportFilter) -> JSONResponse:
+    """Bulk import time trials from a CSV or newline-delimited JSON request body, which is read as it is received."""
+    result = await handle(ImportTimeTrialsCommand(request.stream(), filter.format, filter.dry_run))
+    return JSONResponse(result)
+
+@require_permission(permissions.RUN_WORKER_JOBS)
+async def run_worker_job(request: Request) -> JSONResponse:
+    """Ask the worker to run a job now instead of waiting for its next scheduled run."""
+    await handle(RequestJobRunCommand(request.path_params['job_name']))
+    return JSONResponse({})
+
 routes: list[Route] = [
     Route('/api/admin/db_backup', create_db_backup, methods=["POST"]),
+    Route('/api/admin/time_trials/import', import_time_trials, methods=["POST"]),
+    Route('/api/admin/worker/jobs/{job_name:str}/run', run_worker_job, methods=["POST"]),
 ]
\ No newline at end of file
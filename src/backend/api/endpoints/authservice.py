@@ -7,7 +7,7 @@ from api.auth import require_logged_in, require_permission
 from api.data import handle
 from api.utils.responses import JSONResponse, bind_request_body, bind_request_query
 from api import appsettings
-from common.auth import pw_hasher, permissions
+from common.auth import pw_hashing_pool, permissions
 from common.data.commands import *
 from common.data.models import *
 from urllib.parse import urlencode
@@ -17,19 +17,20 @@ from urllib.parse import urlencode
 async def log_in(request: Request, body: LoginRequestData) -> Response:
     time = datetime.now(timezone.utc)
     user = await handle(GetUserDataFromEmailCommand(body.email))
+    outdated_password_hash: str | None = None
     if user:
         if user.password_hash is None:
             raise Problem("Invalid login details", status=401)
-        try:
-            pw_hasher.verify(user.password_hash, body.password)
-        except:
+        if not await pw_hashing_pool.verify(user.password_hash, body.password):
             raise Problem("Invalid login details", status=401)
+        if pw_hashing_pool.check_needs_rehash(user.password_hash):
+            outdated_password_hash = user.password_hash
     else:
         # check MKC V1 data for the email/password combo if user can't be found in the database
         mkc_user = await handle(GetMKCV1UserCommand(body.email))
-        password_hash = pw_hasher.hash(body.password)
         if mkc_user is None:
             raise Problem("User not found", status=404)
+        password_hash = await pw_hashing_pool.hash(body.password)
         # create new user with MKC V1 user's data if it exists
         user = await handle(TransferMKCV1UserCommand(body.email, password_hash, mkc_user.register_date,
                                                      mkc_user.player_id, mkc_user.about_me,
@@ -55,6 +56,10 @@ async def log_in(request: Request, body: LoginRequestData) -> Response:
             referer = request.headers.get('Referer', None)
             await handle(EnqueueUserActivityCommand(user.id, ip_address, request.url.path, time, referer))
         await handle(LogFingerprintCommand(body.fingerprint))
+        # upgrade the stored hash if it was made with older hashing parameters, now that we know the password
+        if outdated_password_hash:
+            new_password_hash = await pw_hashing_pool.hash(body.password)
+            await handle(UpdatePasswordHashCommand(user.id, outdated_password_hash, new_password_hash))
         
     resp = JSONResponse(return_user, status_code=200, background=BackgroundTask(log_ip_fingerprint))
     resp.set_cookie('session', session.session_id, max_age=int(session.max_age.total_seconds()), secure=appsettings.SECURE_HTTP_COOKIES, httponly=True)
@@ -69,7 +74,7 @@ async def sign_up(request: Request, body: SignupRequestData) -> Response:
     if existing_user:
         raise Problem("User with this email already exists", status=400)
     email = body.email # TODO: Email Verification
-    password_hash = pw_hasher.hash(body.password)
+    password_hash = await pw_hashing_pool.hash(body.password)
     # if this is a user from the old MKC site trying to create a new account,
     # import all the data from their old MKC account, and send them a password
     # reset email. don't log them in until their password is reset, just return the user info.
@@ -150,7 +155,7 @@ async def check_password_reset_token(request: Request, body: CheckPasswordTokenR
 
 @bind_request_body(ResetPasswordTokenRequestData)
 async def reset_password_with_token(request: Request, body: ResetPasswordTokenRequestData) -> Response:
-    new_password_hash = pw_hasher.hash(body.new_password)
+    new_password_hash = await pw_hashing_pool.hash(body.new_password)
     command = ResetPasswordWithTokenCommand(body.token_id, new_password_hash)
     await handle(command)
     return Response(status_code=204)
@@ -158,7 +163,7 @@ async def reset_password_with_token(request: Request, body: ResetPasswordTokenRe
 @bind_request_body(ResetPasswordRequestData)
 @require_logged_in()
 async def reset_password(request: Request, body: ResetPasswordRequestData) -> Response:
-    new_pw_hash = pw_hasher.hash(body.new_password)
+    new_pw_hash = await pw_hashing_pool.hash(body.new_password)
     command = ResetPasswordCommand(request.state.user.id, body.old_password, new_pw_hash)
     await handle(command)
     return Response(status_code=204)
@@ -36,6 +36,12 @@ async def view_player_alt_flags(request: Request, body: PlayerAltFlagRequestData
     flags = await handle(ViewPlayerAltFlagsCommand(body.player_id, body.exclude_fingerprints))
     return JSONResponse(flags)
 
+@require_permission(permissions.VIEW_ALT_FLAGS)
+async def view_player_alt_cluster(request: Request) -> JSONResponse:
+    player_id = request.path_params['player_id']
+    cluster = await handle(ViewPlayerAltClusterCommand(player_id))
+    return JSONResponse(cluster)
+
 @require_permission(permissions.VIEW_USER_LOGINS)
 async def view_player_user_logins(request: Request) -> JSONResponse:
     player_id = request.path_params['player_id']
@@ -80,6 +86,7 @@ routes: list[Route] = [
     Route('/api/moderator/friendCodeEdits', list_friend_code_edits),
     Route('/api/moderator/altFlags', list_alt_flags),
     Route('/api/moderator/playerAltFlags', view_player_alt_flags),
+    Route('/api/moderator/playerAltCluster/{player_id:int}', view_player_alt_cluster),
     Route('/api/moderator/player_logins/{player_id:int}', view_player_user_logins),
     Route('/api/moderator/player_ips/{player_id:int}', view_player_ip_history),
     Route('/api/moderator/ip_addresses/{ip_id:int}', view_ip_history),
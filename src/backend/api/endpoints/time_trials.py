@@ -155,34 +155,42 @@ async def mark_proof_valid_endpoint(request: Request, body: MarkProofValidReques
     return JSONResponse(result)
 
 
+@bind_request_query(ProofValidationQueueFilter)
 @require_permission(permissions.VALIDATE_TIME_TRIAL_PROOF)
-async def list_proofs_for_validation_endpoint(request: Request) -> JSONResponse:
+async def list_proofs_for_validation_endpoint(request: Request, filter: ProofValidationQueueFilter) -> JSONResponse:
     """
-    List all proofs requiring validation, along with the status of their properties.
+    List a page of the proofs requiring validation, oldest first, optionally filtered by game and track.
     Requires VALIDATE_TIME_TRIAL_PROOF permission.
     """
-    command = ListProofsForValidationCommand()
+    command = ListProofsForValidationCommand(filter)
     result: ListProofsForValidationResponseData = await handle(command)
     return JSONResponse(result)
 
+@bind_request_query(ProofValidationQueueFilter)
+@require_permission(permissions.VALIDATE_TIME_TRIAL_PROOF)
+async def count_proofs_for_validation_endpoint(request: Request, filter: ProofValidationQueueFilter) -> JSONResponse:
+    """
+    Count the proofs requiring validation, optionally filtered by game and track.
+    Requires VALIDATE_TIME_TRIAL_PROOF permission.
+    """
+    command = CountProofsForValidationCommand(filter.game, filter.track)
+    count = await handle(command)
+    return JSONResponse(ProofValidationQueueCountResponseData(count))
+
 @bind_request_query(LeaderboardFilter)
 async def get_leaderboard(request: Request, filter: LeaderboardFilter) -> JSONResponse:
-    """Get leaderboard showing only each player's best time for tracks."""
-    
-    # Get game from query params or use provided one
-    game = filter.game if filter.game else request.query_params.get('game')
-    if not game:
+    """
+    Get a page of the leaderboard showing only each player's best time for tracks.
+    Pages can be selected by page number, by the cursor returned with the previous page,
+    or by a player ID to jump to the page containing that player's rank.
+    Setting country_code ranks only the players from that country.
+    """
+    if not filter.game:
         return JSONResponse({'error': 'Game parameter is required'}, status_code=400)
-    
-    command = GetLeaderboardCommand(
-        game=game,
-        track=filter.track,
-        include_unvalidated=filter.include_unvalidated,
-        include_proofless=filter.include_proofless,
-    )
-    
-    records = await handle(command)
-    return JSONResponse(LeaderboardResponseData(records), headers={"Cache-Control": "public, max-age=60"})
+
+    command = GetLeaderboardCommand(filter)
+    leaderboard = await handle(command)
+    return JSONResponse(leaderboard, headers={"Cache-Control": "public, max-age=60"})
 
 @bind_request_body(EditTimeTrialRequestData)
 @require_permission(permissions.SUBMIT_TIME_TRIAL, check_denied_only=True)
@@ -268,6 +276,11 @@ routes = [
         list_proofs_for_validation_endpoint,
         methods=["GET"],
     ),
+    Route(
+        "/api/time-trials/proofs/validation-queue/count",
+        count_proofs_for_validation_endpoint,
+        methods=["GET"],
+    ),
     Route(
         "/api/time-trials/{trial_id:str}/mark-invalid",  # New endpoint for marking entire time trial record as invalid
         mark_time_trial_invalid,
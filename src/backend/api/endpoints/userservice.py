@@ -5,7 +5,7 @@ from api.data import handle
 from api.utils.responses import JSONResponse, bind_request_body, bind_request_query
 from common.data.commands import *
 from common.data.models import UserPlayer, EditUserRequestData, Problem
-from common.auth import pw_hasher
+from common.auth import pw_hashing_pool
 
 @require_logged_in()
 async def current_user(request: Request) -> JSONResponse:
@@ -47,7 +47,7 @@ async def list_users(request: Request, body: UserFilter) -> JSONResponse:
 @require_permission(permissions.EDIT_USER)
 async def edit_user(request: Request, body: EditUserRequestData) -> JSONResponse:
     if body.password:
-        password_hash = pw_hasher.hash(body.password)
+        password_hash = await pw_hashing_pool.hash(body.password)
     else:
         password_hash = None
     command = EditUserCommand(request.state.user.id, body.user_id, body.email, password_hash, body.email_confirmed, body.force_password_reset)
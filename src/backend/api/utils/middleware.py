@@ -1,8 +1,6 @@
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
 from api.utils.responses import ProblemResponse
 from common.data.models import Problem
-from starlette.background import BackgroundTasks
-from api.data import handle
+from api.data import handle, request_scope
 from common.data.commands import *
 from api import appsettings
 from ratelimit.types import ASGIApp, Scope, Receive, Send
@@ -52,9 +50,37 @@ class ProblemExceptionMiddleware:
             response = ProblemResponse(problem)
             await response(scope, receive, send)
 
+
+class DBRequestScopeMiddleware:
+    """
+    Runs each request in a database request scope, so that all the commands it handles
+    (including the ones in its background tasks) reuse the same connection to each database
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        async with request_scope():
+            await self.app(scope, receive, send)
+
         
-class IPLoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint):
+class IPLoggingMiddleware:
+    """
+    Records the client's IP address in the request state, and once the response has been sent,
+    logs the activity of the logged in user on POST requests and the /api/user/me endpoints
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
         time = datetime.now(timezone.utc)
         path = request.url.path
         
@@ -78,44 +104,33 @@ class IPLoggingMiddleware(BaseHTTPMiddleware):
 
         request.state.ip_address = ip_address
         
-        response = await call_next(request)
-        
-        async def log_activity():
-            if not appsettings.ENABLE_IP_LOGGING:
-                return
-            
-            # Try to get user from request.state first (might be set by auth middleware)
-            user = getattr(request.state, 'user', None)
-            if user is None:
-                # If not available, check session and get user info
-                session_id = request.cookies.get("session", None)
-                if not session_id:
-                    return
-                user = await handle(GetUserIdFromSessionCommand(session_id))
-                if not user:
-                    return
-                
-            # Get referer header if available
-            referer = request.headers.get('Referer', None)
-            # Log to activity queue instead of directly processing
-            await handle(EnqueueUserActivityCommand(
-                user_id=user.id,
-                ip_address=ip_address,
-                path=path,
-                timestamp=time,
-                referer=referer
-            ))
-        
-        # Only log for POST requests and specific endpoints
+        await self.app(scope, receive, send)
+
         if should_log:
-            tasks = BackgroundTasks()
-            if response.background:
-                tasks.add_task(response.background)
-                
-            tasks.add_task(log_activity)
-            response.background = tasks
+            await self.log_activity(request, ip_address, path, time)
+
+    async def log_activity(self, request: Request, ip_address: str | None, path: str, time: datetime):
+        # Try to get user from request.state first (set by the endpoint's auth decorators)
+        user = getattr(request.state, 'user', None)
+        if user is None:
+            # If not available, check session and get user info
+            session_id = request.cookies.get("session", None)
+            if not session_id:
+                return
+            user = await handle(GetUserIdFromSessionCommand(session_id))
+            if not user:
+                return
             
-        return response
+        # Get referer header if available
+        referer = request.headers.get('Referer', None)
+        # Hand off to the activity buffer, which writes to the activity queue in batches
+        await handle(EnqueueUserActivityCommand(
+            user_id=user.id,
+            ip_address=ip_address,
+            path=path,
+            timestamp=time,
+            referer=referer
+        ))
 
 class RateLimitByIPMiddleware:
     async def auth_function(self, scope: Scope):
@@ -1,3 +1,5 @@
 from argon2 import PasswordHasher
+from common.auth.password_hashing import PasswordHashingPool
 
-pw_hasher = PasswordHasher()
\ No newline at end of file
+pw_hasher = PasswordHasher()
+pw_hashing_pool = PasswordHashingPool(pw_hasher)
\ No newline at end of file
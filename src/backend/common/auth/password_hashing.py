@@ -0,0 +1,78 @@
+"""
+Runs Argon2 password hashing off the event loop. Argon2 is deliberately slow and memory hungry,
+so hashing on the event loop would stall every other request while a password is checked.
+"""
+
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import time
+
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+
+from common.data.models import Problem
+from common.telemetry import get_meter
+
+meter = get_meter(__name__)
+
+hash_duration = meter.create_histogram(
+    "auth.password_hashing.duration",
+    unit="ms",
+    description="Time spent hashing or verifying a password, including time queued for a worker",
+)
+hash_rejections = meter.create_counter(
+    "auth.password_hashing.rejections",
+    description="Number of password hashing operations rejected because too many were already queued",
+)
+
+
+class PasswordHashingPool:
+    """
+    Hashes and verifies passwords on a dedicated thread pool of max_workers threads, which is
+    what limits how many run at once. argon2-cffi releases the GIL while hashing, so these
+    threads run in parallel with the event loop. At most max_queued operations can be waiting
+    for a thread; past that, new ones are rejected with a 503 instead of growing the backlog.
+    """
+
+    def __init__(self, hasher: PasswordHasher, max_workers: int | None = None, max_queued: int = 64):
+        self.hasher = hasher
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.max_queued = max_queued
+        self._pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="password-hashing")
+
+    async def _run[T](self, operation: str, func: Callable[[], T]) -> T:
+        if self._pending >= self.max_workers + self.max_queued:
+            hash_rejections.add(1, {"auth.operation": operation})
+            raise Problem("Too many requests are being processed right now, please try again shortly", status=503)
+        self._pending += 1
+        start = time.monotonic()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func)
+        finally:
+            self._pending -= 1
+            hash_duration.record((time.monotonic() - start) * 1000, {"auth.operation": operation})
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", lambda: self.hasher.hash(password))
+
+    async def verify(self, password_hash: str, password: str) -> bool:
+        """Returns whether the password matches the hash, treating an invalid hash as not matching."""
+        def verify() -> bool:
+            try:
+                return self.hasher.verify(password_hash, password)
+            except (VerificationError, InvalidHashError):
+                return False
+        return await self._run("verify", verify)
+
+    def check_needs_rehash(self, password_hash: str) -> bool:
+        """Whether a hash was made with different parameters than the hasher's current ones. This is cheap, so it runs inline."""
+        try:
+            return self.hasher.check_needs_rehash(password_hash)
+        except InvalidHashError:
+            return False
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -30,6 +30,7 @@ VIEW_FINGERPRINTS = "fingerprints_view"
 CREATE_DB_BACKUPS = "db_backup_create"
 SUBMIT_TIME_TRIAL = "time_trial_submit"
 VALIDATE_TIME_TRIAL_PROOF = "time_trial_proof_validate"
+RUN_WORKER_JOBS = "worker_jobs_run"
 
 permissions_by_id: dict[int, str] = {
     0: CREATE_USER_ROLES,
@@ -85,6 +86,7 @@ permissions_by_id: dict[int, str] = {
     50: CREATE_DB_BACKUPS,
     51: SUBMIT_TIME_TRIAL,
     52: VALIDATE_TIME_TRIAL_PROOF,
+    53: RUN_WORKER_JOBS,
 }
 
 id_by_permissions = { v: k for k, v in permissions_by_id.items() }
\ No newline at end of file
@@ -56,6 +56,7 @@ default_permissions_by_default_role: dict[str, list[str]] = {
         permissions.VIEW_IP_ADDRESSES,
         permissions.VIEW_FINGERPRINTS,
         permissions.CREATE_DB_BACKUPS,
+        permissions.RUN_WORKER_JOBS,
         permissions.VALIDATE_TIME_TRIAL_PROOF,
         team_permissions.EDIT_TEAM_NAME_TAG,
         team_permissions.EDIT_TEAM_INFO,
@@ -103,6 +104,7 @@ default_permissions_by_default_role: dict[str, list[str]] = {
         permissions.VIEW_IP_ADDRESSES,
         permissions.VIEW_FINGERPRINTS,
         permissions.CREATE_DB_BACKUPS,
+        permissions.RUN_WORKER_JOBS,
         permissions.VALIDATE_TIME_TRIAL_PROOF,
         team_permissions.EDIT_TEAM_NAME_TAG,
         team_permissions.EDIT_TEAM_INFO,
@@ -0,0 +1,127 @@
+"""
+In-process buffer of user activity records, so that logging a request's activity doesn't need a
+database connection of its own.
+"""
+
+from collections import deque
+from dataclasses import dataclass
+import asyncio
+import contextvars
+import logging
+
+from common.data.db import DBWrapper
+from common.telemetry import get_meter
+
+logger = logging.getLogger(__name__)
+meter = get_meter(__name__)
+
+flushed_records = meter.create_counter(
+    "user_activity.buffer.flushed",
+    description="Number of user activity records written to the activity queue",
+)
+dropped_records = meter.create_counter(
+    "user_activity.buffer.dropped",
+    description="Number of user activity records dropped, either because the buffer was full or because writing them failed",
+)
+flush_size = meter.create_histogram(
+    "user_activity.buffer.flush_size",
+    description="Number of user activity records written by each flush of the buffer",
+)
+
+
+@dataclass
+class UserActivityRecord:
+    user_id: int
+    ip_address: str
+    path: str
+    timestamp: int
+    referer: str | None
+
+
+class UserActivityBuffer:
+    """
+    Collects user activity records in memory and writes them to user_activity_queue in a single
+    transaction once flush_size records have been collected or flush_interval seconds after the
+    last flush, whichever comes first. The task which flushes the buffer is started the first
+    time a record is added.
+
+    At most max_size records are kept. Past that the oldest records are dropped, which also
+    happens to records which couldn't be written back into a full buffer after a failed flush.
+    Records still in the buffer are written when it is closed.
+    """
+
+    def __init__(self, db_wrapper: DBWrapper, flush_size: int = 500, flush_interval: float = 1, max_size: int = 50000):
+        self._db_wrapper = db_wrapper
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self._records: deque[UserActivityRecord] = deque(maxlen=max_size)
+        self._flush_needed = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task[None] | None = None
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def add(self, record: UserActivityRecord):
+        if len(self._records) == self.max_size:
+            dropped_records.add(1, {"reason": "full"})
+        self._records.append(record)
+        if len(self._records) >= self.flush_size:
+            self._flush_needed.set()
+        if self._task is None or self._task.done():
+            # the task outlives the request which starts it, so it mustn't inherit the request's context,
+            # otherwise every flush would check out connections through that request's DBRequestScope
+            self._task = asyncio.create_task(self._run(), name="user activity buffer", context=contextvars.Context())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_needed.wait(), self.flush_interval)
+            except TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to flush user activity buffer")
+
+    async def flush(self):
+        async with self._flush_lock:
+            self._flush_needed.clear()
+            if not self._records:
+                return
+            records = list(self._records)
+            self._records.clear()
+            try:
+                async with self._db_wrapper.connect(db_name='user_activity_queue') as db:
+                    await db.executemany(
+                        """
+                        INSERT INTO user_activity_queue(user_id, ip_address, path, timestamp, referer)
+                        VALUES(?, ?, ?, ?, ?)
+                        """,
+                        [(r.user_id, r.ip_address, r.path, r.timestamp, r.referer) for r in records]
+                    )
+                    await db.commit()
+            except BaseException:
+                # put the records back in front of the ones added since, keeping the newest if they don't all fit
+                kept = records[-(self.max_size - len(self._records)):] if len(self._records) < self.max_size else []
+                if len(kept) < len(records):
+                    dropped_records.add(len(records) - len(kept), {"reason": "flush_failed"})
+                self._records.extendleft(reversed(kept))
+                raise
+            flushed_records.add(len(records))
+            flush_size.record(len(records))
+
+    async def close(self):
+        """Stops the flush task and writes whatever is left in the buffer."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception(f"Failed to flush user activity buffer on shutdown, {len(self._records)} records lost")
@@ -15,6 +15,11 @@ from common.data.command import Command
 from common.data.db import DBWrapper
 from common.data.s3 import S3Wrapper, S3WrapperManager
 from common.data.duckdb.wrapper import DuckDBWrapper
+from common.data.duckdb.leaderboards import LeaderboardCache
+from common.data.player_cache import PlayerSummaryCache
+from common.data.permission_cache import PermissionCache
+from common.data.session_cache import SessionCache
+from common.data.activity_buffer import UserActivityBuffer
 from opentelemetry import trace
 
 from common.discord import DiscordApi
@@ -36,17 +41,25 @@ class CommandHandler:
             discord_client_secret: str,
             discord_oauth_redirect_uri: str | None = None,
             email_service: EmailService | None = None,
-            additional_command_modules: list[str] | None = None) -> None:
+            additional_command_modules: list[str] | None = None,
+            duckdb_threads: int | None = None,
+            duckdb_memory_limit: str | None = None) -> None:
         # Setup DuckDB database
         duckdb_dir = os.path.join(db_directory, "duckdb")
         pathlib.Path(duckdb_dir).mkdir(parents=True, exist_ok=True)
         duckdb_path = os.path.join(duckdb_dir, "time_trials.duckdb")
-        self._duckdb_wrapper = DuckDBWrapper(duckdb_path)
+        self._duckdb_wrapper = DuckDBWrapper(duckdb_path, threads=duckdb_threads, memory_limit=duckdb_memory_limit)
+
+        self._leaderboard_cache = LeaderboardCache(self._duckdb_wrapper)
 
         logger.info(f"Initializing command handler with DuckDB at {duckdb_path}")
         
         # Initialize database wrappers
         self._db_wrapper = DBWrapper(db_paths)
+        self._player_cache = PlayerSummaryCache(self._db_wrapper)
+        self._session_cache = SessionCache()
+        self._permission_cache = PermissionCache(self._db_wrapper)
+        self._activity_buffer = UserActivityBuffer(self._db_wrapper)
         
         # Initialize S3 wrapper manager  
         self._s3_wrapper_manager = S3WrapperManager(str(s3_secret_key), s3_access_key, s3_endpoint)
@@ -112,6 +125,16 @@ class CommandHandler:
                     dependencies[name] = get_s3_wrapper
                 elif expected_type == DuckDBWrapper:
                     dependencies[name] = lambda: self._duckdb_wrapper
+                elif expected_type == LeaderboardCache:
+                    dependencies[name] = lambda: self._leaderboard_cache
+                elif expected_type == PlayerSummaryCache:
+                    dependencies[name] = lambda: self._player_cache
+                elif expected_type == SessionCache:
+                    dependencies[name] = lambda: self._session_cache
+                elif expected_type == PermissionCache:
+                    dependencies[name] = lambda: self._permission_cache
+                elif expected_type == UserActivityBuffer:
+                    dependencies[name] = lambda: self._activity_buffer
                 elif expected_type == DiscordApi:
                     dependencies[name] = lambda: self._discord_api
                 elif expected_type == CommandHandler:
@@ -139,6 +162,13 @@ class CommandHandler:
         if self._s3_wrapper is not None:
             await self._s3_wrapper_manager.__aexit__(*args)
         self._s3_wrapper = None
+        await self._activity_buffer.close()
+        await self._db_wrapper.close()
+        await self._duckdb_wrapper.close()
+
+    def request_scope(self):
+        """Lends the same database connections to every command handled within the block, see DBRequestScope."""
+        return self._db_wrapper.request_scope()
 
     async def handle[T](self, command: Command[T]) -> T:
         if self._s3_wrapper is None:
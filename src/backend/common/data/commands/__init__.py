@@ -36,6 +36,7 @@ from common.data.commands.teams.rosters import *
 from common.data.commands.teams.teams import *
 from common.data.commands.teams.transfers import *
 
+from common.data.commands.time_trials.imports import *
 from common.data.commands.time_trials.time_trials import *
 
 from common.data.commands.tournaments.placements import *
@@ -52,4 +53,6 @@ from common.data.commands.users.notifications import *
 from common.data.commands.users.settings import *
 from common.data.commands.users.users import *
 
-from common.data.commands.worker.job_state import *
\ No newline at end of file
+from common.data.commands.worker.job_state import *
+from common.data.commands.worker.job_run_requests import *
+from common.data.commands.worker.table_changes import *
\ No newline at end of file
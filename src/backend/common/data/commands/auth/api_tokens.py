@@ -2,6 +2,7 @@ from dataclasses import dataclass
 from common.data.command import Command
 from common.data.db import DBWrapper
 from common.data.models import *
+from common.data.session_cache import SessionCache
 import secrets
 
 @dataclass
@@ -44,7 +45,7 @@ class DeleteAPITokenCommand(Command[None]):
     token_id: str
     user_id: int
 
-    async def handle(self, db_wrapper: DBWrapper):
+    async def handle(self, db_wrapper: DBWrapper, session_cache: SessionCache):
         async with db_wrapper.connect(db_name="auth") as db:
             async with db.execute("SELECT token_id FROM api_tokens WHERE token_id = ? AND user_id = ?", (self.token_id, self.user_id)) as cursor:
                 row = await cursor.fetchone()
@@ -52,26 +53,32 @@ class DeleteAPITokenCommand(Command[None]):
                     raise Problem("Token not found", status=404)
             await db.execute("DELETE FROM api_tokens WHERE token_id = ? AND user_id = ?", (self.token_id, self.user_id))
             await db.commit()
+        session_cache.invalidate("token", self.token_id)
 
 @dataclass
 class GetUserFromAPITokenCommand(Command[User | None]):
     token_id: str
-    async def handle(self, db_wrapper: DBWrapper):
+    async def handle(self, db_wrapper: DBWrapper, session_cache: SessionCache):
+        user = session_cache.get("token", self.token_id)
+        if user is not None:
+            return user
 
-        async with db_wrapper.connect(db_name="main", attach=["auth"]) as db:
+        async with db_wrapper.connect(db_name="main", attach=["auth"], readonly=True) as db:
             async with db.execute("SELECT u.id, u.player_id FROM users u JOIN auth.api_tokens a ON u.id = a.user_id WHERE token_id = ?", (self.token_id,)) as cursor:
                 row = await cursor.fetchone()
                 if not row:
                     return None
                 user_id, player_id = row
-                return User(int(user_id), player_id)
+        user = User(int(user_id), player_id)
+        session_cache.set("token", self.token_id, user)
+        return user
 
 @dataclass
 class GetUserAPITokensCommand(Command[list[APIToken]]):
     user_id: int
 
     async def handle(self, db_wrapper: DBWrapper):
-        async with db_wrapper.connect(db_name="auth") as db:
+        async with db_wrapper.connect(db_name="auth", readonly=True) as db:
             async with db.execute("SELECT token_id, user_id, name FROM api_tokens WHERE user_id = ?", (self.user_id,)) as cursor:
                 rows = await cursor.fetchall()
                 tokens: list[APIToken] = []
@@ -5,6 +5,7 @@ from common.data import notifications
 from common.data.command import Command
 from common.data.db import DBWrapper
 from common.data.models import *
+from common.data.permission_cache import PermissionCache
 from common.data import notifications
 
 @dataclass
@@ -211,7 +212,7 @@ class GrantRoleCommand(Command[None]):
     expires_on: int | None = None
     is_ban: bool = False
 
-    async def handle(self, db_wrapper: DBWrapper) -> None:
+    async def handle(self, db_wrapper: DBWrapper, permission_cache: PermissionCache) -> None:
         async with db_wrapper.connect() as db:
             timestamp = int(datetime.now(timezone.utc).timestamp())
             if self.expires_on and self.expires_on < timestamp:
@@ -263,6 +264,7 @@ class GrantRoleCommand(Command[None]):
                 await db.commit()
             except Exception:
                 raise Problem("Unexpected error")
+            permission_cache.invalidate_user(target_user_id)
             
 @dataclass
 class RemoveRoleCommand(Command[None]):
@@ -271,7 +273,7 @@ class RemoveRoleCommand(Command[None]):
     role: str
     is_ban: bool = False
 
-    async def handle(self, db_wrapper: DBWrapper) -> None:
+    async def handle(self, db_wrapper: DBWrapper, permission_cache: PermissionCache) -> None:
         async with db_wrapper.connect() as db:
             # get user id from player
             async with db.execute("SELECT id FROM users WHERE player_id = ?", (self.target_player_id,)) as cursor:
@@ -318,6 +320,7 @@ class RemoveRoleCommand(Command[None]):
                 await db.commit()
             except Exception:
                 raise Problem("Unexpected error")
+            permission_cache.invalidate_user(target_user_id)
             
 @dataclass
 class UpdateRoleExpirationCommand(Command[None]):
@@ -327,7 +330,7 @@ class UpdateRoleExpirationCommand(Command[None]):
     expires_on: int | None = None
     is_ban: bool = False
 
-    async def handle(self, db_wrapper: DBWrapper) -> None:
+    async def handle(self, db_wrapper: DBWrapper, permission_cache: PermissionCache) -> None:
         async with db_wrapper.connect() as db:
             timestamp = int(datetime.now(timezone.utc).timestamp())
             if self.expires_on and self.expires_on < timestamp:
@@ -373,12 +376,14 @@ class UpdateRoleExpirationCommand(Command[None]):
                 await db.commit()
             except Exception:
                 raise Problem("Unexpected error")
+            permission_cache.invalidate_user(target_user_id)
 
 @dataclass
 class RemoveExpiredRolesCommand(Command[None]):
-    async def handle(self, db_wrapper: DBWrapper):
+    async def handle(self, db_wrapper: DBWrapper, permission_cache: PermissionCache):
         timestamp = int(datetime.now(timezone.utc).timestamp())
         notif_rows: list[tuple[int, int, int, str, str, int]] = []
+        expired_user_ids: set[int] = set()
         
         async with db_wrapper.connect() as db:
             # user_roles, ignore banned role notif since user is already notified when unbanned
@@ -388,6 +393,7 @@ class RemoveExpiredRolesCommand(Command[None]):
                 WHERE ur.expires_on < ? AND r.id != 5"""
             async with db.execute(query, (timestamp,)) as cursor:
                 rows = await cursor.fetchall()
+                expired_user_ids.update(row[0] for row in rows)
                 for user_id, role_name, player_id in rows:
                     content_args = json.dumps({'role': role_name})
                     notif_rows.append((user_id, notifications.WARNING, notifications.ROLE_REMOVE, content_args, f'/registry/players/profile?id={player_id}', timestamp))
@@ -402,6 +408,7 @@ class RemoveExpiredRolesCommand(Command[None]):
                 WHERE utr.expires_on < ?"""
             async with db.execute(query, (timestamp,)) as cursor:
                 rows = await cursor.fetchall()
+                expired_user_ids.update(row[0] for row in rows)
                 for user_id, role_name, player_id, team_id, team_name in rows:
                     content_args = json.dumps({'role': role_name, 'team_name': team_name})
                     notif_rows.append((user_id, notifications.WARNING, notifications.TEAM_ROLE_REMOVE, content_args, f'/registry/teams/profile?id={team_id}', timestamp))
@@ -416,6 +423,7 @@ class RemoveExpiredRolesCommand(Command[None]):
                 WHERE usr.expires_on < ?"""
             async with db.execute(query, (timestamp,)) as cursor:
                 rows = await cursor.fetchall()
+                expired_user_ids.update(row[0] for row in rows)
                 for user_id, role_name, player_id, series_id, series_name in rows:
                     content_args = json.dumps({'role': role_name, 'series_name': series_name})
                     notif_rows.append((user_id, notifications.WARNING, notifications.SERIES_ROLE_REMOVE, content_args, f'/tournaments/series/details?id={series_id}', timestamp))
@@ -431,6 +439,7 @@ class RemoveExpiredRolesCommand(Command[None]):
                 WHERE utr.expires_on < ?"""
             async with db.execute(query, (timestamp,)) as cursor:
                 rows = await cursor.fetchall()
+                expired_user_ids.update(row[0] for row in rows)
                 for user_id, role_name, player_id, tournament_id, tournament_name in rows:
                     content_args = json.dumps({'role': role_name, 'tournament_name': tournament_name})
                     notif_rows.append((user_id, notifications.WARNING, notifications.TOURNAMENT_ROLE_REMOVE, content_args, f'/tournaments/details?id={tournament_id}', timestamp))
@@ -441,4 +450,5 @@ class RemoveExpiredRolesCommand(Command[None]):
             if notif_rows:
                 await db.executemany("INSERT INTO notifications(user_id, type, content_id, content_args, link, created_date) VALUES (?, ?, ?, ?, ?, ?)", notif_rows)
             
-            await db.commit()
\ No newline at end of file
+            await db.commit()
+        permission_cache.invalidate_user(*expired_user_ids)
\ No newline at end of file
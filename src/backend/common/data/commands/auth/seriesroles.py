@@ -3,6 +3,7 @@ from common.auth import series_permissions
 from common.data.command import Command
 from common.data.db import DBWrapper
 from common.data.models import *
+from common.data.permission_cache import PermissionCache
 from datetime import datetime, timezone
 
 @dataclass
@@ -65,7 +66,7 @@ class GrantSeriesRoleCommand(Command[None]):
     role: str
     expires_on: int | None = None
 
-    async def handle(self, db_wrapper: DBWrapper) -> None:
+    async def handle(self, db_wrapper: DBWrapper, permission_cache: PermissionCache) -> None:
         async with db_wrapper.connect() as db:
             timestamp = int(datetime.now(timezone.utc).timestamp())
             if self.expires_on and self.expires_on < timestamp:
@@ -128,6 +129,7 @@ class GrantSeriesRoleCommand(Command[None]):
                 await db.commit()
             except Exception:
                 raise Problem("Unexpected error")
+            permission_cache.invalidate_user(target_user_id)
             
 @dataclass
 class RemoveSeriesRoleCommand(Command[None]):
@@ -136,7 +138,7 @@ class RemoveSeriesRoleCommand(Command[None]):
     series_id: int
     role: str
 
-    async def handle(self, db_wrapper: DBWrapper) -> None:
+    async def handle(self, db_wrapper: DBWrapper, permission_cache: PermissionCache) -> None:
         async with db_wrapper.connect() as db:
             # get user id from player
             async with db.execute("SELECT id FROM users WHERE player_id = ?", (self.target_player_id,)) as cursor:
@@ -195,4 +197,5 @@ class RemoveSeriesRoleCommand(Command[None]):
                 await db.commit()
             except Exception:
                 raise Problem("Unexpected error")
+            permission_cache.invalidate_user(target_user_id)
 
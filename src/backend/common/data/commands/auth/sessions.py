@@ -2,6 +2,7 @@ from dataclasses import dataclass
 from common.data.command import Command
 from common.data.db import DBWrapper
 from common.data.models import *
+from common.data.session_cache import SessionCache
 from datetime import datetime, timezone, timedelta
 import secrets
 
@@ -9,10 +10,14 @@ import secrets
 class GetUserIdFromSessionCommand(Command[User | None]):
     session_id: str
 
-    async def handle(self, db_wrapper: DBWrapper):
+    async def handle(self, db_wrapper: DBWrapper, session_cache: SessionCache):
+        user = session_cache.get("session", self.session_id)
+        if user is not None:
+            return user
+
         async with db_wrapper.connect(db_name='main', attach=['sessions'], readonly=True) as db:
             query = """
-                SELECT s.user_id, u.player_id 
+                SELECT s.user_id, u.player_id, s.expires_on
                 FROM sessions.sessions s
                 JOIN users u ON s.user_id = u.id
                 WHERE s.session_id = :session_id
@@ -21,8 +26,11 @@ class GetUserIdFromSessionCommand(Command[User | None]):
                 row = await cursor.fetchone()
                 if not row:
                     return None
-                user_id, player_id = row
-                return User(user_id, player_id)
+                user_id, player_id, expires_on = row
+        user = User(user_id, player_id)
+        expires_in = int(expires_on) - datetime.now(timezone.utc).timestamp()
+        session_cache.set("session", self.session_id, user, expires_in)
+        return user
 
 @dataclass
 class IsValidSessionCommand(Command[bool]):
@@ -112,8 +120,9 @@ class CreateSessionCommand(Command[SessionInfo]):
 class DeleteSessionCommand(Command[None]):
     session_id: str
 
-    async def handle(self, db_wrapper: DBWrapper):
+    async def handle(self, db_wrapper: DBWrapper, session_cache: SessionCache):
         now = int(datetime.now(timezone.utc).timestamp())
+        session_cache.invalidate("session", self.session_id)
         
         async with db_wrapper.connect(db_name='sessions') as db:
             await db.execute("DELETE FROM sessions WHERE session_id = :session_id", {"session_id": self.session_id})
@@ -3,6 +3,7 @@ from common.auth import team_permissions, permissions, team_roles
 from common.data.command import Command
 from common.data.db import DBWrapper
 from common.data.models import *
+from common.data.permission_cache import PermissionCache
 from datetime import datetime, timezone
         
 @dataclass
@@ -65,7 +66,7 @@ class GrantTeamRoleCommand(Command[None]):
     role: str
     expires_on: int | None = None
 
-    async def handle(self, db_wrapper: DBWrapper) -> None:
+    async def handle(self, db_wrapper: DBWrapper, permission_cache: PermissionCache) -> None:
         async with db_wrapper.connect() as db:
             timestamp = int(datetime.now(timezone.utc).timestamp())
             if self.expires_on and self.expires_on < timestamp:
@@ -166,6 +167,7 @@ class GrantTeamRoleCommand(Command[None]):
                 await db.commit()
             except Exception:
                 raise Problem("Unexpected error")
+            permission_cache.invalidate_user(target_user_id)
 
 @dataclass
 class RemoveTeamRoleCommand(Command[None]):
@@ -174,7 +176,7 @@ class RemoveTeamRoleCommand(Command[None]):
     team_id: int
     role: str
 
-    async def handle(self, db_wrapper: DBWrapper) -> None:
+    async def handle(self, db_wrapper: DBWrapper, permission_cache: PermissionCache) -> None:
         async with db_wrapper.connect() as db:
             # get user id from player
             async with db.execute("SELECT id FROM users WHERE player_id = ?", (self.target_player_id,)) as cursor:
@@ -232,4 +234,5 @@ class RemoveTeamRoleCommand(Command[None]):
                 await db.execute("DELETE FROM user_team_roles WHERE user_id = ? AND role_id = ? AND team_id = ?", (target_user_id, role_id, self.team_id))
                 await db.commit()
             except Exception:
-                raise Problem("Unexpected error")
\ No newline at end of file
+                raise Problem("Unexpected error")
+            permission_cache.invalidate_user(target_user_id)
\ No newline at end of file
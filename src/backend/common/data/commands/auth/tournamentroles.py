@@ -3,6 +3,7 @@ from common.auth import tournament_permissions
 from common.data.command import Command
 from common.data.db import DBWrapper
 from common.data.models import *
+from common.data.permission_cache import PermissionCache
 from datetime import datetime, timezone
 
 
@@ -66,7 +67,7 @@ class GrantTournamentRoleCommand(Command[None]):
     role: str
     expires_on: int | None = None
 
-    async def handle(self, db_wrapper: DBWrapper) -> None:
+    async def handle(self, db_wrapper: DBWrapper, permission_cache: PermissionCache) -> None:
         async with db_wrapper.connect() as db:
             timestamp = int(datetime.now(timezone.utc).timestamp())
             if self.expires_on and self.expires_on < timestamp:
@@ -143,6 +144,7 @@ class GrantTournamentRoleCommand(Command[None]):
                 await db.commit()
             except Exception:
                 raise Problem("Unexpected error")
+            permission_cache.invalidate_user(target_user_id)
             
 @dataclass
 class RemoveTournamentRoleCommand(Command[None]):
@@ -151,7 +153,7 @@ class RemoveTournamentRoleCommand(Command[None]):
     tournament_id: int
     role: str
 
-    async def handle(self, db_wrapper: DBWrapper) -> None:
+    async def handle(self, db_wrapper: DBWrapper, permission_cache: PermissionCache) -> None:
         async with db_wrapper.connect() as db:
             # get user id from player
             async with db.execute("SELECT id FROM users WHERE player_id = ?", (self.target_player_id,)) as cursor:
@@ -223,4 +225,5 @@ class RemoveTournamentRoleCommand(Command[None]):
                 await db.execute("DELETE FROM user_tournament_roles WHERE user_id = ? AND role_id = ? AND tournament_id = ?", (target_user_id, role_id, self.tournament_id))
                 await db.commit()
             except Exception:
-                raise Problem("Unexpected error")
\ No newline at end of file
+                raise Problem("Unexpected error")
+            permission_cache.invalidate_user(target_user_id)
\ No newline at end of file
@@ -4,7 +4,7 @@ from common.data.command import Command
 from common.data.db import DBWrapper
 from common.data.models import *
 from common.emails import EmailService
-from common.auth import pw_hasher
+from common.auth import pw_hashing_pool
 import secrets
 from datetime import datetime, timezone, timedelta
 import logging
@@ -42,16 +42,16 @@ class ChangeEmailCommand(Command[None]):
     password: str
 
     async def handle(self, db_wrapper: DBWrapper):
-        async with db_wrapper.connect(db_name='auth') as db:
+        # check the password before taking a write connection, so other writes don't queue behind hashing it
+        async with db_wrapper.connect(db_name='auth', readonly=True) as db:
             async with db.execute("SELECT password_hash FROM user_auth WHERE user_id = :user_id", {"user_id": self.user_id}) as cursor:
                 row = await cursor.fetchone()
                 if not row:
                     raise Problem("User not found", status=404)
                 password_hash = row[0]
-            try:
-                pw_hasher.verify(password_hash, self.password)
-            except:
-                raise Problem("Password is incorrect", status=401)
+        if not password_hash or not await pw_hashing_pool.verify(password_hash, self.password):
+            raise Problem("Password is incorrect", status=401)
+        async with db_wrapper.connect(db_name='auth') as db:
             async with db.execute("SELECT email FROM user_auth WHERE email = :new_email AND user_id != :user_id", {"new_email": self.new_email, "user_id": self.user_id}) as cursor:
                 row = await cursor.fetchone()
                 if row:
@@ -171,16 +171,16 @@ class ResetPasswordCommand(Command[None]):
     new_password_hash: str
 
     async def handle(self, db_wrapper: DBWrapper):
-        async with db_wrapper.connect(db_name='auth') as db:
+        # check the old password before taking a write connection, so other writes don't queue behind hashing it
+        async with db_wrapper.connect(db_name='auth', readonly=True) as db:
             async with db.execute("SELECT password_hash FROM user_auth WHERE user_id = :user_id", {"user_id": self.user_id}) as cursor:
                 row = await cursor.fetchone()
                 if not row:
                     raise Problem("User not found", status=404)
                 correct_old_pw_hash = row[0]
-                try:
-                    pw_hasher.verify(correct_old_pw_hash, self.old_password)
-                except:
-                    raise Problem("Old password is incorrect", status=401)
+        if not correct_old_pw_hash or not await pw_hashing_pool.verify(correct_old_pw_hash, self.old_password):
+            raise Problem("Old password is incorrect", status=401)
+        async with db_wrapper.connect(db_name='auth') as db:
             await db.execute("UPDATE user_auth SET password_hash = :new_password_hash, force_password_reset = 0 WHERE user_id = :user_id", {"new_password_hash": self.new_password_hash, "user_id": self.user_id})
             await db.commit()
 
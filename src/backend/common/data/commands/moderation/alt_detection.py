@@ -79,41 +79,62 @@ class CheckIPsCommand(Command[None]):
 
 @dataclass
 class ListAltFlagsCommand(Command[AltFlagList]):
+    """
+    Lists alt flags, newest first. Pages after the first should be fetched with the next_cursor of the
+    previous page, which seeks straight to the flags after it on the (date, id) index, instead of by
+    page number, which has to skip over every flag on the pages before it.
+    """
     filter: AltFlagFilter
 
     async def handle(self, db_wrapper: DBWrapper):
-        async with db_wrapper.connect(db_name="main", attach=["user_activity", "alt_flags"], readonly=True) as db:
-            limit = 20
-            offset = 0
+        limit = 20
+        cursor_key = None
+        if self.filter.cursor is not None:
+            cursor_key = decode_alt_flag_cursor(self.filter.cursor)
+            if cursor_key is None:
+                raise Problem("Invalid alt flag cursor", status=400)
 
-            if self.filter.page:
-                offset = (self.filter.page - 1) * limit
+        where_clauses: list[str] = []
+        variables: dict[str, Any] = {}
+        if self.filter.type is not None:
+            where_clauses.append("type = :type")
+            variables["type"] = self.filter.type
+        if self.filter.exclude_fingerprints:
+            where_clauses.append("type != 'fingerprint_match'")
+        if self.filter.from_date is not None:
+            where_clauses.append("date >= :from_date")
+            variables["from_date"] = self.filter.from_date
+        if self.filter.to_date is not None:
+            where_clauses.append("date <= :to_date")
+            variables["to_date"] = self.filter.to_date
 
-            # Get count for pagination
-            count_query = """SELECT COUNT(*) FROM alt_flags.alt_flags
-                    WHERE (:type IS NULL OR type = :type)
-                    AND (:exclude_fingerprints=0 OR type != 'fingerprint_match')
-                    AND (:from_date IS NULL OR date >= :from_date)
-                    AND (:to_date IS NULL OR date <= :to_date)"""
-            async with db.execute(count_query, {"type": self.filter.type,
-                                                "exclude_fingerprints": self.filter.exclude_fingerprints,
-                                                "from_date": self.filter.from_date,
-                                                "to_date": self.filter.to_date}) as cursor:
+        async with db_wrapper.connect(db_name="main", attach=["user_activity", "alt_flags"], readonly=True) as db:
+            # Flags of each type are counted in alt_flag_counts, so only filtering by date needs the flags to be counted
+            if self.filter.from_date is None and self.filter.to_date is None:
+                count_query = f"SELECT COALESCE(SUM(count), 0) FROM alt_flags.alt_flag_counts {'WHERE ' + ' AND '.join(where_clauses) if where_clauses else ''}"
+            else:
+                count_query = f"SELECT COUNT(*) FROM alt_flags.alt_flags WHERE {' AND '.join(where_clauses)}"
+            async with db.execute(count_query, variables) as cursor:
                 row = await cursor.fetchone()
                 assert row is not None
                 count = row[0]
             page_count = (count + limit - 1) // limit
 
-            get_flags_query = """
-                SELECT f.id, f.type, f.flag_key, f.data, f.score, f.date, l.fingerprint,
+            page_clauses = list(where_clauses)
+            offset = 0
+            if cursor_key is not None:
+                page_clauses.append("(date, id) < (:cursor_date, :cursor_id)")
+                variables["cursor_date"], variables["cursor_id"] = cursor_key
+            elif self.filter.page:
+                offset = (self.filter.page - 1) * limit
+
+            get_flags_query = f"""
+                SELECT f.id, f.type, f.flag_key, {'f.data' if self.filter.include_data else 'NULL'}, f.score, f.date, l.fingerprint,
                        u.id as user_id, p.id as player_id, p.name as player_name, p.country_code, p.is_banned
                 FROM (
                     SELECT id FROM alt_flags.alt_flags
-                    WHERE (:type IS NULL OR type = :type)
-                    AND (:exclude_fingerprints=0 OR type != 'fingerprint_match')
-                    AND (:from_date IS NULL OR date >= :from_date)
-                    AND (:to_date IS NULL OR date <= :to_date)
-                    ORDER BY date DESC 
+                    {'WHERE ' + ' AND '.join(page_clauses) if page_clauses else ''}
+                    ORDER BY date DESC, id DESC
                     LIMIT :limit OFFSET :offset
                 ) as pf
                 JOIN alt_flags.alt_flags f ON f.id = pf.id
@@ -121,14 +142,11 @@ class ListAltFlagsCommand(Command[AltFlagList]):
                 LEFT JOIN alt_flags.user_alt_flags uf ON f.id = uf.flag_id
                 LEFT JOIN main.users u ON uf.user_id = u.id
                 LEFT JOIN main.players p ON u.player_id = p.id
-                ORDER BY f.date DESC
+                ORDER BY f.date DESC, f.id DESC
             """
             
             flag_dict: dict[int, AltFlag] = {}
-            async with db.execute(get_flags_query, {"limit": limit, "offset": offset, "type": self.filter.type,
-                                                    "exclude_fingerprints": self.filter.exclude_fingerprints,
-                                                    "from_date": self.filter.from_date,
-                                                    "to_date": self.filter.to_date}) as cursor:
+            async with db.execute(get_flags_query, {**variables, "limit": limit, "offset": offset}) as cursor:
                 rows = await cursor.fetchall()
                 for flag_id, flag_type, flag_key, data, score, date, fingerprint_hash, user_id, player_id, player_name, player_country, player_banned in rows:
                     # Create flag if we haven't seen it yet
@@ -143,7 +161,29 @@ class ListAltFlagsCommand(Command[AltFlagList]):
                         flag_user = AltFlagUser(user_id, player)
                         flag_dict[flag_id].users.append(flag_user)
 
-            return AltFlagList(list(flag_dict.values()), count, page_count)
+            flags = list(flag_dict.values())
+            next_cursor = encode_alt_flag_cursor(flags[-1]) if len(flags) == limit else None
+            return AltFlagList(flags, count, page_count, next_cursor)
+
+@dataclass
+class RefreshAltFlagCountsCommand(Command[None]):
+    """Recounts alt_flag_counts from scratch, for flags added before its triggers existed."""
+    async def handle(self, db_wrapper: DBWrapper):
+        async with db_wrapper.connect(db_name="alt_flags") as db:
+            await db.execute("DELETE FROM alt_flag_counts")
+            await db.execute("INSERT INTO alt_flag_counts(type, count) SELECT type, COUNT(*) FROM alt_flags GROUP BY type")
+            await db.commit()
+
+def encode_alt_flag_cursor(flag: AltFlag) -> str:
+    return f"{flag.date}_{flag.id}"
+
+def decode_alt_flag_cursor(cursor: str) -> tuple[int, int] | None:
+    """Decodes a cursor created by encode_alt_flag_cursor, returning None if it is malformed."""
+    try:
+        date, flag_id = cursor.split("_")
+        return (int(date), int(flag_id))
+    except ValueError:
+        return None
 
 @dataclass
 class ViewPlayerAltFlagsCommand(Command[list[AltFlag]]):
@@ -209,6 +249,64 @@ class ViewPlayerAltFlagsCommand(Command[list[AltFlag]]):
             
             return list(flag_dict.values())
         
+@dataclass
+class ViewPlayerAltClusterCommand(Command[AltCluster | None]):
+    """
+    Gets every user linked to a player by alt flags strongly enough to be clustered, directly or through
+    other users, or None if they aren't in a cluster. The links include the weaker ones inside the cluster.
+    """
+    player_id: int
+
+    async def handle(self, db_wrapper: DBWrapper):
+        async with db_wrapper.connect(db_name="main", attach=["alt_flags"], readonly=True) as db:
+            async with db.execute("SELECT 1 FROM main.players WHERE id = :player_id", {"player_id": self.player_id}) as cursor:
+                if not await cursor.fetchone():
+                    raise Problem("Player not found", status=404)
+
+            # players who have never had a user, or whose user has no flags, aren't in a cluster
+            get_cluster_query = """
+                SELECT c.cluster_id
+                FROM main.users u
+                JOIN alt_flags.alt_clusters c ON c.user_id = u.id
+                WHERE u.player_id = :player_id
+                LIMIT 1
+            """
+            async with db.execute(get_cluster_query, {"player_id": self.player_id}) as cursor:
+                row = await cursor.fetchone()
+                if not row:
+                    return None
+                cluster_id = row[0]
+
+            users: list[AltFlagUser] = []
+            get_cluster_users_query = """
+                SELECT c.user_id, p.id, p.name, p.country_code, p.is_banned
+                FROM alt_flags.alt_clusters c
+                LEFT JOIN main.users u ON c.user_id = u.id
+                LEFT JOIN main.players p ON u.player_id = p.id
+                WHERE c.cluster_id = :cluster_id
+            """
+            async with db.execute(get_cluster_users_query, {"cluster_id": cluster_id}) as cursor:
+                async for user_id, player_id, player_name, player_country, player_banned in cursor:
+                    player = None
+                    if player_id is not None:
+                        player = PlayerBasic(player_id, player_name, player_country, bool(player_banned))
+                    users.append(AltFlagUser(user_id, player))
+
+            links: list[AltClusterLink] = []
+            get_cluster_links_query = """
+                SELECT e.user_id, e.linked_user_id, e.score, e.flag_count
+                FROM alt_flags.alt_clusters c
+                JOIN alt_flags.alt_graph_edges e ON e.user_id = c.user_id
+                JOIN alt_flags.alt_clusters lc ON lc.user_id = e.linked_user_id AND lc.cluster_id = c.cluster_id
+                WHERE c.cluster_id = :cluster_id AND e.user_id < e.linked_user_id
+                ORDER BY e.score DESC
+            """
+            async with db.execute(get_cluster_links_query, {"cluster_id": cluster_id}) as cursor:
+                async for user_id_1, user_id_2, score, flag_count in cursor:
+                    links.append(AltClusterLink(user_id_1, user_id_2, score, flag_count))
+
+            return AltCluster(cluster_id, users, links)
+
 @dataclass
 class ViewPlayerLoginHistoryCommand(Command[PlayerUserLogins]):
     player_id: int
@@ -216,7 +314,7 @@ class ViewPlayerLoginHistoryCommand(Command[PlayerUserLogins]):
 
     async def handle(self, db_wrapper: DBWrapper):
         logins: list[UserLogin] = []
-        async with db_wrapper.connect(db_name='main', attach=['user_activity']) as db:
+        async with db_wrapper.connect(db_name='main', attach=['user_activity'], readonly=True) as db:
             async with db.execute("""SELECT ul.id, ul.user_id, ul.ip_address_id,
                                     ul.fingerprint, ul.had_persistent_session, ul.date,
                                     ul.logout_date, ip.ip_address, ip.is_mobile,
@@ -246,7 +344,7 @@ class ViewPlayerIPHistoryCommand(Command[PlayerIPHistory]):
 
     async def handle(self, db_wrapper: DBWrapper):
         ips: list[UserIPTimeRange] = []
-        async with db_wrapper.connect(db_name='main', attach=['user_activity']) as db:
+        async with db_wrapper.connect(db_name='main', attach=['user_activity'], readonly=True) as db:
             async with db.execute("""SELECT tr.id, tr.date_earliest, tr.date_latest, tr.times,
                                     uip.user_id, ip.id, ip.ip_address, ip.is_mobile, ip.is_vpn,
                                     ip.country, ip.region, ip.city, ip.asn
@@ -276,7 +374,7 @@ class ViewHistoryForIPCommand(Command[IPHistory]):
 
     async def handle(self, db_wrapper: DBWrapper):
         time_ranges: list[PlayerIPTimeRange] = []
-        async with db_wrapper.connect(db_name='main', attach=['user_activity']) as db:
+        async with db_wrapper.connect(db_name='main', attach=['user_activity'], readonly=True) as db:
             async with db.execute("""SELECT ip.id, ip.ip_address, ip.is_mobile, ip.is_vpn,
                                     ip.country, ip.region, ip.city, ip.asn,
                                     uip.user_id, tr.id, tr.date_earliest,
@@ -327,7 +425,7 @@ class SearchIPsCommand(Command[IPAddressList]):
             "limit": limit,
         }
         results: list[IPAddressWithUserCount] = []
-        async with db_wrapper.connect(db_name='user_activity') as db:
+        async with db_wrapper.connect(db_name='user_activity', readonly=True) as db:
             query = """FROM ip_addresses ip
                         JOIN user_ips uip ON ip.id = uip.ip_address_id
                         WHERE (:ip_address IS NULL OR ip.ip_address LIKE :ip_address) AND (:city IS NULL OR ip.city LIKE :city)
@@ -359,7 +457,7 @@ class GetIPIDFromAddressCommand(Command[int]):
     ip_address: int
 
     async def handle(self, db_wrapper: DBWrapper):
-        async with db_wrapper.connect(db_name='user_activity') as db:
+        async with db_wrapper.connect(db_name='user_activity', readonly=True) as db:
             async with db.execute("SELECT id FROM ip_addresses WHERE ip_address = ?", (self.ip_address,)) as cursor:
                 row = await cursor.fetchone()
                 if not row:
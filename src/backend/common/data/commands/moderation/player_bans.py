@@ -6,6 +6,7 @@ from aiosqlite import Connection
 
 from common.data.command import Command
 from common.data.db import DBWrapper
+from common.data.player_cache import PlayerSummaryCache
 from common.data.models import *
 
 @dataclass
@@ -26,7 +27,7 @@ class BanPlayerCommand(Command[PlayerBan]):
             assert row is not None
             return True if row[0] else False
 
-    async def handle(self, db_wrapper: DBWrapper):
+    async def handle(self, db_wrapper: DBWrapper, player_cache: PlayerSummaryCache):
         data = self.data
         ban_date = int(datetime.now(timezone.utc).timestamp())
 
@@ -50,6 +51,7 @@ class BanPlayerCommand(Command[PlayerBan]):
                     raise Problem("Failed to ban player", "Player not found")
             
             await db.commit()
+            player_cache.invalidate(self.player_id)
             return PlayerBan(*params)
 
 @dataclass
@@ -57,7 +59,7 @@ class UnbanPlayerCommand(Command[PlayerBanHistorical]):
     player_id: int
     unbanned_by: int | None = None
 
-    async def handle(self, db_wrapper: DBWrapper):
+    async def handle(self, db_wrapper: DBWrapper, player_cache: PlayerSummaryCache):
         unban_date = int(datetime.now(timezone.utc).timestamp())
 
         async with db_wrapper.connect() as db:
@@ -82,6 +84,7 @@ class UnbanPlayerCommand(Command[PlayerBanHistorical]):
                 if cursor.rowcount != 1:
                     raise Problem("Failed to unban player", "Failed to update is_banned in player table")
             await db.commit()
+        player_cache.invalidate(self.player_id)
         return PlayerBanHistorical(player_id, banned_by, is_indefinite, ban_date, expiration_date, reason, comment, self.unbanned_by)
 
 @dataclass
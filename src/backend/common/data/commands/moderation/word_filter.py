@@ -11,7 +11,7 @@ class CheckWordFilterCommand(Command[None]):
         # convert the request body into a string to check in the word filter
         string_body = ','.join(str(v).lower() for k, v in self.request_body.items() if k != 'logo_file') # sometimes bad words are in base64
 
-        async with db_wrapper.connect() as db:
+        async with db_wrapper.connect(readonly=True) as db:
             async with db.execute("SELECT word FROM filtered_words WHERE ? LIKE '%'|| word ||'%'", (string_body,)) as cursor:
                 bad_words = list(await cursor.fetchall())
                 if len(bad_words):
@@ -32,7 +32,7 @@ class EditWordFilterCommand(Command[None]):
 @dataclass
 class GetWordFilterCommand(Command[FilteredWords]):
     async def handle(self, db_wrapper: DBWrapper):
-        async with db_wrapper.connect() as db:
+        async with db_wrapper.connect(readonly=True) as db:
             async with db.execute("SELECT word FROM filtered_words") as cursor:
                 rows = await cursor.fetchall()
                 words: list[str] = [row[0] for row in rows]
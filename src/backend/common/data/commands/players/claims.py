@@ -1,5 +1,6 @@
 from common.data.command import Command
 from common.data.db import DBWrapper
+from common.data.player_cache import PlayerSummaryCache
 from common.data.models import *
 from datetime import datetime, timezone
 
@@ -42,7 +43,7 @@ class ClaimPlayerCommand(Command[PlayerClaim]):
 class ApprovePlayerClaimCommand(Command[tuple[int, int, str]]):
     claim_id: int
 
-    async def handle(self, db_wrapper: DBWrapper):
+    async def handle(self, db_wrapper: DBWrapper, player_cache: PlayerSummaryCache):
         async with db_wrapper.connect() as db:
             # get the user id of requesting user as well as claimed player's info for notifications
             async with db.execute("""SELECT c.player_id, u.id, c.claimed_player_id, p.name
@@ -65,6 +66,7 @@ class ApprovePlayerClaimCommand(Command[tuple[int, int, str]]):
             # delete the claimed player after merging their data in
             await db.execute("DELETE FROM players WHERE id = ?", (claimed_player_id,))
             await db.commit()
+            player_cache.invalidate(claimed_player_id)
             return player_id, user_id, claimed_player_name
                
 @dataclass
@@ -90,7 +92,7 @@ class DenyPlayerClaimCommand(Command[tuple[int, int, str]]):
 @dataclass
 class ListPlayerClaimsCommand(Command[list[PlayerClaim]]):
     async def handle(self, db_wrapper: DBWrapper):
-        async with db_wrapper.connect() as db:
+        async with db_wrapper.connect(readonly=True) as db:
             async with db.execute("""SELECT c.id, c.date, c.approval_status,
                                   c.player_id, p1.name, p1.country_code, p1.is_banned,
                                   c.claimed_player_id, p2.name, p2.country_code, p2.is_banned
@@ -151,7 +151,7 @@ class ListFriendCodeEditsCommand(Command[FriendCodeEditList]):
                         JOIN players p ON f.player_id = p.id
                         LEFT JOIN players p2 ON e.handled_by = p2.id"""
         
-        async with db_wrapper.connect() as db:
+        async with db_wrapper.connect(readonly=True) as db:
             edits: list[FriendCodeEdit] = []
             async with db.execute(f"""SELECT e.id, e.old_fc, e.new_fc, e.is_active, e.date,
                                         f.id, f.type, f.fc, f.is_verified, f.is_primary, f.is_active,
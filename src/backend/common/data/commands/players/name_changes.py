@@ -1,6 +1,7 @@
 from datetime import timedelta, timezone, datetime
 from common.data.command import Command
 from common.data.db import DBWrapper
+from common.data.player_cache import PlayerSummaryCache
 from common.data.models import *
 
 @dataclass
@@ -34,7 +35,7 @@ class ListPlayerNameRequestsCommand(Command[PlayerNameRequestList]):
     filter: PlayerNameRequestFilter
 
     async def handle(self, db_wrapper: DBWrapper):
-        async with db_wrapper.connect() as db:
+        async with db_wrapper.connect(readonly=True) as db:
             filter = self.filter
             limit = 20
             offset = 0
@@ -72,7 +73,7 @@ class ApprovePlayerNameRequestCommand(Command[PlayerNameRequestUpdate]):
     request_id: int
     mod_player_id: int
 
-    async def handle(self, db_wrapper: DBWrapper) -> PlayerNameRequestUpdate:
+    async def handle(self, db_wrapper: DBWrapper, player_cache: PlayerSummaryCache) -> PlayerNameRequestUpdate:
         async with db_wrapper.connect() as db:
             async with db.execute("""
                                   UPDATE player_name_edits SET approval_status = 'approved', handled_by = ?
@@ -85,6 +86,7 @@ class ApprovePlayerNameRequestCommand(Command[PlayerNameRequestUpdate]):
         
             await db.execute("UPDATE players SET name = ? WHERE id = ?", (new_name, player_id))
             await db.commit()
+            player_cache.invalidate(player_id)
             async with db.execute("""SELECT id, name, country_code, is_banned from players where id = ?""", (handled_by_id, )) as cursor:
                 db_handled_by = await cursor.fetchone()
                 if db_handled_by is None:
@@ -1,6 +1,8 @@
 import re
 from common.data.command import Command
 from common.data.db import DBWrapper
+from common.data.player_cache import PlayerSummaryCache
+from common.data.session_cache import SessionCache
 from common.data.models import *
 from datetime import datetime, timezone
 
@@ -13,7 +15,7 @@ class CreatePlayerCommand(Command[Player]):
     is_hidden: bool = False
     is_shadow: bool = False
 
-    async def handle(self, db_wrapper: DBWrapper):
+    async def handle(self, db_wrapper: DBWrapper, session_cache: SessionCache):
         name = self.name.strip()
         if len(name) < 2:
             raise Problem("Player name must be at least 2 characters", status=400)
@@ -81,6 +83,8 @@ class CreatePlayerCommand(Command[Player]):
             await db.executemany("INSERT INTO friend_codes(player_id, type, fc, is_verified, is_primary, is_active, description, creation_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
                     friend_code_tuples)
             await db.commit()
+            if self.user_id is not None:
+                session_cache.invalidate_user(self.user_id)
             return Player(int(player_id), name, self.country_code, self.is_hidden, self.is_shadow, False, now, None)
 
 @dataclass
@@ -88,7 +92,7 @@ class UpdatePlayerCommand(Command[PlayerUpdate | None]):
     data: EditPlayerRequestData
     mod_player_id: int
 
-    async def handle(self, db_wrapper: DBWrapper) -> PlayerUpdate | None:
+    async def handle(self, db_wrapper: DBWrapper, player_cache: PlayerSummaryCache) -> PlayerUpdate | None:
         data = self.data
         async with db_wrapper.connect() as db:
             if len(self.data.name) > 24:
@@ -114,6 +118,7 @@ class UpdatePlayerCommand(Command[PlayerUpdate | None]):
                                     VALUES(?, ?, ?, ?, ?, ?)""", (data.player_id, curr_name, data.name.strip(), now, "approved", self.mod_player_id))
 
             await db.commit()
+            player_cache.invalidate(data.player_id)
             return PlayerUpdate(*updated_player)
 
 
@@ -196,7 +201,7 @@ class GetPlayerDetailedCommand(Command[PlayerDetailed | None]):
             notes = None
             if self.include_notes:
                 # Connect to main database and attach player_notes
-                async with db_wrapper.connect(db_name='main', attach=['player_notes']) as db_with_notes:
+                async with db_wrapper.connect(db_name='main', attach=['player_notes'], readonly=True) as db_with_notes:
                     async with db_with_notes.execute("SELECT notes, edited_by, date FROM player_notes.player_notes WHERE player_id = ?", (self.id,)) as cursor:
                         row = await cursor.fetchone()
                         if row:
@@ -399,7 +404,7 @@ class MergePlayersCommand(Command[None]):
     from_player_id: int
     to_player_id: int
 
-    async def handle(self, db_wrapper: DBWrapper):
+    async def handle(self, db_wrapper: DBWrapper, player_cache: PlayerSummaryCache, session_cache: SessionCache):
         if self.from_player_id == self.to_player_id:
             raise Problem("Player IDs are equal", status=400)
         async with db_wrapper.connect() as db:
@@ -423,6 +428,8 @@ class MergePlayersCommand(Command[None]):
             await db.execute("UPDATE users SET player_id = ? WHERE player_id = ?", (None, self.from_player_id))
             await db.execute("DELETE FROM players WHERE id = ?", (self.from_player_id,))
             await db.commit()
+        player_cache.invalidate(self.from_player_id, self.to_player_id)
+        session_cache.invalidate_player(self.from_player_id)
 
 @dataclass
 class GetPlayerTransferHistoryCommand(Command[PlayerTransferHistory]):
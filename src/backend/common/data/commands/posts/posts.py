@@ -139,7 +139,7 @@ class GetPostCommand(Command[Post]):
                     AND (:tournament_id IS NULL OR p.id IN (
                         SELECT tp.post_id FROM tournament_posts tp WHERE tp.tournament_id = :tournament_id
                     ))"""
-        async with db_wrapper.connect() as db:
+        async with db_wrapper.connect(readonly=True) as db:
             async with db.execute(query, {"id": self.id, "is_privileged": self.is_privileged, "series_id": self.series_id, 
                                           "tournament_id": self.tournament_id, "is_global": self.is_global}) as cursor:
                 row = await cursor.fetchone()
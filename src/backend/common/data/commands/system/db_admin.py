@@ -6,19 +6,27 @@ from common.auth import permissions, roles, team_permissions, team_roles, series
 from common.data.command import Command
 from common.data.db import all_dbs, DBWrapper
 from common.data.duckdb.wrapper import DuckDBWrapper
+from common.data.duckdb.leaderboards import LeaderboardCache
+from common.data.player_cache import PlayerSummaryCache
+from common.data.session_cache import SessionCache
+from common.data.permission_cache import PermissionCache
 from common.data.models import Problem
 
 @dataclass
 class ResetDbCommand(Command[None]):
     db_name: str
 
-    async def handle(self, db_wrapper: DBWrapper):
-        db_wrapper.reset_db(self.db_name)
+    async def handle(self, db_wrapper: DBWrapper, player_cache: PlayerSummaryCache, session_cache: SessionCache, permission_cache: PermissionCache):
+        await db_wrapper.reset_db(self.db_name)
+        player_cache.clear()
+        session_cache.clear()
+        permission_cache.clear()
 
 @dataclass
 class ResetDuckDbCommand(Command[None]):
-    async def handle(self, duckdb_wrapper: DuckDBWrapper):
-        duckdb_wrapper.reset_db()
+    async def handle(self, duckdb_wrapper: DuckDBWrapper, leaderboard_cache: LeaderboardCache):
+        await duckdb_wrapper.reset_db()
+        leaderboard_cache.clear()
 
 class UpdateDbSchemaCommand(Command[None]):
     async def handle(self, db_wrapper: DBWrapper):
@@ -34,6 +42,8 @@ class UpdateDbSchemaCommand(Command[None]):
                         await clean_db.execute(table.get_create_table_command())
                     for index in db_schema.indices:
                         await clean_db.execute(index.get_create_index_command())
+                    for trigger in db_schema.triggers:
+                        await clean_db.execute(trigger.get_create_trigger_command())
 
                     def parse_schema_row(row: aiosqlite.Row):
                         type, name, tbl_name, sql = row
@@ -47,6 +57,9 @@ class UpdateDbSchemaCommand(Command[None]):
                     
                     def get_indices_from_schema(schema_rows: list[tuple[str, str, str, str]]):
                         return { name: normalise_sql(sql) for type, name, _, sql in schema_rows if type == "index" and not name.startswith("sqlite_") }
+                    
+                    def get_triggers_from_schema(schema_rows: list[tuple[str, str, str, str]]):
+                        return { name: normalise_sql(sql) for type, name, _, sql in schema_rows if type == "trigger" }
 
                     fetch_schema_sql = "SELECT type, name, tbl_name, sql FROM sqlite_schema"
                     clean_schema = list(map(parse_schema_row, await clean_db.execute_fetchall(fetch_schema_sql)))
@@ -114,7 +127,7 @@ class UpdateDbSchemaCommand(Command[None]):
                             # for changed indices, drop and recreate them
                             if sql != actual_sql:
                                 logging.info(f"Index '{index}' modified, dropping index")
-                                await db.execute(f"DROP INDEX {index}")
+                                await db.execute(f"DROP INDEX IF EXISTS {index}")
 
                                 logging.info(f"Rereating index '{index}'\n{sql}")
                                 await db.execute(sql)
@@ -127,7 +140,31 @@ class UpdateDbSchemaCommand(Command[None]):
                         if index not in clean_indices:
                             # for removed indices, drop them
                             logging.info(f"Index '{index}' removed, dropping index")
-                            await db.execute(f"DROP INDEX {index}")
+                            await db.execute(f"DROP INDEX IF EXISTS {index}")
+
+                    # triggers are dropped along with their table when it is rebuilt above, so fetch them again
+                    clean_triggers = get_triggers_from_schema(clean_schema)
+                    actual_triggers = get_triggers_from_schema(list(map(parse_schema_row, await db.execute_fetchall(fetch_schema_sql))))
+
+                    for trigger, sql in clean_triggers.items():
+                        if (actual_sql := actual_triggers.get(trigger)) is not None:
+                            # for changed triggers, drop and recreate them
+                            if sql != actual_sql:
+                                logging.info(f"Trigger '{trigger}' modified, dropping trigger")
+                                await db.execute(f"DROP TRIGGER {trigger}")
+
+                                logging.info(f"Recreating trigger '{trigger}'\n{sql}")
+                                await db.execute(sql)
+                        else:
+                            # for new triggers, create them
+                            logging.info(f"Creating trigger '{trigger}'\n{sql}")
+                            await db.execute(sql)
+
+                    for trigger in actual_triggers:
+                        if trigger not in clean_triggers:
+                            # for removed triggers, drop them
+                            logging.info(f"Trigger '{trigger}' removed, dropping trigger")
+                            await db.execute(f"DROP TRIGGER {trigger}")
 
                     await db.execute("PRAGMA foreign_key_check")
                     await db.commit()
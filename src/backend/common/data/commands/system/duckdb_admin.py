@@ -2,16 +2,56 @@
 DuckDB administrative commands for schema management.
 """
 
+from collections.abc import Iterable
 from dataclasses import dataclass
+from logging import getLogger
+from typing import Any, cast
+import aioduckdb
+import asyncio
+import os
+import tempfile
 from common.data.command import Command
-from common.data.duckdb.models import ALL_DUCKDB_TABLES
-from common.data.duckdb.wrapper import DuckDBWrapper
+from common.data.db import DBWrapper
+from common.data.duckdb.models import ALL_DUCKDB_TABLES, PlayerDim, TimeTrial
+from common.data.duckdb.wrapper import DuckDBWrapper, transaction, write_ndjson
+from common.data.player_cache import PlayerSummaryCache
+
+logger = getLogger(__name__)
+
+
+async def _migrate_embedded_proofs(conn: aioduckdb.Connection):
+    """Moves proofs from the old time_trials.proofs JSON column into the time_trial_proofs table."""
+    column_query = "SELECT 1 FROM information_schema.columns WHERE table_name = 'time_trials' AND column_name = 'proofs'"
+    async with conn.execute(column_query) as cursor:
+        if await cursor.fetchone() is None: # pyright: ignore[reportUnknownMemberType]
+            return
+
+    logger.info("Migrating time trial proofs to the time_trial_proofs table")
+    async with conn.execute("SELECT index_name FROM duckdb_indexes() WHERE table_name = 'time_trials'") as cursor:
+        index_rows = cast(Iterable[tuple[Any, ...]], await cursor.fetchall()) # pyright: ignore[reportUnknownMemberType]
+
+    proof_type = '[{"id": "VARCHAR", "url": "VARCHAR", "type": "VARCHAR", "created_at": "VARCHAR", "status": "VARCHAR", "validator_id": "INTEGER", "validated_at": "VARCHAR"}]'
+    await conn.execute(f"""
+        INSERT INTO time_trial_proofs (id, time_trial_id, position, url, type, status, validator_id, validated_at, created_at)
+        SELECT u.proof.id, tt.id, u.position - 1, u.proof.url, u.proof.type, coalesce(u.proof.status, 'unvalidated'),
+            u.proof.validator_id, u.proof.validated_at, u.proof.created_at
+        FROM time_trials tt, unnest(from_json(tt.proofs, '{proof_type}')) WITH ORDINALITY AS u(proof, position)
+        WHERE u.proof.id IS NOT NULL
+        ON CONFLICT DO NOTHING
+    """)
+    # DuckDB can't drop a column while the table has indexes, and only sees dropped indexes once they
+    # are committed, so these run as separate statements. If the migration is interrupted it is
+    # picked up again on the next startup, since the copy above skips proofs which were already copied.
+    for (index_name,) in index_rows:
+        await conn.execute(f'DROP INDEX "{index_name}"')
+    await conn.execute("ALTER TABLE time_trials DROP COLUMN proofs")
+    await conn.execute(TimeTrial.get_create_table_command())
 
 
 @dataclass
 class SetupDuckDBSchemaCommand(Command[None]):
     """Initialize DuckDB schema with all required tables and indexes."""
-    
+
     async def handle(self, duckdb_wrapper: DuckDBWrapper) -> None:
         async with duckdb_wrapper.connection() as conn:
             # Then create/update tables
@@ -19,3 +59,77 @@ class SetupDuckDBSchemaCommand(Command[None]):
                 # DuckDB can execute multiple statements in a single command
                 create_statements = table_cls.get_create_table_command()
                 await conn.execute(create_statements)
+
+            await _migrate_embedded_proofs(conn)
+
+
+@dataclass
+class SyncPlayersDimCommand(Command[int]):
+    """
+    Copy changes to the SQLite players table into DuckDB's players_dim table, returning the number of
+    players which were added, changed or removed. SQLite doesn't track which players changed, so unless
+    full is set, only players joining after the newest copied player and those invalidated in this
+    process's player cache are read. A full sync also picks up changes made by other processes, and
+    removes players which no longer exist.
+    """
+    full: bool = False
+
+    async def handle(self, db_wrapper: DBWrapper, duckdb_wrapper: DuckDBWrapper, player_cache: PlayerSummaryCache) -> int:
+        changed_ids = player_cache.take_changed()
+        try:
+            return await self._sync(db_wrapper, duckdb_wrapper, changed_ids)
+        except BaseException:
+            # try these players again on the next sync
+            player_cache.invalidate(*changed_ids)
+            raise
+
+    async def _sync(self, db_wrapper: DBWrapper, duckdb_wrapper: DuckDBWrapper, changed_ids: set[int]) -> int:
+        async with duckdb_wrapper.connection() as conn:
+            async with conn.execute("SELECT coalesce(max(id), 0) FROM players_dim") as cursor:
+                max_id_row = cast(tuple[int], await cursor.fetchone()) # pyright: ignore[reportUnknownMemberType]
+                max_id = max_id_row[0]
+
+        query = "SELECT id, name, country_code, is_banned FROM players"
+        params: list[int] = []
+        if not self.full:
+            query += " WHERE id > ?"
+            params = [max_id]
+            if changed_ids:
+                query += f" OR id IN ({', '.join(['?'] * len(changed_ids))})"
+                params.extend(changed_ids)
+        async with db_wrapper.connect(readonly=True) as db:
+            async with db.execute(query, params) as cursor:
+                players = [PlayerDim(id, name, country_code, bool(is_banned)) for id, name, country_code, is_banned in await cursor.fetchall()]
+        # players which were changed and are now missing were deleted, e.g. by merging them into another player
+        deleted_ids = list(changed_ids - {player.id for player in players})
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            players_path = os.path.join(temp_dir, "players.ndjson")
+            await asyncio.to_thread(write_ndjson, players_path, players)
+            source = "read_json($players_path, format = 'newline_delimited', columns = {'id': 'INTEGER', 'name': 'VARCHAR', 'country_code': 'VARCHAR', 'is_banned': 'BOOLEAN'})"
+            async with duckdb_wrapper.connection() as conn:
+                async with transaction(conn):
+                    # only rows which differ are written, so syncing unchanged players is cheap
+                    cursor = await conn.execute_on_self(f"""
+                        INSERT INTO players_dim (id, name, country_code, is_banned)
+                        SELECT s.id, s.name, s.country_code, s.is_banned FROM {source} s
+                        WHERE NOT EXISTS (
+                            SELECT 1 FROM players_dim d
+                            WHERE d.id = s.id AND d.name = s.name AND d.country_code = s.country_code AND d.is_banned = s.is_banned
+                        )
+                        ON CONFLICT (id) DO UPDATE SET name = excluded.name, country_code = excluded.country_code, is_banned = excluded.is_banned
+                        RETURNING id
+                    """, {"players_path": players_path})
+                    updated = len(cast(list[tuple[Any, ...]], await cursor.fetchall())) # pyright: ignore[reportUnknownMemberType]
+                    deleted = 0
+                    if self.full or deleted_ids:
+                        if self.full:
+                            delete_query = f"DELETE FROM players_dim WHERE id NOT IN (SELECT id FROM {source}) RETURNING id"
+                        else:
+                            delete_query = "DELETE FROM players_dim WHERE list_contains($ids, id) RETURNING id"
+                        cursor = await conn.execute_on_self(delete_query, {"players_path": players_path} if self.full else {"ids": deleted_ids})
+                        deleted = len(cast(list[tuple[Any, ...]], await cursor.fetchall())) # pyright: ignore[reportUnknownMemberType]
+
+        if updated or deleted:
+            logger.info(f"Synced players_dim{' (full)' if self.full else ''}: {updated} players added or changed, {deleted} removed")
+        return updated + deleted
@@ -4,6 +4,7 @@ import msgspec
 from common.auth import roles as user_roles, series_roles, team_roles
 from common.data.command import Command
 from common.data.db import DBWrapper
+from common.data.permission_cache import PermissionCache
 from common.data.models import *
 from common.data.s3 import S3Wrapper, MKCV1_BUCKET
 
@@ -67,7 +68,7 @@ class TransferMKCV1UserCommand(Command[UserLoginData]):
     series_roles: list[NewMKCSeriesRole]
     team_roles: list[NewMKCTeamRole]
 
-    async def handle(self, db_wrapper: DBWrapper):
+    async def handle(self, db_wrapper: DBWrapper, permission_cache: PermissionCache):
         async with db_wrapper.connect(db_name='main', attach=["auth"]) as db:
             email_confirmed = True
             force_password_reset = True
@@ -110,4 +111,5 @@ class TransferMKCV1UserCommand(Command[UserLoginData]):
                                     SELECT ?, ?, ?
                                     WHERE EXISTS(SELECT 1 FROM teams WHERE id = ?)""", insert_team_roles)
             await db.commit()
-            return UserLoginData(user_id, self.player_id, email_confirmed, force_password_reset, self.email, self.password_hash)
\ No newline at end of file
+        permission_cache.clear()
+        return UserLoginData(user_id, self.player_id, email_confirmed, force_password_reset, self.email, self.password_hash)
\ No newline at end of file
@@ -4,6 +4,7 @@ from common.auth import team_permissions, team_roles
 from common.data.command import Command
 from common.data.db import DBWrapper
 from common.data.models import *
+from common.data.permission_cache import PermissionCache
 
 @dataclass
 class ViewRosterEditHistoryCommand(Command[list[RosterEdit]]):
@@ -12,7 +13,7 @@ class ViewRosterEditHistoryCommand(Command[list[RosterEdit]]):
 
     async def handle(self, db_wrapper: DBWrapper):
         edits: list[RosterEdit] = []
-        async with db_wrapper.connect() as db:
+        async with db_wrapper.connect(readonly=True) as db:
             async with db.execute("""SELECT re.id, re.roster_id, re.old_name, re.new_name, re.old_tag, re.new_tag, re.date, re.approval_status,
                                   r.color, t.color, t.id, re.handled_by, p.name, p.country_code, p.is_banned
                                   FROM roster_edits re JOIN team_rosters r ON re.roster_id = r.id
@@ -176,7 +177,7 @@ class LeaveRosterCommand(Command[None]):
     player_id: int
     roster_id: int
 
-    async def handle(self, db_wrapper: DBWrapper):
+    async def handle(self, db_wrapper: DBWrapper, permission_cache: PermissionCache):
         async with db_wrapper.connect() as db:
             async with db.execute("""SELECT m.id, r.team_id, u.id FROM team_members m
                                   JOIN team_rosters r ON r.id = m.roster_id
@@ -232,6 +233,8 @@ class LeaveRosterCommand(Command[None]):
                 if roster_count == 0:
                     await db.execute("DELETE FROM user_team_roles WHERE user_id = ? AND team_id = ?", (user_id, team_id))
             await db.commit()
+            if user_id is not None:
+                permission_cache.invalidate_user(user_id)
 
 @dataclass
 class RequestEditRosterCommand(Command[None]):
@@ -383,7 +386,7 @@ class ListRosterEditRequestsCommand(Command[RosterEditList]):
         if filter.page is not None:
             offset = (filter.page - 1) * limit
 
-        async with db_wrapper.connect() as db:
+        async with db_wrapper.connect(readonly=True) as db:
             request_query = """FROM roster_edits re JOIN team_rosters r ON re.roster_id = r.id
                                 JOIN teams t ON r.team_id = t.id
                                 LEFT JOIN players p ON re.handled_by = p.id
@@ -416,7 +419,7 @@ class ListRostersCommand(Command[RosterList]):
     filter: RosterFilter
 
     async def handle(self, db_wrapper: DBWrapper):
-        async with db_wrapper.connect() as db:
+        async with db_wrapper.connect(readonly=True) as db:
             filter = self.filter
             limit:int = 50
             offset:int = 0
@@ -477,7 +480,7 @@ class GetRegisterableRostersCommand(Command[list[TeamRoster]]):
     mode: GameMode
 
     async def handle(self, db_wrapper: DBWrapper):
-        async with db_wrapper.connect() as db:
+        async with db_wrapper.connect(readonly=True) as db:
             rosters_query = """
                     FROM team_roles r
                     JOIN user_team_roles ur ON ur.role_id = r.id
@@ -592,7 +595,7 @@ class EditTeamMemberCommand(Command[None]):
     leave_date: int | None
     is_bagger_clause: bool | None
 
-    async def handle(self, db_wrapper: DBWrapper):
+    async def handle(self, db_wrapper: DBWrapper, permission_cache: PermissionCache):
         async with db_wrapper.connect() as db:
             async with db.execute("""SELECT m.id, m.join_date, m.leave_date, m.is_bagger_clause, u.id FROM team_members m
                                     JOIN team_rosters r ON m.roster_id = r.id
@@ -658,4 +661,6 @@ class EditTeamMemberCommand(Command[None]):
                         await db.execute("DELETE FROM user_team_roles WHERE user_id = ? AND team_id = ?", (user_id, self.team_id))
                     
             await db.execute("UPDATE team_members SET join_date = ?, leave_date = ?, is_bagger_clause = ? WHERE id = ?", (self.join_date, self.leave_date, self.is_bagger_clause, id))
-            await db.commit()
\ No newline at end of file
+            await db.commit()
+            if user_id is not None:
+                permission_cache.invalidate_user(user_id)
\ No newline at end of file
@@ -4,6 +4,7 @@ from common.auth import team_roles
 from common.data.command import Command
 from common.data.db import DBWrapper
 from common.data.models import *
+from common.data.permission_cache import PermissionCache
 from common.data.s3 import S3Wrapper, IMAGE_BUCKET
 import base64
 
@@ -24,7 +25,7 @@ class CreateTeamCommand(Command[int | None]):
     is_privileged: bool
     user_id: int | None = None
 
-    async def handle(self, db_wrapper: DBWrapper, s3_wrapper: S3Wrapper):
+    async def handle(self, db_wrapper: DBWrapper, s3_wrapper: S3Wrapper, permission_cache: PermissionCache):
         async with db_wrapper.connect() as db:
             name = self.name.strip()
             tag = self.tag.strip()
@@ -84,6 +85,8 @@ class CreateTeamCommand(Command[int | None]):
                 logo_data = base64.b64decode(self.logo_file)
                 await s3_wrapper.put_object(IMAGE_BUCKET, key=logo_filename, body=logo_data, acl="public-read")
             await db.commit()
+            if self.user_id is not None:
+                permission_cache.invalidate_user(self.user_id)
             return team_id
 
 @dataclass
@@ -91,7 +94,7 @@ class GetTeamInfoCommand(Command[Team]):
     team_id: int
 
     async def handle(self, db_wrapper: DBWrapper):
-        async with db_wrapper.connect() as db:
+        async with db_wrapper.connect(readonly=True) as db:
             async with db.execute("SELECT name, tag, description, creation_date, language, color, logo, approval_status, is_historical FROM teams WHERE id = ?",
                 (self.team_id,)) as cursor:
                 row = await cursor.fetchone()
@@ -366,7 +369,7 @@ class ViewTeamEditHistoryCommand(Command[list[TeamEdit]]):
 
     async def handle(self, db_wrapper: DBWrapper):
         edits: list[TeamEdit] = []
-        async with db_wrapper.connect() as db:
+        async with db_wrapper.connect(readonly=True) as db:
             async with db.execute("""SELECT r.id, r.team_id, r.old_name, r.new_name, r.old_tag, r.new_tag, r.date, r.approval_status, r.handled_by, p.name, p.country_code, p.is_banned, t.color
                                     FROM team_edits r
                                     JOIN teams t ON r.team_id = t.id
@@ -441,7 +444,7 @@ class ListTeamEditRequestsCommand(Command[TeamEditList]):
                             LEFT JOIN players p ON r.handled_by = p.id
                             WHERE r.approval_status = ?"""
         
-        async with db_wrapper.connect() as db:
+        async with db_wrapper.connect(readonly=True) as db:
             async with db.execute(f"""SELECT r.id, r.team_id, r.old_name, r.new_name, r.old_tag, r.new_tag, r.date, r.approval_status, r.handled_by, p.name, p.country_code, p.is_banned, t.color
                                     {request_query} ORDER BY r.date DESC LIMIT ? OFFSET ?""", (filter.approval_status, limit, offset)) as cursor:
                 rows = await cursor.fetchall()
@@ -471,7 +474,7 @@ class ListTeamsCommand(Command[TeamList]):
 
     async def handle(self, db_wrapper: DBWrapper):
         team_filter = self.team_filter
-        async with db_wrapper.connect() as db:
+        async with db_wrapper.connect(readonly=True) as db:
 
             limit: int = 50
             offset: int = 0
@@ -576,7 +579,7 @@ class MergeTeamsCommand(Command[None]):
     from_team_id: int
     to_team_id: int
 
-    async def handle(self, db_wrapper: DBWrapper):
+    async def handle(self, db_wrapper: DBWrapper, permission_cache: PermissionCache):
         if self.from_team_id == self.to_team_id:
             raise Problem("Team IDs are equal", status=400)
         async with db_wrapper.connect() as db:
@@ -595,7 +598,10 @@ class MergeTeamsCommand(Command[None]):
             await db.execute("UPDATE team_rosters SET color = ? WHERE team_id = ? AND color IS NULL", (old_color, self.from_team_id))
 
             await db.execute("UPDATE team_rosters SET team_id = ? WHERE team_id = ?", (self.to_team_id, self.from_team_id))
+            async with db.execute("SELECT DISTINCT user_id FROM user_team_roles WHERE team_id = ?", (self.from_team_id,)) as cursor:
+                role_user_ids: list[int] = [row[0] for row in await cursor.fetchall()]
             await db.execute("DELETE FROM user_team_roles WHERE team_id = ?", (self.from_team_id,))
             await db.execute("DELETE FROM team_edits WHERE team_id = ?", (self.from_team_id,))
             await db.execute("DELETE FROM teams WHERE id = ?", (self.from_team_id,))
-            await db.commit()
\ No newline at end of file
+            await db.commit()
+            permission_cache.invalidate_user(*role_user_ids)
\ No newline at end of file
@@ -3,12 +3,13 @@ from datetime import datetime, timezone
 from common.data.command import Command
 from common.data.db import DBWrapper
 from common.data.models import *
+from common.data.permission_cache import PermissionCache
 
 @dataclass
 class ApproveTransferCommand(Command[None]):
     invite_id: int
 
-    async def handle(self, db_wrapper: DBWrapper):
+    async def handle(self, db_wrapper: DBWrapper, permission_cache: PermissionCache):
         async with db_wrapper.connect() as db:
             async with db.execute("""SELECT tt.player_id, tt.roster_id, tt.roster_leave_id, tt.is_accepted, tt.is_bagger_clause, tt.approval_status, r1.team_id, r2.team_id, u.id
                                   FROM team_transfers tt
@@ -157,6 +158,8 @@ class ApproveTransferCommand(Command[None]):
                 if roster_count == 0:
                     await db.execute("DELETE FROM user_team_roles WHERE user_id = ? AND team_id = ?", (user_id, leave_team_id))
             await db.commit()
+            if user_id is not None:
+                permission_cache.invalidate_user(user_id)
 
 @dataclass
 class DenyTransferCommand(Command[None]):
@@ -217,7 +220,7 @@ class ViewTransfersCommand(Command[TransferList]):
         if len(where_clauses) > 0:
             where_clause_str = f"AND {' AND '.join(where_clauses)}"
 
-        async with db_wrapper.connect() as db:
+        async with db_wrapper.connect(readonly=True) as db:
             # we need to do left outer joins with both the leave roster and the join roster,
             # since it's possible one of them doesn't exist.
             async with db.execute(f"""SELECT i.id, i.date, i.approval_status, i.is_bagger_clause,
@@ -307,7 +310,7 @@ class ForceTransferPlayerCommand(Command[None]):
     roster_leave_id: int | None
     is_bagger_clause: bool
 
-    async def handle(self, db_wrapper: DBWrapper):
+    async def handle(self, db_wrapper: DBWrapper, permission_cache: PermissionCache):
         async with db_wrapper.connect() as db:
             async with db.execute("""SELECT p.id, u.id FROM players p
                                     LEFT JOIN users u ON u.player_id = p.id
@@ -450,6 +453,8 @@ class ForceTransferPlayerCommand(Command[None]):
                     await db.execute("DELETE FROM user_team_roles WHERE user_id = ? AND team_id = ?", (user_id, leave_team_id))
 
             await db.commit()
+            if user_id is not None:
+                permission_cache.invalidate_user(user_id)
 
 @dataclass
 class ToggleTeamMemberBaggerCommand(Command[None]):
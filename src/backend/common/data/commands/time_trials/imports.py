@@ -0,0 +1,225 @@
+from collections.abc import AsyncIterable, AsyncIterator, Callable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from logging import getLogger
+from typing import Any, Literal, cast
+import asyncio
+import csv
+import msgspec
+import os
+import tempfile
+import uuid
+from common.data.command import Command
+from common.data.duckdb.leaderboards import LeaderboardCache
+from common.data.duckdb.proofs import VALIDATION_STATUS_EXPRESSION
+from common.data.duckdb.wrapper import DuckDBWrapper, transaction, write_ndjson
+from common.data.models import *
+from common.data.player_cache import PlayerSummaryCache
+from common.gamedata import gamedata
+
+logger = getLogger(__name__)
+
+TRACKS_BY_GAME = {game_id: {track["id"] for track in game["tracks"]} for game_id, game in gamedata["games"].items()}
+
+TRIAL_COLUMNS = "{'id': 'VARCHAR', 'player_id': 'INTEGER', 'game': 'VARCHAR', 'track': 'VARCHAR', 'time_ms': 'INTEGER', 'created_at': 'VARCHAR'}"
+PROOF_COLUMNS = "{'id': 'VARCHAR', 'time_trial_id': 'VARCHAR', 'url': 'VARCHAR', 'type': 'VARCHAR', 'status': 'VARCHAR', 'created_at': 'VARCHAR'}"
+
+
+@dataclass
+class _ImportedTrial:
+    id: str
+    player_id: int
+    game: str
+    track: str
+    time_ms: int
+    created_at: str
+
+
+@dataclass
+class _ImportedProof:
+    id: str
+    time_trial_id: str
+    url: str
+    type: str
+    status: str
+    created_at: str
+
+
+async def _iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig").rstrip("\r")
+    if buffer:
+        yield buffer.decode("utf-8-sig").rstrip("\r")
+
+
+def _validate_row(row: TimeTrialImportRow, now: str) -> tuple[_ImportedTrial, _ImportedProof | None]:
+    if row.player_id <= 0:
+        raise ValueError("Player ID is required")
+    if row.time_ms <= 0:
+        raise ValueError("Time must be positive")
+    game_tracks = TRACKS_BY_GAME.get(row.game)
+    if game_tracks is None:
+        raise ValueError(f"Unknown game {row.game}")
+    if row.track not in game_tracks:
+        raise ValueError(f"Unknown track {row.track} for game {row.game}")
+
+    created_at = now
+    if row.created_at:
+        created_at_date = datetime.fromisoformat(row.created_at)
+        if created_at_date.tzinfo is None:
+            created_at_date = created_at_date.replace(tzinfo=timezone.utc)
+        created_at = created_at_date.astimezone(timezone.utc).isoformat()
+
+    trial = _ImportedTrial(str(uuid.uuid4()), row.player_id, row.game, row.track, row.time_ms, created_at)
+    proof = None
+    if row.proof_url:
+        if not row.proof_type:
+            raise ValueError("Proof type is required when a proof URL is given")
+        proof = _ImportedProof(str(uuid.uuid4()), trial.id, row.proof_url.strip(), row.proof_type.strip(), row.proof_status, created_at)
+    return trial, proof
+
+
+@dataclass
+class ImportTimeTrialsCommand(Command[TimeTrialImportResponseData]):
+    """
+    Bulk import time trials from a stream of CSV or newline-delimited JSON. Rows are checked against the
+    game data and the players table, then appended to DuckDB in batches with COPY-style reads of a
+    temporary file. Rows for a player, game, track and time which are already recorded are skipped,
+    so an import can be run again after it is interrupted. CSV fields can't contain line breaks.
+    """
+    chunks: AsyncIterable[bytes]
+    format: Literal["csv", "ndjson"] = "csv"
+    dry_run: bool = False
+
+    BATCH_SIZE = 5000
+    MAX_ERRORS = 100
+
+    async def handle(self, duckdb_wrapper: DuckDBWrapper, leaderboard_cache: LeaderboardCache, player_cache: PlayerSummaryCache) -> TimeTrialImportResponseData:
+        result = TimeTrialImportResponseData(dry_run=self.dry_run)
+        now = datetime.now(timezone.utc).isoformat()
+        touched_tracks: set[tuple[str, str]] = set()
+        # (player_id, game, track, time_ms) of every row accepted so far, so repeats within the file count as duplicates
+        seen_trials: set[tuple[int, str, str, int]] = set()
+        batch: list[tuple[int, TimeTrialImportRow]] = []
+        header: list[str] | None = None
+        decoder = msgspec.json.Decoder(TimeTrialImportRow)
+
+        def reject(line: int, error: str):
+            result.rejected += 1
+            if len(result.errors) < self.MAX_ERRORS:
+                result.errors.append(TimeTrialImportError(line, error))
+
+        line_number = 0
+        async for line in _iter_lines(self.chunks):
+            line_number += 1
+            if not line.strip():
+                continue
+            try:
+                if self.format == "ndjson":
+                    row = decoder.decode(line)
+                else:
+                    values = next(csv.reader([line]))
+                    if header is None:
+                        header = [column.strip() for column in values]
+                        continue
+                    # empty CSV fields are treated as missing, so optional columns can be left blank
+                    fields = {column: value for column, value in zip(header, values) if value != ""}
+                    row = msgspec.convert(fields, TimeTrialImportRow, strict=False)
+            except (msgspec.ValidationError, msgspec.DecodeError) as e:
+                result.processed += 1
+                reject(line_number, str(e))
+                continue
+            result.processed += 1
+            batch.append((line_number, row))
+            if len(batch) >= self.BATCH_SIZE:
+                await self._import_batch(player_cache, duckdb_wrapper, batch, now, result, reject, touched_tracks, seen_trials)
+                batch = []
+        if batch:
+            await self._import_batch(player_cache, duckdb_wrapper, batch, now, result, reject, touched_tracks, seen_trials)
+
+        for game, track in touched_tracks:
+            await leaderboard_cache.invalidate(game, track)
+        # rows failing to parse are rejected before those in their batch failing validation
+        result.errors.sort(key=lambda error: error.line)
+        logger.info(f"Finished time trial import{' (dry run)' if self.dry_run else ''}: {result.processed} rows, {result.imported} imported, {result.duplicates} duplicates, {result.rejected} rejected")
+        return result
+
+    async def _import_batch(self, player_cache: PlayerSummaryCache, duckdb_wrapper: DuckDBWrapper, batch: list[tuple[int, TimeTrialImportRow]],
+                            now: str, result: TimeTrialImportResponseData, reject: Callable[[int, str], None], touched_tracks: set[tuple[str, str]],
+                            seen_trials: set[tuple[int, str, str, int]]):
+        existing_players = await player_cache.get_many({row.player_id for _, row in batch})
+
+        trials: list[_ImportedTrial] = []
+        proofs: list[_ImportedProof] = []
+        for line, row in batch:
+            try:
+                trial, proof = _validate_row(row, now)
+            except ValueError as e:
+                reject(line, str(e))
+                continue
+            if trial.player_id not in existing_players:
+                reject(line, f"Player {trial.player_id} not found")
+                continue
+            # the NOT EXISTS check below only sees rows already in the table, which doesn't include earlier
+            # rows from this file during a dry run or earlier rows from this batch at all
+            key = (trial.player_id, trial.game, trial.track, trial.time_ms)
+            if key in seen_trials:
+                result.duplicates += 1
+                continue
+            seen_trials.add(key)
+            trials.append(trial)
+            if proof:
+                proofs.append(proof)
+        if not trials:
+            return
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            trials_path = os.path.join(temp_dir, "time_trials.ndjson")
+            proofs_path = os.path.join(temp_dir, "time_trial_proofs.ndjson")
+            await asyncio.to_thread(write_ndjson, trials_path, trials)
+            if proofs:
+                await asyncio.to_thread(write_ndjson, proofs_path, proofs)
+
+            new_trials_query = f"""
+                FROM read_json($trials_path, format = 'newline_delimited', columns = {TRIAL_COLUMNS}) i
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM time_trials tt
+                    WHERE tt.player_id = i.player_id AND tt.game = i.game AND tt.track = i.track AND tt.time_ms = i.time_ms
+                )
+            """
+            async with duckdb_wrapper.connection() as conn:
+                if self.dry_run:
+                    async with conn.execute(f"SELECT count(*) {new_trials_query}", {"trials_path": trials_path}) as cursor:
+                        count_row = cast(tuple[int], await cursor.fetchone()) # pyright: ignore[reportUnknownMemberType]
+                        imported = count_row[0]
+                else:
+                    async with transaction(conn):
+                        cursor = await conn.execute_on_self(f"""
+                            INSERT INTO time_trials (id, version, player_id, game, track, time_ms, is_invalid, validation_status, created_at, updated_at)
+                            SELECT i.id, 1, i.player_id, i.game, i.track, i.time_ms, false, 'proofless', CAST(i.created_at AS TIMESTAMP), CAST(i.created_at AS TIMESTAMP)
+                            {new_trials_query}
+                            RETURNING id
+                        """, {"trials_path": trials_path})
+                        imported = len(cast(list[tuple[Any, ...]], await cursor.fetchall())) # pyright: ignore[reportUnknownMemberType]
+                        # records are inserted as proofless, so only those with a proof need their status recalculated
+                        if proofs:
+                            await conn.execute_on_self(f"""
+                                INSERT INTO time_trial_proofs (id, time_trial_id, position, url, type, status, validator_id, validated_at, created_at)
+                                SELECT p.id, p.time_trial_id, 0, p.url, p.type, p.status, NULL, NULL, p.created_at
+                                FROM read_json($proofs_path, format = 'newline_delimited', columns = {PROOF_COLUMNS}) p
+                                WHERE EXISTS (SELECT 1 FROM time_trials tt WHERE tt.id = p.time_trial_id)
+                            """, {"proofs_path": proofs_path})
+                            await conn.execute_on_self(f"""
+                                UPDATE time_trials SET validation_status = {VALIDATION_STATUS_EXPRESSION}
+                                WHERE id IN (SELECT time_trial_id FROM read_json($proofs_path, format = 'newline_delimited', columns = {PROOF_COLUMNS}))
+                            """, {"proofs_path": proofs_path})
+
+        result.imported += imported
+        result.duplicates += len(trials) - imported
+        if not self.dry_run:
+            touched_tracks.update((trial.game, trial.track) for trial in trials)
+        logger.info(f"Time trial import{' (dry run)' if self.dry_run else ''} progress: {result.processed} rows, {result.imported} imported, {result.duplicates} duplicates, {result.rejected} rejected")
@@ -1,14 +1,14 @@
 from collections.abc import AsyncIterator, Iterable
-from dataclasses import dataclass, field
-from logging import getLogger
+from dataclasses import dataclass, field, replace
 from typing import cast
 from datetime import datetime, timezone
-import msgspec
 import uuid
 from common.data.command import Command
-from common.data.db import DBWrapper
+from common.data.player_cache import PlayerSummaryCache
 from common.data.duckdb.models import TimeTrial, TimeTrialProof
-from common.data.duckdb.wrapper import DuckDBWrapper
+from common.data.duckdb.proofs import VALIDATION_STATUS_EXPRESSION, insert_proofs, proofs_column, proofs_from_column, replace_proofs
+from common.data.duckdb.wrapper import DuckDBWrapper, transaction
+from common.data.duckdb.leaderboards import RECORD_COLUMNS, LeaderboardCache, RankKey, decode_cursor, encode_cursor, get_leaderboard_filter, leaderboard_record_from_row, rank_key
 from common.data.models import *
 
 def calculate_validation_status(proofs_data: list[TimeTrialProof], record_is_invalid: bool = False) -> str:
@@ -49,7 +49,7 @@ class CreateTimeTrialCommand(Command[TimeTrial]):
     time_ms: int
     proofs: list[ProofRequestData] = field(default_factory=lambda: [])
     
-    async def handle(self, duckdb_wrapper: DuckDBWrapper) -> TimeTrial:
+    async def handle(self, duckdb_wrapper: DuckDBWrapper, leaderboard_cache: LeaderboardCache) -> TimeTrial:
         # Input validation following established patterns
         if self.time_ms <= 0:
             raise Problem("Time must be positive", status=400)
@@ -98,25 +98,26 @@ class CreateTimeTrialCommand(Command[TimeTrial]):
             updated_at=now
         )
 
-        async with duckdb_wrapper.connection() as conn:
+        async with duckdb_wrapper.connection() as conn, transaction(conn):
             insert_time_trial_query = """
-                INSERT INTO time_trials (id, version, player_id, game, track, time_ms, proofs, is_invalid, validation_status, created_at, updated_at)
-                VALUES ($id, $version, $player_id, $game, $track, $time_ms, $proofs, $is_invalid, $validation_status, $created_at, $updated_at)
+                INSERT INTO time_trials (id, version, player_id, game, track, time_ms, is_invalid, validation_status, created_at, updated_at)
+                VALUES ($id, $version, $player_id, $game, $track, $time_ms, $is_invalid, $validation_status, $created_at, $updated_at)
             """
-            await conn.execute(insert_time_trial_query, {
+            await conn.execute_on_self(insert_time_trial_query, {
                 "id": time_trial.id,
                 "version": time_trial.version,
                 "player_id": time_trial.player_id,
                 "game": time_trial.game,
                 "track": time_trial.track,
                 "time_ms": time_trial.time_ms,
-                "proofs": msgspec.json.encode(time_trial.proofs).decode(),
                 "is_invalid": time_trial.is_invalid,
                 "validation_status": time_trial.validation_status,
                 "created_at": time_trial.created_at,
                 "updated_at": time_trial.updated_at,
             })
-        
+            await insert_proofs(conn, time_trial.id, time_trial.proofs)
+
+        await leaderboard_cache.refresh_player(time_trial.game, time_trial.track, time_trial.player_id)
         return time_trial
 
 
@@ -126,14 +127,14 @@ class GetTimeTrialCommand(Command[TimeTrialResponseData | None]):
     
     trial_id: str
 
-    async def handle(self, db_wrapper: DBWrapper, duckdb_wrapper: DuckDBWrapper) -> TimeTrialResponseData | None:
+    async def handle(self, duckdb_wrapper: DuckDBWrapper, player_cache: PlayerSummaryCache) -> TimeTrialResponseData | None:
         if not self.trial_id.strip():
             raise Problem("Trial ID is required", status=400)
 
         async with duckdb_wrapper.connection() as conn:
-            # Retrieve time trial record with embedded proofs
+            # Retrieve time trial record with its proofs
             get_time_trial_query = f"""
-                SELECT tt.id, tt.version, tt.player_id, tt.game, tt.track, tt.time_ms, tt.proofs, tt.created_at, tt.updated_at, tt.validation_status
+                SELECT tt.id, tt.version, tt.player_id, tt.game, tt.track, tt.time_ms, {proofs_column()}, tt.created_at, tt.updated_at, tt.validation_status
                 FROM time_trials tt
                 WHERE tt.id = $trial_id
             """
@@ -142,16 +143,11 @@ class GetTimeTrialCommand(Command[TimeTrialResponseData | None]):
                 if row is None:
                     return None
 
-        (id, version, player_id, game, track, time_ms, proofs_json, created_at, updated_at, validation_status) = row
-        proofs_obj = msgspec.json.decode(proofs_json, type=list[TimeTrialProof]) if proofs_json else []
+        (id, version, player_id, game, track, time_ms, proofs, created_at, updated_at, validation_status) = row
+        proofs_obj = proofs_from_column(proofs)
 
-        player_name, player_country_code = None, None
-        async with db_wrapper.connect() as conn:
-            player_query = "SELECT name, country_code FROM players WHERE id = :player_id"
-            async with conn.execute(player_query, {"player_id": player_id}) as cursor:
-                player_row = await cursor.fetchone()
-                if player_row:
-                    player_name, player_country_code = player_row
+        player = await player_cache.get(player_id)
+        player_name, player_country_code = (player.name, player.country_code) if player else (None, None)
 
         response_proofs = [
             ProofResponseData(
@@ -182,6 +178,62 @@ class GetTimeTrialCommand(Command[TimeTrialResponseData | None]):
         )
 
 
+async def _set_proof_status(duckdb_wrapper: DuckDBWrapper, time_trial_id: str, proof_id: str, version: int, status: str, validator_id: int) -> tuple[str, str, int]:
+    """Sets the status of one of a time trial's proofs and recomputes its validation status, returning its game, track and player ID."""
+    now_iso = datetime.now(timezone.utc).isoformat()
+
+    async with duckdb_wrapper.connection() as conn, transaction(conn):
+        find_trial_query = """
+            SELECT is_invalid, version, game, track, player_id
+            FROM time_trials
+            WHERE id = $time_trial_id
+        """
+        # The cursor returned by execute_on_self is the connection itself, so it must not be closed
+        cursor = await conn.execute_on_self(find_trial_query, {"time_trial_id": time_trial_id})
+        trial_row = cast(tuple[Any, ...] | None, await cursor.fetchone()) # pyright: ignore[reportUnknownMemberType]
+        if not trial_row:
+            raise Problem(f"Time trial with ID {time_trial_id} not found", status=404)
+
+        is_invalid, current_version, game, track, player_id = trial_row
+
+        # Check version for optimistic locking
+        if current_version != version:
+            raise Problem(f"Version mismatch. Expected version {version}, but current version is {current_version}. Please refresh and try again.", status=409)
+
+        if is_invalid:
+            raise Problem(f"Time trial {time_trial_id} is marked as invalid", status=400)
+
+        update_proof_query = """
+            UPDATE time_trial_proofs
+            SET status = $status, validator_id = $validator_id, validated_at = $validated_at
+            WHERE id = $proof_id AND time_trial_id = $time_trial_id
+            RETURNING id
+        """
+        cursor = await conn.execute_on_self(update_proof_query, {
+            "status": status,
+            "validator_id": validator_id,
+            "validated_at": now_iso,
+            "proof_id": proof_id,
+            "time_trial_id": time_trial_id,
+        })
+        if await cursor.fetchone() is None: # pyright: ignore[reportUnknownMemberType]
+            raise Problem(f"Proof with id {proof_id} not found in time trial {time_trial_id}", status=404)
+
+        update_trial_query = f"""
+            UPDATE time_trials
+            SET validation_status = {VALIDATION_STATUS_EXPRESSION}, version = $version, updated_at = $updated_at
+            WHERE id = $time_trial_id AND version = $current_version
+        """
+        await conn.execute_on_self(update_trial_query, {
+            "version": current_version + 1,
+            "updated_at": now_iso,
+            "time_trial_id": time_trial_id,
+            "current_version": current_version
+        })
+
+    return game, track, player_id
+
+
 @dataclass
 class MarkProofInvalidCommand(Command[None]):
     """Mark an entire proof as invalid"""
@@ -191,68 +243,15 @@ class MarkProofInvalidCommand(Command[None]):
     validated_by_player_id: int
     version: int
 
-    async def handle(self, duckdb_wrapper: DuckDBWrapper) -> None:
+    async def handle(self, duckdb_wrapper: DuckDBWrapper, leaderboard_cache: LeaderboardCache) -> None:
         # Input validation
         if not self.proof_id.strip():
             raise Problem("Proof ID is required", status=400)
         if self.validated_by_player_id < 0:
             raise Problem("Validator player ID is required", status=400)
-            
-        now_iso = datetime.now(timezone.utc).isoformat()
 
-        async with duckdb_wrapper.connection() as conn:
-            # Find the time trial that contains this proof_id in its embedded proofs
-            find_trial_query = """
-                SELECT proofs, is_invalid, version 
-                FROM time_trials 
-                WHERE id = $trial_id
-            """
-            async with conn.execute(find_trial_query, {"trial_id": self.time_trial_id}) as cursor:
-                trial_rows = cast(tuple[Any, ...] | None, await cursor.fetchone()) # pyright: ignore[reportUnknownMemberType]
-                if not trial_rows:
-                    raise Problem(f"Time trial with ID {self.time_trial_id} not found", status=404)
-            
-            # Parse the JSON string to get the actual proofs data
-            proofs_json, is_invalid, current_version = trial_rows
-            
-            # Check version for optimistic locking
-            if current_version != self.version:
-                raise Problem(f"Version mismatch. Expected version {self.version}, but current version is {current_version}. Please refresh and try again.", status=409)
-            
-            if is_invalid:
-                raise Problem(f"Time trial {self.time_trial_id} is marked as invalid", status=400)
-
-            proofs_data = msgspec.json.decode(proofs_json, type=list[TimeTrialProof]) if proofs_json else []
-
-            proof_data = None
-            for proof in proofs_data:
-                if proof.id == self.proof_id:
-                    proof_data = proof
-                    break
-            
-            if proof_data is None:
-                raise Problem(f"Proof with id {self.proof_id} not found in time trial {self.time_trial_id}", status=404)
-
-            proof_data.status = "invalid"
-            proof_data.validator_id = self.validated_by_player_id
-            proof_data.validated_at = now_iso
-
-            new_validation_status = calculate_validation_status(proofs_data, record_is_invalid=False)
-            new_version = current_version + 1
-
-            update_trial_query = """
-                UPDATE time_trials 
-                SET proofs = $proofs, validation_status = $validation_status, version = $version, updated_at = $updated_at
-                WHERE id = $time_trial_id AND version = $current_version
-            """
-            await conn.execute(update_trial_query, {
-                "proofs": msgspec.json.encode(proofs_data).decode(),
-                "validation_status": new_validation_status,
-                "version": new_version,
-                "updated_at": now_iso,
-                "time_trial_id": self.time_trial_id,
-                "current_version": current_version
-            })
+        game, track, player_id = await _set_proof_status(duckdb_wrapper, self.time_trial_id, self.proof_id, self.version, "invalid", self.validated_by_player_id)
+        await leaderboard_cache.refresh_player(game, track, player_id)
 
 
 @dataclass
@@ -264,274 +263,218 @@ class MarkProofValidCommand(Command[None]):
     validated_by_player_id: int
     version: int
 
-    async def handle(self, duckdb_wrapper: DuckDBWrapper) -> None:
+    async def handle(self, duckdb_wrapper: DuckDBWrapper, leaderboard_cache: LeaderboardCache) -> None:
         if not self.proof_id.strip():
             raise Problem("Proof ID is required", status=400)
         if self.validated_by_player_id < 0:
             raise Problem("Validator player ID is required", status=400)
-            
-        now_iso = datetime.now(timezone.utc).isoformat()
 
-        async with duckdb_wrapper.connection() as conn:
-            # Find the time trial that contains this proof_id in its embedded proofs
-            find_trial_query = """
-                SELECT proofs, is_invalid, version 
-                FROM time_trials 
-                WHERE id = $time_trial_id
-            """
-            async with conn.execute(find_trial_query, {"time_trial_id": self.time_trial_id}) as cursor:
-                trial_rows = cast(tuple[Any, ...] | None, await cursor.fetchone()) # pyright: ignore[reportUnknownMemberType]
-                if not trial_rows:
-                    raise Problem(f"Time trial with ID {self.time_trial_id} not found", status=404)
-            
-            # Parse the JSON string to get the actual proofs data
-            proofs_json, is_invalid, current_version = trial_rows
-            
-            if current_version != self.version:
-                raise Problem(f"Version mismatch. Expected version {self.version}, but current version is {current_version}. Please refresh and try again.", status=409)
-            
-            if is_invalid:
-                raise Problem(f"Time trial {self.time_trial_id} is marked as invalid", status=400)
+        game, track, player_id = await _set_proof_status(duckdb_wrapper, self.time_trial_id, self.proof_id, self.version, "valid", self.validated_by_player_id)
+        await leaderboard_cache.refresh_player(game, track, player_id)
 
-            proofs_data = msgspec.json.decode(proofs_json, type=list[TimeTrialProof]) if proofs_json else []
 
-            proof_data = None
-            for proof in proofs_data:
-                if proof.id == self.proof_id:
-                    proof_data = proof
-                    break
-            
-            if proof_data is None:
-                raise Problem(f"Proof with id {self.proof_id} not found in time trial {self.time_trial_id}", status=404)
-
-            proof_data.status = "valid"
-            proof_data.validator_id = self.validated_by_player_id
-            proof_data.validated_at = now_iso
-
-            new_validation_status = calculate_validation_status(proofs_data, record_is_invalid=False)
-            new_version = current_version + 1
-            
-            # Update the time trial with the modified proofs
-            update_trial_query = """
-                UPDATE time_trials 
-                SET proofs = $proofs, validation_status = $validation_status, version = $version, updated_at = $updated_at
-                WHERE id = $time_trial_id AND version = $current_version
-            """
-            await conn.execute(update_trial_query, {
-                "proofs": msgspec.json.encode(proofs_data).decode(),
-                "validation_status": new_validation_status,
-                "version": new_version,
-                "updated_at": now_iso,
-                "time_trial_id": self.time_trial_id,
-                "current_version": current_version
-            })
+def _validation_queue_conditions(game: str | None, track: str | None) -> tuple[str, dict[str, Any]]:
+    conditions = ["true"]
+    params: dict[str, Any] = {}
+    if game:
+        conditions.append("game = $game")
+        params["game"] = game
+    if track:
+        conditions.append("track = $track")
+        params["track"] = track
+    return " AND ".join(conditions), params
 
 
 @dataclass
 class ListProofsForValidationCommand(Command[ListProofsForValidationResponseData]):
-    """List all proofs with their validation statuses."""
-    
-    async def handle(self, db_wrapper: DBWrapper, duckdb_wrapper: DuckDBWrapper) -> ListProofsForValidationResponseData:
+    """List a page of the proofs waiting for validation, oldest time trials first."""
+
+    filter: ProofValidationQueueFilter = field(default_factory=ProofValidationQueueFilter)
+
+    async def handle(self, duckdb_wrapper: DuckDBWrapper, player_cache: PlayerSummaryCache) -> ListProofsForValidationResponseData:
+        limit = 50
+        offset = 0
+        if self.filter.page is not None:
+            offset = (self.filter.page - 1) * limit
+
+        where, params = _validation_queue_conditions(self.filter.game, self.filter.track)
         async with duckdb_wrapper.connection() as conn:
-            get_all_time_trials_query = f"""
-                SELECT 
-                    tt.id, tt.player_id, tt.game, tt.track, tt.time_ms, tt.proofs, tt.version
-                FROM time_trials tt
-                WHERE tt.validation_status = 'unvalidated' AND tt.is_invalid = false
-                ORDER BY tt.created_at DESC
+            get_pending_proofs_query = f"""
+                SELECT proof_id, time_trial_id, player_id, game, track, time_ms, url, type, proof_created_at, version
+                FROM pending_proof_validations
+                WHERE {where}
+                ORDER BY created_at ASC, time_trial_id ASC, position ASC
+                LIMIT $limit OFFSET $offset
             """
-
-            async with conn.execute(get_all_time_trials_query) as cursor:
-                all_trial_rows = cast(Iterable[tuple[Any, ...]], await cursor.fetchall()) # pyright: ignore[reportUnknownMemberType]
+            async with conn.execute(get_pending_proofs_query, {**params, "limit": limit, "offset": offset}) as cursor:
+                proof_rows = cast(Iterable[tuple[Any, ...]], await cursor.fetchall()) # pyright: ignore[reportUnknownMemberType]
 
         response_proofs: list[ProofWithValidationStatusResponseData] = []
         player_ids: set[int] = set()
-        for trial_row in all_trial_rows:
-            tt_id, tt_player_id, tt_game, tt_track, tt_time_ms, tt_proofs_json, tt_version = trial_row
-            
-            try:
-                # Parse embedded proofs
-                proofs_data = msgspec.json.decode(tt_proofs_json, type=list[TimeTrialProof]) if tt_proofs_json else []
-            except msgspec.DecodeError:
-                # Skip malformed time trial records
-                getLogger().error(f"Error decoding JSON for time_trial_id {tt_id}")
-                continue
-
+        for proof_row in proof_rows:
+            p_id, tt_id, tt_player_id, tt_game, tt_track, tt_time_ms, p_url, p_type, p_created_at, tt_version = proof_row
             player_ids.add(tt_player_id)
-
-            # Process each proof in this time trial
-            for proof_data in proofs_data:
-                p_id = proof_data.id
-                if not p_id:
-                    continue
-
-                proof_data_obj = ProofRequestData(
-                    url=proof_data.url,
-                    type=proof_data.type,
+            response_proofs.append(
+                ProofWithValidationStatusResponseData(
+                    id=p_id,
+                    time_trial_id=tt_id,
+                    player_id=tt_player_id,
+                    player_name=None,
+                    player_country_code=None,
+                    game=tt_game,
+                    proof_data=ProofRequestData(url=p_url, type=p_type),
+                    created_at=p_created_at,
+                    track=tt_track,
+                    time_ms=tt_time_ms,
+                    version=tt_version,
                 )
+            )
 
-                p_created_at = proof_data.created_at
-                proof_status = proof_data.status
+        proof_count = await CountProofsForValidationCommand(self.filter.game, self.filter.track).handle(duckdb_wrapper)
 
-                # Check if this proof should be excluded from validation queue
-                should_include_proof = True
-                
-                if proof_status in ["valid", "invalid"]:
-                    should_include_proof = False
-                
-                if not should_include_proof:
-                    continue
+        # Fill in player names and country codes
+        players = await player_cache.get_many(player_ids)
+        for proof in response_proofs:
+            player = players.get(int(proof.player_id))
+            if player:
+                proof.player_name, proof.player_country_code = player.name, player.country_code
 
-                response_proofs.append(
-                    ProofWithValidationStatusResponseData(
-                        id=p_id,
-                        time_trial_id=tt_id,
-                        player_id=tt_player_id,
-                        player_name=None,
-                        player_country_code=None,
-                        game=tt_game,
-                        proof_data=proof_data_obj,
-                        created_at=p_created_at,
-                        track=tt_track,
-                        time_ms=tt_time_ms,
-                        version=tt_version,
-                    )
-                )
-        
-        async with db_wrapper.connect() as conn:
-            # Fetch player names and country codes in bulk
-            if player_ids:
-                placeholders = ', '.join(['?'] * len(player_ids))
-                player_query = f"""
-                    SELECT id, name, country_code 
-                    FROM players 
-                    WHERE id IN ({placeholders})
-                """
-                async with conn.execute(player_query, list(player_ids)) as cursor:
-                    player_rows = await cursor.fetchall()
-                
-                player_map = {row[0]: (row[1], row[2]) for row in player_rows}
-                
-                # Update proofs with player names and country codes
-                for proof in response_proofs:
-                    if proof.player_id in player_map:
-                        proof.player_name, proof.player_country_code = player_map[proof.player_id]
-            
-        return ListProofsForValidationResponseData(proofs=response_proofs)
+        page_count = int(proof_count / limit) + (1 if proof_count % limit else 0)
+        return ListProofsForValidationResponseData(response_proofs, proof_count, page_count)
 
 
 @dataclass
-class GetLeaderboardCommand(Command[list[TimeTrialResponseData]]):
-    game: str
-    track: str
-    include_unvalidated: bool = False  # Include records with unvalidated proofs
-    include_proofless: bool = False    # Include records without proofs
+class CountProofsForValidationCommand(Command[int]):
+    """Count the proofs waiting for validation."""
 
-    async def handle(self, db_wrapper: DBWrapper, duckdb_wrapper: DuckDBWrapper) -> list[TimeTrialResponseData]:
-        # Build validation status filter (additive logic)
-        validation_filters = ["tt.validation_status = 'valid'"]  # Always include valid
-        
-        if self.include_unvalidated:
-            validation_filters.append("tt.validation_status = 'unvalidated'")
-            
-        if self.include_proofless:
-            validation_filters.append("tt.validation_status = 'proofless'")
-        
-        # Never include invalid records (tt.validation_status = 'invalid')
-        validation_condition = f"({' OR '.join(validation_filters)})"
-        
-        # Build WHERE conditions
-        query_params = { "game": self.game, "track": self.track }
-        
-        # Simple and efficient query using precomputed validation_status
+    game: str | None = None
+    track: str | None = None
+
+    async def handle(self, duckdb_wrapper: DuckDBWrapper) -> int:
+        where, params = _validation_queue_conditions(self.game, self.track)
+        async with duckdb_wrapper.connection() as conn:
+            async with conn.execute(f"SELECT COUNT(*) FROM pending_proof_validations WHERE {where}", params) as cursor:
+                row = cast(tuple[int], await cursor.fetchone()) # pyright: ignore[reportUnknownMemberType]
+                return row[0]
+
+
+@dataclass
+class GetLeaderboardCommand(Command[LeaderboardResponseData]):
+    filter: LeaderboardFilter
+
+    MAX_LIMIT = 200
+
+    async def handle(self, duckdb_wrapper: DuckDBWrapper, leaderboard_cache: LeaderboardCache, player_cache: PlayerSummaryCache) -> LeaderboardResponseData:
+        filter = self.filter
+        if filter.limit < 1 or filter.limit > self.MAX_LIMIT:
+            raise Problem(f"Limit must be between 1 and {self.MAX_LIMIT}", status=400)
+        if filter.page is not None and filter.page < 1:
+            raise Problem("Page must be at least 1", status=400)
+        cursor_key = None
+        if filter.cursor is not None:
+            cursor_key = decode_cursor(filter.cursor)
+            if cursor_key is None:
+                raise Problem("Invalid leaderboard cursor", status=400)
+        statuses = get_leaderboard_filter(filter.include_unvalidated, filter.include_proofless)
+
+        if filter.country_code is not None:
+            return await self._get_country_leaderboard(duckdb_wrapper, statuses, cursor_key)
+
+        # Each player's best time is kept in rank order by the leaderboard cache, which also leaves out
+        # invalid records and proofs, so we only have to slice out the requested page.
+        leaderboard = await leaderboard_cache.get(filter.game, filter.track)
+        count = leaderboard.count(statuses)
+
+        if cursor_key is not None:
+            start = leaderboard.index_after(statuses, cursor_key)
+        elif filter.player_id is not None:
+            player_index = leaderboard.index_of_player(statuses, filter.player_id)
+            if player_index is None:
+                raise Problem("Player does not have a time on this leaderboard", status=404)
+            start = player_index - player_index % filter.limit
+        else:
+            start = ((filter.page or 1) - 1) * filter.limit
+        stop = start + filter.limit
+
+        # Records are copied since we fill in the rank and player details below
+        records = [replace(record, rank=leaderboard.rank(statuses, record.time_ms)) for record in leaderboard.records(statuses, start, stop)]
+        page_keys = leaderboard.keys(statuses, start, stop)
+        next_cursor = encode_cursor(page_keys[-1]) if page_keys and stop < count else None
+        player_ids = {record.player_id for record in records}
+
+        # Fill in player names and country codes
+        players = await player_cache.get_many(player_ids)
+        for record in records:
+            player = players.get(record.player_id)
+            if player:
+                record.player_name, record.player_country_code = player.name, player.country_code
+
+        page_count = (count + filter.limit - 1) // filter.limit
+        return LeaderboardResponseData(records, count, start // filter.limit + 1, page_count, next_cursor)
+
+    async def _get_country_leaderboard(self, duckdb_wrapper: DuckDBWrapper, statuses: frozenset[str], cursor_key: RankKey | None) -> LeaderboardResponseData:
+        """
+        Rank only the players from one country. Leaderboards aren't cached per country, so this ranks the
+        records in DuckDB, joined to the players_dim copy of the players table for their country and name.
+        """
+        filter = self.filter
+        params: dict[str, Any] = {
+            "game": filter.game,
+            "track": filter.track,
+            "statuses": sorted(statuses),
+            "country_code": filter.country_code,
+            "limit": filter.limit,
+        }
+        if cursor_key is not None:
+            start_expression = "count(*) FILTER (WHERE (time_ms, created_at, player_id) <= ($cursor_time_ms, $cursor_created_at, $cursor_player_id))"
+            params["cursor_time_ms"], params["cursor_created_at"], params["cursor_player_id"] = cursor_key
+        elif filter.player_id is not None:
+            start_expression = "max(position) FILTER (WHERE player_id = $player_id) // $limit * $limit"
+            params["player_id"] = filter.player_id
+        else:
+            start_expression = "$start"
+            params["start"] = ((filter.page or 1) - 1) * filter.limit
+
+        # bounds always has one row, so the count is returned even if the page is empty
         query = f"""
-            WITH ranked_times AS (
-                SELECT 
-                    tt.id, tt.version, tt.player_id, tt.game, tt.track, tt.time_ms,
-                    tt.proofs, tt.created_at, tt.updated_at, tt.validation_status,
-                    ROW_NUMBER() OVER (
-                        PARTITION BY tt.player_id
-                        ORDER BY tt.time_ms ASC, tt.created_at ASC
-                    ) as rn
+            WITH bests AS (
+                SELECT tt.*, p.name AS player_name, p.country_code AS player_country_code
                 FROM time_trials tt
-                WHERE {validation_condition} AND tt.is_invalid = false AND tt.game = $game AND tt.track = $track
+                JOIN players_dim p ON p.id = tt.player_id
+                WHERE tt.game = $game AND tt.track = $track AND tt.is_invalid = false
+                    AND list_contains($statuses, tt.validation_status) AND p.country_code = $country_code
+                QUALIFY row_number() OVER (PARTITION BY tt.player_id ORDER BY tt.time_ms ASC, tt.created_at ASC) = 1
+            ), ranked AS (
+                SELECT *, rank() OVER (ORDER BY time_ms) AS rank,
+                    row_number() OVER (ORDER BY time_ms, created_at, player_id) - 1 AS position
+                FROM bests
+            ), bounds AS (
+                SELECT count(*) AS count, {start_expression} AS start FROM ranked
             )
-            SELECT 
-                ranked_times.id, version, player_id, game, track, time_ms,
-                proofs, created_at, updated_at, validation_status
-            FROM ranked_times
-            WHERE rn = 1
-            ORDER BY time_ms ASC, created_at ASC
+            SELECT b.count, b.start, {RECORD_COLUMNS}, tt.rank, tt.player_name, tt.player_country_code
+            FROM bounds b
+            LEFT JOIN ranked tt ON tt.position >= b.start AND tt.position < b.start + $limit
+            ORDER BY tt.position
         """
-
-        player_ids: set[int] = set()
-
         records: list[TimeTrialResponseData] = []
+        keys: list[RankKey] = []
+        count, start = 0, None
         async with duckdb_wrapper.connection() as conn:
-            async with conn.execute(query, query_params) as cursor:
+            async with conn.execute(query, params) as cursor:
                 async for row in cast(AsyncIterator[tuple[Any, ...]], cursor):
-                    try:
-                        id, version, player_id, game, track, time_ms, proofs_str, created_at, updated_at, validation_status = row
-                        # Parse proofs JSON and filter out invalid ones for response
-                        proofs_data = msgspec.json.decode(proofs_str, type=list[TimeTrialProof]) if proofs_str else []
-                        proof_responses: list[ProofResponseData] = []
-                        for proof in proofs_data:
-                            # Only include proofs that are not marked as invalid
-                            proof_status = proof.status
-                            if proof_status != "invalid":
-                                proof_responses.append(ProofResponseData(
-                                    id=proof.id,
-                                    url=proof.url,
-                                    type=proof.type,
-                                    created_at=proof.created_at,
-                                    status=proof_status,
-                                    validator_id=proof.validator_id,
-                                    validated_at=proof.validated_at,
-                                ))
-
-                        player_ids.add(player_id)
-                        
-                        record = TimeTrialResponseData(
-                            id=id,
-                            version=version,
-                            player_id=player_id,
-                            game=game,
-                            track=track,
-                            time_ms=time_ms,
-                            proofs=proof_responses,
-                            created_at=created_at,
-                            updated_at=updated_at,
-                            player_name=None,
-                            player_country_code=None,
-                            validation_status=validation_status
-                        )
-
-                        records.append(record)
-                        
-                    except Exception as e:
-                        getLogger().error(f"Error processing leaderboard record {row[0]}: {e}")
+                    count, start = row[0], row[1]
+                    if row[2] is None:
                         continue
-        
-        async with db_wrapper.connect() as conn:
-            # Fetch player names and country codes in bulk
-            if player_ids:
-                placeholders = ', '.join(['?'] * len(player_ids))
-                player_query = f"""
-                    SELECT id, name, country_code 
-                    FROM players 
-                    WHERE id IN ({placeholders})
-                """
-                async with conn.execute(player_query, list(player_ids)) as cursor:
-                    player_rows = await cursor.fetchall()
-                
-                player_map = {row[0]: (row[1], row[2]) for row in player_rows}
-                
-                # Update records with player names and country codes
-                for record in records:
-                    if record.player_id in player_map:
-                        record.player_name, record.player_country_code = player_map[record.player_id]
-           
-        return records
+                    record = leaderboard_record_from_row(row[2:-3])
+                    record.rank, record.player_name, record.player_country_code = row[-3:]
+                    records.append(record)
+                    keys.append(rank_key(record))
+
+        if start is None:
+            raise Problem("Player does not have a time on this leaderboard", status=404)
+        next_cursor = encode_cursor(keys[-1]) if keys and start + filter.limit < count else None
+        page_count = (count + filter.limit - 1) // filter.limit
+        return LeaderboardResponseData(records, count, start // filter.limit + 1, page_count, next_cursor)
 
 
 @dataclass
@@ -542,7 +485,7 @@ class MarkTimeTrialInvalidCommand(Command[None]):
     validated_by_player_id: str
     version: int
 
-    async def handle(self, db_wrapper: DBWrapper, duckdb_wrapper: DuckDBWrapper) -> None:
+    async def handle(self, duckdb_wrapper: DuckDBWrapper, leaderboard_cache: LeaderboardCache) -> None:
         # Input validation
         if not self.time_trial_id.strip():
             raise Problem("Time trial ID is required", status=400)
@@ -554,16 +497,16 @@ class MarkTimeTrialInvalidCommand(Command[None]):
         async with duckdb_wrapper.connection() as conn:
             # Check if the time trial exists and get current version
             check_trial_query = """
-                SELECT id, is_invalid, version 
+                SELECT id, is_invalid, version, game, track, player_id
                 FROM time_trials 
                 WHERE id = $time_trial_id
             """
             async with conn.execute(check_trial_query, {"time_trial_id": self.time_trial_id}) as cursor:
-                trial_row = cast(tuple[str, bool, int] | None, await cursor.fetchone()) # pyright: ignore[reportUnknownMemberType]
+                trial_row = cast(tuple[str, bool, int, str, str, int] | None, await cursor.fetchone()) # pyright: ignore[reportUnknownMemberType]
                 if not trial_row:
                     raise Problem(f"Time trial with ID {self.time_trial_id} not found", status=404)
             
-            _, _, current_version = trial_row
+            _, _, current_version, game, track, player_id = trial_row
             
             # Check version for optimistic locking
             if current_version != self.version:
@@ -584,6 +527,8 @@ class MarkTimeTrialInvalidCommand(Command[None]):
                 "current_version": current_version
             })
 
+        await leaderboard_cache.refresh_player(game, track, player_id)
+
 
 @dataclass
 class EditTimeTrialCommand(Command[TimeTrialResponseData]):
@@ -600,7 +545,7 @@ class EditTimeTrialCommand(Command[TimeTrialResponseData]):
     is_invalid: bool | None
     can_validate: bool = False
 
-    async def handle(self, duckdb_wrapper: DuckDBWrapper) -> TimeTrialResponseData:
+    async def handle(self, duckdb_wrapper: DuckDBWrapper, leaderboard_cache: LeaderboardCache) -> TimeTrialResponseData:
         if not self.time_trial_id.strip():
             raise Problem("Time trial ID is required", status=400)
         if not self.game.strip():
@@ -613,22 +558,23 @@ class EditTimeTrialCommand(Command[TimeTrialResponseData]):
         now_iso = datetime.now(timezone.utc).isoformat()
         new_version = self.version + 1
 
-        async with duckdb_wrapper.connection() as conn:
+        async with duckdb_wrapper.connection() as conn, transaction(conn):
             # Get current time trial
             get_trial_query = f"""
                 SELECT tt.id, tt.version, tt.player_id, tt.game, tt.track, tt.time_ms, 
-                       tt.proofs, tt.created_at, tt.updated_at, tt.is_invalid, tt.validation_status
+                       {proofs_column()}, tt.created_at, tt.updated_at, tt.is_invalid, tt.validation_status
                 FROM time_trials tt
                 WHERE tt.id = $time_trial_id
             """
             
-            async with conn.execute(get_trial_query, {"time_trial_id": self.time_trial_id}) as cursor:
-                row = cast(tuple[Any, ...] | None, await cursor.fetchone()) # pyright: ignore[reportUnknownMemberType]
-                if not row:
-                    raise Problem(f"Time trial with ID {self.time_trial_id} not found", status=404)
+            # The cursor returned by execute_on_self is the connection itself, so it must not be closed
+            cursor = await conn.execute_on_self(get_trial_query, {"time_trial_id": self.time_trial_id})
+            row = cast(tuple[Any, ...] | None, await cursor.fetchone()) # pyright: ignore[reportUnknownMemberType]
+            if not row:
+                raise Problem(f"Time trial with ID {self.time_trial_id} not found", status=404)
             
             (_, current_version, current_player_id_db, current_game, current_track, 
-             current_time_ms, current_proofs_json, created_at, _, current_is_invalid, 
+             current_time_ms, current_proofs, created_at, _, current_is_invalid, 
              _) = row
 
             # Version check
@@ -654,7 +600,7 @@ class EditTimeTrialCommand(Command[TimeTrialResponseData]):
             is_invalid = self.is_invalid if self.is_invalid is not None else bool(current_is_invalid)
 
             # Parse current proofs
-            current_proofs_data = msgspec.json.decode(current_proofs_json, type=list[TimeTrialProof]) if current_proofs_json else []
+            current_proofs_data = proofs_from_column(current_proofs)
             
             # Process proof changes
             updated_proofs: list[TimeTrialProof] = []
@@ -746,62 +692,70 @@ class EditTimeTrialCommand(Command[TimeTrialResponseData]):
                 
                 updated_proofs.append(updated_proof)
 
-            # Calculate new validation status
-            new_validation_status = calculate_validation_status(updated_proofs, is_invalid)
-            
-            # Update the time trial
-            updated_proofs_json = msgspec.json.encode(updated_proofs).decode()
-            
+            await replace_proofs(conn, self.time_trial_id, updated_proofs)
+
+            # Update the time trial, then recalculate its validation status from the new proofs
             update_query = """
                 UPDATE time_trials 
-                SET game = $game, track = $track, time_ms = $time_ms, proofs = $proofs,
-                    player_id = $player_id, is_invalid = $is_invalid, 
-                    validation_status = $validation_status, version = $version, updated_at = $updated_at
+                SET game = $game, track = $track, time_ms = $time_ms,
+                    player_id = $player_id, is_invalid = $is_invalid, version = $version, updated_at = $updated_at
                 WHERE id = $time_trial_id AND version = $current_version
             """
-            
-            await conn.execute(update_query, {
+            await conn.execute_on_self(update_query, {
                 "game": self.game,
                 "track": self.track,
                 "time_ms": self.time_ms,
-                "proofs": updated_proofs_json,
                 "player_id": player_id,
                 "is_invalid": is_invalid,
-                "validation_status": new_validation_status,
                 "version": new_version,
                 "updated_at": now_iso,
                 "time_trial_id": self.time_trial_id,
                 "current_version": current_version
             })
 
-            # Return updated data
-            response_proofs = [
-                ProofResponseData(
-                    id=proof.id,
-                    url=proof.url,
-                    type=proof.type,
-                    created_at=proof.created_at,
-                    status=proof.status,
-                    validator_id=proof.validator_id,
-                    validated_at=proof.validated_at
-                )
-                for proof in updated_proofs
-            ]
+            status_query = f"""
+                UPDATE time_trials
+                SET validation_status = {VALIDATION_STATUS_EXPRESSION}
+                WHERE id = $time_trial_id
+                RETURNING validation_status
+            """
+            cursor = await conn.execute_on_self(status_query, {"time_trial_id": self.time_trial_id})
+            status_row = cast(tuple[str] | None, await cursor.fetchone()) # pyright: ignore[reportUnknownMemberType]
+            new_validation_status = status_row[0] if status_row else "invalid"
 
-            return TimeTrialResponseData(
-                id=self.time_trial_id,
-                version=new_version,
-                player_id=player_id,
-                game=self.game,
-                track=self.track,
-                time_ms=self.time_ms,
-                proofs=response_proofs,
-                created_at=created_at,
-                updated_at=now_iso,
-                validation_status=new_validation_status,
-                player_name=None,
-                player_country_code=None
+        # Refresh the leaderboard the record was on, and the one it has moved to if that changed
+        await leaderboard_cache.refresh_player(current_game, current_track, current_player_id_db)
+        if (self.game, self.track, player_id) != (current_game, current_track, current_player_id_db):
+            await leaderboard_cache.refresh_player(self.game, self.track, player_id)
+
+        # Return updated data
+        response_proofs = [
+            ProofResponseData(
+                id=proof.id,
+                url=proof.url,
+                type=proof.type,
+                created_at=proof.created_at,
+                status=proof.status,
+                validator_id=proof.validator_id,
+                validated_at=proof.validated_at
             )
+            for proof in updated_proofs
+        ]
+
+        return TimeTrialResponseData(
+            id=self.time_trial_id,
+            version=new_version,
+            player_id=player_id,
+            game=self.game,
+            track=self.track,
+            time_ms=self.time_ms,
+            proofs=response_proofs,
+            created_at=created_at,
+            updated_at=now_iso,
+            validation_status=new_validation_status,
+            player_name=None,
+            player_country_code=None
+        )
 
 @dataclass
 class GetTimesheetCommand(Command[list[TimeTrialResponseData]]):
@@ -809,20 +763,16 @@ class GetTimesheetCommand(Command[list[TimeTrialResponseData]]):
     
     filter: TimesheetFilter
 
-    async def handle(self, db_wrapper: DBWrapper, duckdb_wrapper: DuckDBWrapper) -> list[TimeTrialResponseData]:
+    async def handle(self, duckdb_wrapper: DuckDBWrapper, player_cache: PlayerSummaryCache) -> list[TimeTrialResponseData]:
         if not self.filter.player_id:
             raise Problem("Player ID is required", status=400)
         if not self.filter.game.strip():
             raise Problem("Game is required", status=400)
         
-        async with db_wrapper.connect() as conn:
-            player_query = "SELECT name, country_code FROM players WHERE id = :player_id"
-            async with conn.execute(player_query, {"player_id": self.filter.player_id}) as cursor:
-                player_row = await cursor.fetchone()
-                if not player_row:
-                    raise Problem(f"Player with ID {self.filter.player_id} not found", status=404)
-                
-        player_name, player_country_code = player_row
+        player = await player_cache.get(self.filter.player_id)
+        if not player:
+            raise Problem(f"Player with ID {self.filter.player_id} not found", status=404)
+        player_name, player_country_code = player.name, player.country_code
 
         async with duckdb_wrapper.connection() as conn:
             validation_filters = ["tt.validation_status = 'valid'"]  # Always include valid
@@ -850,22 +800,22 @@ class GetTimesheetCommand(Command[list[TimeTrialResponseData]]):
                 query = f"""
                     WITH ranked_times AS (
                         SELECT tt.id, tt.version, tt.player_id, tt.game, tt.track, tt.time_ms, 
-                               tt.proofs, tt.created_at, tt.updated_at, tt.validation_status,
+                               tt.created_at, tt.updated_at, tt.validation_status,
                                ROW_NUMBER() OVER (PARTITION BY tt.track ORDER BY tt.time_ms ASC, tt.created_at ASC) as rank
                         FROM time_trials tt
                         WHERE {' AND '.join(where_conditions)}
                     )
-                    SELECT id, version, player_id, game, track, time_ms, proofs, created_at, updated_at, 
-                           validation_status
-                    FROM ranked_times 
-                    WHERE rank = 1
-                    ORDER BY track ASC, time_ms ASC
+                    SELECT tt.id, tt.version, tt.player_id, tt.game, tt.track, tt.time_ms,
+                           {proofs_column(include_invalid=False)}, tt.created_at, tt.updated_at, tt.validation_status
+                    FROM ranked_times tt
+                    WHERE tt.rank = 1
+                    ORDER BY tt.track ASC, tt.time_ms ASC
                 """
             else:
                 # Include all times (outdated and current)
                 query = f"""
                     SELECT tt.id, tt.version, tt.player_id, tt.game, tt.track, tt.time_ms, 
-                           tt.proofs, tt.created_at, tt.updated_at, tt.validation_status
+                           {proofs_column(include_invalid=False)}, tt.created_at, tt.updated_at, tt.validation_status
                     FROM time_trials tt
                     WHERE {' AND '.join(where_conditions)}
                     ORDER BY tt.track ASC, tt.time_ms ASC, tt.created_at DESC
@@ -878,30 +828,21 @@ class GetTimesheetCommand(Command[list[TimeTrialResponseData]]):
             }) as cursor:
                 async for row in cast(AsyncIterator[tuple[Any, ...]], cursor):
                     (trial_id, version, player_id, game, track, time_ms, 
-                     proofs_json, created_at, updated_at, validation_status) = row
-
-                    # Parse proofs and filter out invalid ones (like leaderboard does)
-                    response_proofs: list[ProofResponseData] = []
-                    if proofs_json:
-                        try:
-                            proofs_data = msgspec.json.decode(proofs_json, type=list[TimeTrialProof])
-                            for proof in proofs_data:
-                                # Only include proofs that are not marked as invalid
-                                if proof.status != "invalid":
-                                    response_proofs.append(
-                                        ProofResponseData(
-                                            id=proof.id,
-                                            url=proof.url,
-                                            type=proof.type,
-                                            created_at=proof.created_at,
-                                            status=proof.status,
-                                            validator_id=proof.validator_id,
-                                            validated_at=proof.validated_at
-                                        )
-                                    )
-                        except Exception:
-                            # If proof parsing fails, continue without proofs
-                            pass
+                     proofs, created_at, updated_at, validation_status) = row
+
+                    # Invalid proofs are left out by the query, like the leaderboard does
+                    response_proofs = [
+                        ProofResponseData(
+                            id=proof.id,
+                            url=proof.url,
+                            type=proof.type,
+                            created_at=proof.created_at,
+                            status=proof.status,
+                            validator_id=proof.validator_id,
+                            validated_at=proof.validated_at
+                        )
+                        for proof in proofs_from_column(proofs)
+                    ]
 
                     records.append(TimeTrialResponseData(
                         id=trial_id,
@@ -73,7 +73,7 @@ class SetTournamentPlacementsFromPlayerIDsCommand(Command[None]):
         b = self.body
         # sort with DQs at the end
         sorted_placements = sorted(b, key=lambda x: float('inf') if x.placement is None else x.placement)
-        async with db_wrapper.connect() as db:
+        async with db_wrapper.connect(readonly=True) as db:
             async with db.execute("SELECT min_squad_size, max_squad_size, is_squad FROM tournaments WHERE id = ?", (self.tournament_id,)) as cursor:
                 row = await cursor.fetchone()
                 if not row:
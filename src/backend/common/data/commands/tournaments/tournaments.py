@@ -6,6 +6,7 @@ import msgspec
 from common.data.command import Command
 from common.data.db import DBWrapper
 from common.data.models import *
+from common.data.permission_cache import PermissionCache
 from common.data.s3 import IMAGE_BUCKET, SERIES_BUCKET, TOURNAMENTS_BUCKET, S3Wrapper
 from common.auth import tournament_permissions
 from aiosqlite import Row
@@ -69,7 +70,7 @@ class EditTournamentCommand(Command[None]):
     body: EditTournamentRequestData
     id: int
 
-    async def handle(self, db_wrapper: DBWrapper, s3_wrapper: S3Wrapper):
+    async def handle(self, db_wrapper: DBWrapper, s3_wrapper: S3Wrapper, permission_cache: PermissionCache):
         b = self.body
         
         async with db_wrapper.connect() as db:
@@ -143,6 +144,8 @@ class EditTournamentCommand(Command[None]):
                 logo_filename = f"tournament_logos/{self.id}.png"
                 await s3_wrapper.delete_object(IMAGE_BUCKET, key=logo_filename)
             await db.commit()
+            # the tournament may have moved to a different series
+            permission_cache.invalidate_tournament(self.id)
             
 @dataclass
 class GetTournamentDataCommand(Command[GetTournamentRequestData]):
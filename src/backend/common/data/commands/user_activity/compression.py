@@ -1,7 +1,6 @@
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from enum import Enum
-from typing import Any
 from common.data.command import Command
 from common.data.db import DBWrapper
 
@@ -25,7 +24,10 @@ class CompressUserActivityTimeRangesCommand(Command[None]):
     - 6h-2d: 30 minute windows
     - 2-30 days: 1 hour windows
     - > 30 days: 1 day windows
+
+    Time ranges are compressed chunk_size user IPs at a time, committing after each chunk.
     """
+    chunk_size: int = 1000
     
     def _get_compression_boundaries(self) -> list[tuple[int, int, GranularityLevel]]:
         """
@@ -90,69 +92,68 @@ class CompressUserActivityTimeRangesCommand(Command[None]):
             
         return timestamp  # Default fallback
     
+    def _window_start_sql(self, column: str, granularity: GranularityLevel) -> str:
+        """SQL expression which aligns a timestamp column the same way as _align_timestamp"""
+        window_seconds = {
+            GranularityLevel.ONE_MINUTE: 60,
+            GranularityLevel.TEN_MINUTES: 10 * 60,
+            GranularityLevel.THIRTY_MINUTES: 30 * 60,
+            GranularityLevel.ONE_HOUR: 60 * 60,
+            GranularityLevel.ONE_DAY: 24 * 60 * 60,
+        }[granularity]
+        # days start at 6AM UTC
+        offset = 6 * 60 * 60 if granularity == GranularityLevel.ONE_DAY else 0
+        return f"(({column} - {offset}) / {window_seconds} * {window_seconds} + {offset})"
+
     async def handle(self, db_wrapper: DBWrapper):
         boundaries = self._get_compression_boundaries()
-        
-        async with db_wrapper.connect(db_name='user_activity') as db:
-            
-            for timestamp_from, timestamp_to, target_granularity in boundaries:
-                if target_granularity == GranularityLevel.NONE:
-                    continue
 
-                timestamp_to = self._align_timestamp(timestamp_to, target_granularity)
-                
-                # Find time ranges that need to be compressed within this boundary
-                get_time_ranges_to_compress = """
-                    SELECT user_ip_id, date_earliest, date_latest, times
-                    FROM user_ip_time_ranges
-                    WHERE date_latest BETWEEN :from_ts AND :to_ts
-                    AND granularity < :target_granularity
-                """
-                rows = await db.execute_fetchall(get_time_ranges_to_compress, {
-                    "from_ts": timestamp_from,
-                    "to_ts": timestamp_to,
-                    "target_granularity": target_granularity.value
-                })
+        async with db_wrapper.connect(db_name='user_activity', readonly=True) as db:
+            async with db.execute("SELECT MIN(user_ip_id), MAX(user_ip_id) FROM user_ip_time_ranges") as cursor:
+                row = await cursor.fetchone()
+        if not row or row[0] is None:
+            return
+        min_user_ip_id, max_user_ip_id = row
+
+        # Each range of user IPs is compressed in its own transaction, so the writer is only held
+        # for one chunk at a time however big the table gets
+        for lo in range(min_user_ip_id, max_user_ip_id + 1, self.chunk_size):
+            hi = lo + self.chunk_size - 1
+            async with db_wrapper.connect(db_name='user_activity') as db:
+                for timestamp_from, timestamp_to, target_granularity in boundaries:
+                    if target_granularity == GranularityLevel.NONE:
+                        continue
 
-                if not rows:
-                    continue
+                    timestamp_to = self._align_timestamp(timestamp_to, target_granularity)
+                    params = {
+                        "from_ts": timestamp_from,
+                        "to_ts": timestamp_to,
+                        "target_granularity": target_granularity.value,
+                        "lo": lo,
+                        "hi": hi,
+                    }
 
-                time_ranges_by_window: dict[tuple[int, int], list[tuple[int, int, int]]] = {}
-                for row in rows:
-                    user_ip_id, date_earliest, date_latest, times = row
-                    window_start = self._align_timestamp(date_earliest, target_granularity)
-                    key = (user_ip_id, window_start)
-                    if key not in time_ranges_by_window:
-                        time_ranges_by_window[key] = []
-                    time_ranges_by_window[key].append((date_earliest, date_latest, times))
-                
-                new_ranges: list[dict[str, Any]] = []
-                for (user_ip_id, _), ranges in time_ranges_by_window.items():
-                    date_earliest = min(r[0] for r in ranges)
-                    date_latest = max(r[1] for r in ranges)
-                    times = sum(r[2] for r in ranges)
-                    new_ranges.append({
-                        "user_ip_id": user_ip_id,
-                        "date_earliest": date_earliest,
-                        "date_latest": date_latest,
-                        "times": times,
-                        "granularity": target_granularity.value
-                    })
-                
-                delete_old_query = """
-                    DELETE FROM user_ip_time_ranges 
-                    WHERE date_latest BETWEEN :from_ts AND :to_ts
-                    AND granularity < :target_granularity
-                """
-                await db.execute(delete_old_query, {
-                    "from_ts": timestamp_from,
-                    "to_ts": timestamp_to,
-                    "target_granularity": target_granularity.value
-                })
+                    # Merge the time ranges in this boundary which are finer than the target granularity
+                    # into one range per user IP and window. The merged ranges have the target granularity,
+                    # so deleting the finer ones afterwards leaves them alone.
+                    insert_compressed_query = f"""
+                        INSERT INTO user_ip_time_ranges (user_ip_id, date_earliest, date_latest, times, granularity)
+                        SELECT user_ip_id, MIN(date_earliest), MAX(date_latest), SUM(times), :target_granularity
+                        FROM user_ip_time_ranges
+                        WHERE user_ip_id BETWEEN :lo AND :hi
+                        AND date_latest BETWEEN :from_ts AND :to_ts
+                        AND granularity < :target_granularity
+                        GROUP BY user_ip_id, {self._window_start_sql('date_earliest', target_granularity)}
+                    """
+                    cursor = await db.execute(insert_compressed_query, params)
+                    if cursor.rowcount == 0:
+                        continue
 
-                insert_new_query = """
-                    INSERT INTO user_ip_time_ranges (user_ip_id, date_earliest, date_latest, times, granularity)
-                    VALUES (:user_ip_id, :date_earliest, :date_latest, :times, :granularity)
-                """
-                await db.executemany(insert_new_query, new_ranges)
+                    delete_old_query = """
+                        DELETE FROM user_ip_time_ranges
+                        WHERE user_ip_id BETWEEN :lo AND :hi
+                        AND date_latest BETWEEN :from_ts AND :to_ts
+                        AND granularity < :target_granularity
+                    """
+                    await db.execute(delete_old_query, params)
                 await db.commit()
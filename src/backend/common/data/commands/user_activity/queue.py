@@ -1,9 +1,26 @@
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timezone
 from common.data.command import Command
 from urllib.parse import urlparse
+import time
+
+from aiosqlite import Connection
 
 from common.data.db import DBWrapper
+from common.data.activity_buffer import UserActivityBuffer, UserActivityRecord
+from common.telemetry import get_meter
+
+meter = get_meter(__name__)
+
+queue_backlog = meter.create_gauge(
+    "user_activity.queue.backlog",
+    description="Number of user activity records waiting in the activity queue",
+)
+queue_oldest_age = meter.create_gauge(
+    "user_activity.queue.oldest_age",
+    unit="s",
+    description="Age of the oldest user activity record waiting in the activity queue",
+)
 
 @dataclass
 class EnqueueUserActivityCommand(Command[None]):
@@ -13,83 +30,122 @@ class EnqueueUserActivityCommand(Command[None]):
     timestamp: datetime
     referer: str | None = None
 
-    async def handle(self, db_wrapper: DBWrapper):
+    async def handle(self, activity_buffer: UserActivityBuffer):
         # Parse the URL to remove query parameters
         parsed_path = urlparse(self.path).path
         timestamp = int(self.timestamp.timestamp())
         
         ip = self.ip_address if self.ip_address else "0.0.0.0"
-        
-        async with db_wrapper.connect(db_name='user_activity_queue') as db:
-            await db.execute(
-                """
-                INSERT INTO user_activity_queue(user_id, ip_address, path, timestamp, referer)
-                VALUES(:user_id, :ip_address, :path, :timestamp, :referer)
-                """,
-                {
-                    "user_id": self.user_id,
-                    "ip_address": ip,
-                    "path": parsed_path,
-                    "timestamp": timestamp,
-                    "referer": self.referer
-                }
-            )
-            await db.commit()
+
+        # the buffer writes it to user_activity_queue along with the other recent activity
+        activity_buffer.add(UserActivityRecord(self.user_id, ip, parsed_path, timestamp, self.referer))
 
 @dataclass
 class ProcessUserActivityQueueCommand(Command[None]):
+    """
+    Moves queued user activity into the user activity database. Batches are processed one after
+    another until the queue is empty or time_budget seconds have passed, with batches growing
+    from batch_size up to max_batch_size as the backlog grows so that a large backlog is caught up
+    on quickly. Each batch is its own transaction, so other writes aren't held up for long.
+    """
     batch_size: int = 1000
+    max_batch_size: int = 20000
+    time_budget: float = 20
 
     async def handle(self, db_wrapper: DBWrapper):
-        async with db_wrapper.connect(db_name='user_activity', attach=["user_activity_queue"]) as db:
-            get_id_range_command = """
-                SELECT MIN(id), MAX(id)
-                FROM user_activity_queue.user_activity_queue
-                ORDER BY id
-            """
-            async with db.execute(get_id_range_command) as cursor:
-                id_range = await cursor.fetchone()
+        deadline = time.monotonic() + self.time_budget
+        while True:
+            async with db_wrapper.connect(db_name='user_activity', attach=["user_activity_queue"]) as db:
+                get_id_range_command = """
+                    SELECT MIN(id), MAX(id)
+                    FROM user_activity_queue.user_activity_queue
+                """
+                async with db.execute(get_id_range_command) as cursor:
+                    id_range = await cursor.fetchone()
                 if not id_range or id_range[0] is None:
+                    queue_backlog.set(0)
+                    queue_oldest_age.set(0)
                     return  # No records to process
-                
                 min_id, max_possible_id = id_range
-                max_id = min(min_id + self.batch_size - 1, max_possible_id)
-            
-            insert_missing_ips_command = """
-                INSERT INTO ip_addresses(ip_address, is_mobile, is_vpn, is_checked)
-                SELECT DISTINCT ip_address, FALSE, FALSE, FALSE
-                FROM user_activity_queue.user_activity_queue
-                WHERE id BETWEEN :min_id AND :max_id
-                ON CONFLICT(ip_address) DO NOTHING
-            """
-            await db.execute(insert_missing_ips_command, { "min_id": min_id, "max_id": max_id })
-            await db.commit()
+                
+                # ids only ever increase and processed rows are deleted from the front, so this is the backlog
+                backlog = max_possible_id - min_id + 1
+                async with db.execute("SELECT timestamp FROM user_activity_queue.user_activity_queue WHERE id = ?", (min_id,)) as cursor:
+                    row = await cursor.fetchone()
+                queue_backlog.set(backlog)
+                if row:
+                    queue_oldest_age.set(max(0, int(datetime.now(timezone.utc).timestamp()) - row[0]))
+                if time.monotonic() >= deadline:
+                    return # the next run carries on from here
 
-            insert_user_ips_command = """
-                INSERT INTO user_ips(user_id, ip_address_id)
-                SELECT DISTINCT q.user_id, ip.id
-                FROM user_activity_queue.user_activity_queue q
-                JOIN ip_addresses ip ON q.ip_address = ip.ip_address
-                WHERE q.id BETWEEN :min_id AND :max_id
-                ON CONFLICT(user_id, ip_address_id) DO NOTHING
-            """
-            await db.execute(insert_user_ips_command, {"min_id": min_id, "max_id": max_id})
+                batch_size = min(self.max_batch_size, max(self.batch_size, backlog // 10))
+                max_id = min(min_id + batch_size - 1, max_possible_id)
+                await self._process_batch(db, min_id, max_id)
+
+    async def _process_batch(self, db: Connection, min_id: int, max_id: int):
+        insert_missing_ips_command = """
+            INSERT INTO ip_addresses(ip_address, is_mobile, is_vpn, is_checked)
+            SELECT DISTINCT ip_address, FALSE, FALSE, FALSE
+            FROM user_activity_queue.user_activity_queue
+            WHERE id BETWEEN :min_id AND :max_id
+            ON CONFLICT(ip_address) DO NOTHING
+        """
+        await db.execute(insert_missing_ips_command, { "min_id": min_id, "max_id": max_id })
+        await db.commit()
 
-            insert_user_ip_time_ranges_query = """
-                INSERT INTO user_ip_time_ranges(user_ip_id, date_earliest, date_latest, times)
-                SELECT ui.id, q.timestamp, q.timestamp, 1
+        insert_user_ips_command = """
+            INSERT INTO user_ips(user_id, ip_address_id)
+            SELECT DISTINCT q.user_id, ip.id
+            FROM user_activity_queue.user_activity_queue q
+            JOIN ip_addresses ip ON q.ip_address = ip.ip_address
+            WHERE q.id BETWEEN :min_id AND :max_id
+            ON CONFLICT(user_id, ip_address_id) DO NOTHING
+        """
+        await db.execute(insert_user_ips_command, {"min_id": min_id, "max_id": max_id})
+
+        # Each user IP's activity in the batch is counted per minute, the finest window that
+        # CompressUserActivityTimeRangesCommand compresses ranges into. If the user IP already has an
+        # uncompressed range starting in the same minute, the batch is merged into it, otherwise it
+        # gets a new range.
+        batch_time_ranges_cte = """
+            WITH batch AS (
+                SELECT ui.id AS user_ip_id, q.timestamp / 60 * 60 AS window_start,
+                    MIN(q.timestamp) AS date_earliest, MAX(q.timestamp) AS date_latest, COUNT(*) AS times
                 FROM user_activity_queue.user_activity_queue q
                 JOIN ip_addresses ip ON q.ip_address = ip.ip_address
                 JOIN user_ips ui ON q.user_id = ui.user_id AND ip.id = ui.ip_address_id
                 WHERE q.id BETWEEN :min_id AND :max_id
-                GROUP BY ui.id
-            """
-            await db.execute(insert_user_ip_time_ranges_query, {"min_id": min_id, "max_id": max_id})
-            
-            # Delete processed records
-            delete_command = """
-                DELETE FROM user_activity_queue.user_activity_queue
-                WHERE id BETWEEN :min_id AND :max_id
-            """
-            await db.execute(delete_command, {"min_id": min_id, "max_id": max_id})
-            await db.commit()
+                GROUP BY ui.id, q.timestamp / 60
+            )
+        """
+        open_range_condition = """
+            r.user_ip_id = b.user_ip_id AND r.granularity = 0
+            AND r.date_earliest BETWEEN b.window_start AND b.window_start + 59
+        """
+        merge_user_ip_time_ranges_query = f"""
+            {batch_time_ranges_cte}
+            UPDATE user_ip_time_ranges AS t
+            SET date_earliest = MIN(t.date_earliest, b.date_earliest),
+                date_latest = MAX(t.date_latest, b.date_latest),
+                times = t.times + b.times
+            FROM batch b
+            WHERE t.id = (SELECT MAX(r.id) FROM user_ip_time_ranges r WHERE {open_range_condition})
+        """
+        await db.execute(merge_user_ip_time_ranges_query, {"min_id": min_id, "max_id": max_id})
+
+        insert_user_ip_time_ranges_query = f"""
+            {batch_time_ranges_cte}
+            INSERT INTO user_ip_time_ranges(user_ip_id, date_earliest, date_latest, times)
+            SELECT b.user_ip_id, b.date_earliest, b.date_latest, b.times
+            FROM batch b
+            WHERE NOT EXISTS (SELECT 1 FROM user_ip_time_ranges r WHERE {open_range_condition})
+        """
+        await db.execute(insert_user_ip_time_ranges_query, {"min_id": min_id, "max_id": max_id})
+        
+        # Delete processed records
+        delete_command = """
+            DELETE FROM user_activity_queue.user_activity_queue
+            WHERE id BETWEEN :min_id AND :max_id
+        """
+        await db.execute(delete_command, {"min_id": min_id, "max_id": max_id})
+        await db.commit()
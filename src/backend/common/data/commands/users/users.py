@@ -66,6 +66,20 @@ class CreateUserCommand(Command[UserAccountInfo]):
 
         return UserAccountInfo(user_id, None, False, False)
 
+@dataclass
+class UpdatePasswordHashCommand(Command[None]):
+    """Replaces a user's password hash with one of the same password, e.g. after the hashing parameters change"""
+    user_id: int
+    old_password_hash: str
+    new_password_hash: str
+
+    async def handle(self, db_wrapper: DBWrapper):
+        async with db_wrapper.connect(db_name='auth') as db:
+            # leave the hash alone if the password was changed since the old hash was read
+            await db.execute("UPDATE user_auth SET password_hash = :new_password_hash WHERE user_id = :user_id AND password_hash = :old_password_hash",
+                {"new_password_hash": self.new_password_hash, "user_id": self.user_id, "old_password_hash": self.old_password_hash})
+            await db.commit()
+
 @dataclass
 class GetPlayerIdForUserCommand(Command[int | None]):
     user_id: int
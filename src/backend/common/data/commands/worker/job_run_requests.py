@@ -0,0 +1,32 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from common.data.command import Command
+from common.data.db import DBWrapper
+
+@dataclass
+class RequestJobRunCommand(Command[None]):
+    """Asks the worker to run a job straight away, the next time it checks for run requests."""
+    job_name: str
+
+    async def handle(self, db_wrapper: DBWrapper):
+        async with db_wrapper.connect(db_name='main') as db:
+            await db.execute(
+                "INSERT OR REPLACE INTO job_run_requests(job_name, requested_on) VALUES (:job_name, :requested_on)",
+                {"job_name": self.job_name, "requested_on": int(datetime.now(timezone.utc).timestamp())}
+            )
+            await db.commit()
+
+@dataclass
+class ClaimJobRunRequestsCommand(Command[list[str]]):
+    """Removes and returns the names of the jobs which have been requested to run."""
+
+    async def handle(self, db_wrapper: DBWrapper) -> list[str]:
+        # the worker polls this often, so only queue behind the writer when there is something to claim
+        async with db_wrapper.connect(db_name='main', readonly=True) as db:
+            async with db.execute("SELECT 1 FROM job_run_requests LIMIT 1") as cursor:
+                if await cursor.fetchone() is None:
+                    return []
+        async with db_wrapper.connect(db_name='main') as db:
+            rows = await db.execute_fetchall("DELETE FROM job_run_requests RETURNING job_name")
+            await db.commit()
+        return [row[0] for row in rows]
@@ -0,0 +1,13 @@
+from dataclasses import dataclass
+from common.data.command import Command
+from common.data.db import DBWrapper
+
+@dataclass
+class GetTableChangeCountsCommand(Command[dict[str, int]]):
+    """Gets how many times each table tracked by the table_changes triggers of a database has been changed."""
+    db_name: str
+
+    async def handle(self, db_wrapper: DBWrapper):
+        async with db_wrapper.connect(db_name=self.db_name, readonly=True) as db:
+            rows = await db.execute_fetchall("SELECT table_name, change_count FROM table_changes")
+        return {table_name: change_count for table_name, change_count in rows}
@@ -1,6 +1,7 @@
 from common.data.db.common import DatabaseSchema
 from common.data.db.alt_flags.tables import all_tables
 from common.data.db.alt_flags.indices import all_indices
+from common.data.db.alt_flags.triggers import all_triggers
 
 db_name = 'alt_flags'
-schema = DatabaseSchema(db_name, all_tables, all_indices)
+schema = DatabaseSchema(db_name, all_tables, all_indices, all_triggers)
@@ -2,18 +2,18 @@ from dataclasses import dataclass
 from common.data.db.common import IndexModel
 
 @dataclass
-class AltFlagsType(IndexModel):
+class AltFlagsTypeDateId(IndexModel):
     @staticmethod
     def get_create_index_command() -> str:
-        return """CREATE INDEX IF NOT EXISTS idx_alt_flags_type
-            ON alt_flags(type)"""
+        return """CREATE INDEX IF NOT EXISTS idx_alt_flags_type_date_id
+            ON alt_flags(type, date DESC, id DESC)"""
 
 @dataclass
-class AltFlagsDate(IndexModel):
+class AltFlagsDateId(IndexModel):
     @staticmethod
     def get_create_index_command() -> str:
-        return """CREATE INDEX IF NOT EXISTS idx_alt_flags_date
-            ON alt_flags(date DESC)"""
+        return """CREATE INDEX IF NOT EXISTS idx_alt_flags_date_id
+            ON alt_flags(date DESC, id DESC)"""
 
 @dataclass
 class UserAltFlagsFlagId(IndexModel):
@@ -22,8 +22,16 @@ class UserAltFlagsFlagId(IndexModel):
         return """CREATE INDEX IF NOT EXISTS idx_user_alt_flags_flag_id
             ON user_alt_flags(flag_id)"""
 
+@dataclass
+class AltClustersClusterId(IndexModel):
+    @staticmethod
+    def get_create_index_command() -> str:
+        return """CREATE INDEX IF NOT EXISTS idx_alt_clusters_cluster_id
+            ON alt_clusters(cluster_id)"""
+
 all_indices: list[type[IndexModel]] = [
-    AltFlagsType,
-    AltFlagsDate,
-    UserAltFlagsFlagId
+    AltFlagsTypeDateId,
+    AltFlagsDateId,
+    UserAltFlagsFlagId,
+    AltClustersClusterId
 ]
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from common.data.db.common import TableModel
+from common.data.db.common import TableChange, TableModel
 
 
 @dataclass
@@ -37,7 +37,59 @@ class UserAltFlag(TableModel):
             flag_id INTEGER NOT NULL REFERENCES alt_flags(id),
             PRIMARY KEY (user_id, flag_id)) WITHOUT ROWID"""
 
+@dataclass
+class AltFlagCount(TableModel):
+    type: str
+    count: int
+
+    @staticmethod
+    def get_create_table_command() -> str:
+        return """CREATE TABLE IF NOT EXISTS alt_flag_counts(
+            type TEXT PRIMARY KEY,
+            count INTEGER NOT NULL)"""
+
+@dataclass
+class AltGraphEdge(TableModel):
+    user_id: int
+    linked_user_id: int
+    score: int
+    flag_count: int
+
+    # each edge is stored in both directions, so that a user's links are found by user_id alone
+    @staticmethod
+    def get_create_table_command() -> str:
+        return """CREATE TABLE IF NOT EXISTS alt_graph_edges(
+            user_id INTEGER NOT NULL,
+            linked_user_id INTEGER NOT NULL,
+            score INTEGER NOT NULL,
+            flag_count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, linked_user_id)) WITHOUT ROWID"""
+
+@dataclass
+class AltCluster(TableModel):
+    user_id: int
+    cluster_id: int
+
+    # cluster_id is the lowest user_id of the users in the cluster
+    @staticmethod
+    def get_create_table_command() -> str:
+        return """CREATE TABLE IF NOT EXISTS alt_clusters(
+            user_id INTEGER PRIMARY KEY,
+            cluster_id INTEGER NOT NULL)"""
+
+@dataclass
+class AltGraphProgress(TableModel):
+    id: int
+    last_flag_id: int
+
+    # a single row with the last flag added to the alt graph, which is updated in the same transaction as the graph
+    @staticmethod
+    def get_create_table_command() -> str:
+        return """CREATE TABLE IF NOT EXISTS alt_graph_progress(
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            last_flag_id INTEGER NOT NULL)"""
+
 
 all_tables : list[type[TableModel]] = [
-    AltFlag, UserAltFlag
+    AltFlag, UserAltFlag, AltFlagCount, AltGraphEdge, AltCluster, AltGraphProgress, TableChange
 ]
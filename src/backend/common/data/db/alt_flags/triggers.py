@@ -0,0 +1,57 @@
+from dataclasses import dataclass
+from common.data.db.common import TriggerModel
+
+# These triggers keep alt_flag_counts up to date, so that the number of flags of each type
+# can be read without counting the whole alt_flags table
+@dataclass
+class AltFlagsInsertCount(TriggerModel):
+    @staticmethod
+    def get_create_trigger_command() -> str:
+        return """CREATE TRIGGER IF NOT EXISTS trg_alt_flags_insert_count
+            AFTER INSERT ON alt_flags
+            BEGIN
+                INSERT INTO alt_flag_counts(type, count) VALUES (new.type, 1)
+                ON CONFLICT(type) DO UPDATE SET count = count + 1;
+            END"""
+
+@dataclass
+class AltFlagsDeleteCount(TriggerModel):
+    @staticmethod
+    def get_create_trigger_command() -> str:
+        return """CREATE TRIGGER IF NOT EXISTS trg_alt_flags_delete_count
+            AFTER DELETE ON alt_flags
+            BEGIN
+                UPDATE alt_flag_counts SET count = count - 1 WHERE type = old.type;
+            END"""
+
+@dataclass
+class AltFlagsUpdateTypeCount(TriggerModel):
+    @staticmethod
+    def get_create_trigger_command() -> str:
+        return """CREATE TRIGGER IF NOT EXISTS trg_alt_flags_update_type_count
+            AFTER UPDATE OF type ON alt_flags
+            WHEN old.type != new.type
+            BEGIN
+                UPDATE alt_flag_counts SET count = count - 1 WHERE type = old.type;
+                INSERT INTO alt_flag_counts(type, count) VALUES (new.type, 1)
+                ON CONFLICT(type) DO UPDATE SET count = count + 1;
+            END"""
+
+# Counts the users added to flags, so that the worker can update the alt graph when there are new ones
+@dataclass
+class UserAltFlagsInsertChange(TriggerModel):
+    @staticmethod
+    def get_create_trigger_command() -> str:
+        return """CREATE TRIGGER IF NOT EXISTS trg_user_alt_flags_insert_change
+            AFTER INSERT ON user_alt_flags
+            BEGIN
+                INSERT INTO table_changes(table_name, change_count) VALUES ('user_alt_flags', 1)
+                ON CONFLICT(table_name) DO UPDATE SET change_count = change_count + 1;
+            END"""
+
+all_triggers: list[type[TriggerModel]] = [
+    AltFlagsInsertCount,
+    AltFlagsDeleteCount,
+    AltFlagsUpdateTypeCount,
+    UserAltFlagsInsertChange
+]
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 class TableModel(ABC):
     @staticmethod
@@ -13,8 +13,28 @@ class IndexModel(ABC):
     def get_create_index_command() -> str:
         pass
 
+class TriggerModel(ABC):
+    @staticmethod
+    @abstractmethod
+    def get_create_trigger_command() -> str:
+        pass
+
+@dataclass
+class TableChange(TableModel):
+    """Change counts kept by triggers in each database with tables that worker jobs watch"""
+    table_name: str
+    change_count: int
+
+    @staticmethod
+    def get_create_table_command() -> str:
+        return """CREATE TABLE IF NOT EXISTS table_changes(
+            table_name TEXT PRIMARY KEY,
+            change_count INTEGER NOT NULL
+        )"""
+
 @dataclass
 class DatabaseSchema:
     db_name: str
     tables: list[type[TableModel]]
-    indices: list[type[IndexModel]]
\ No newline at end of file
+    indices: list[type[IndexModel]]
+    triggers: list[type[TriggerModel]] = field(default_factory=lambda: [])
@@ -1,81 +1,534 @@
 """
-Database wrapper providing unified access to SQLite and DuckDB.
+Database wrapper providing pooled access to the SQLite databases.
 """
 
-from dataclasses import dataclass
+from collections.abc import AsyncGenerator, Iterable
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+import asyncio
 import logging
 import sqlite3
+import time
 import aiosqlite
 from typing import Any
+from opentelemetry.metrics import CallbackOptions, Observation
+
+from common.telemetry import get_meter
 
 logger = logging.getLogger(__name__)
+meter = get_meter(__name__)
+
+pool_wait_time = meter.create_histogram(
+    "db.pool.wait_time",
+    unit="ms",
+    description="Time spent waiting to check out a pooled database connection",
+)
+write_wait_time = meter.create_histogram(
+    "db.writer.wait_time",
+    unit="ms",
+    description="Time a write transaction spent queued before the database's writer handed it the database",
+)
+write_transaction_time = meter.create_histogram(
+    "db.writer.transaction_time",
+    unit="ms",
+    description="Time a write transaction held the database's writer",
+)
+
+
+@dataclass(frozen=True)
+class PoolKey:
+    """Identifies a pool. Connections can only be shared between checkouts with identical settings."""
+    db_name: str
+    attach: tuple[str, ...]
+    readonly: bool
+    foreign_keys: bool
+
+
+@dataclass(eq=False)
+class PooledConnection:
+    connection: aiosqlite.Connection
+    last_used: float
+    last_checked: float
+    # reserved for the DBRequestScope that last used it
+    pinned: bool = False
+
+
+class ConnectionPool:
+    """
+    Pool of long-lived connections to a single database and set of attached databases.
+    Connections are created lazily up to max_size, closed after sitting idle for longer
+    than idle_timeout, and checked with a trivial query before being reused if they haven't
+    been used in a while.
+    """
+
+    def __init__(self, key: PoolKey, path: str, attach: dict[str, str], max_size: int, idle_timeout: float, health_check_interval: float):
+        self.key = key
+        self.path = path
+        self.attach = attach
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.size = 0
+        self.waiting = 0
+        self._idle: list[PooledConnection] = []
+        self._condition = asyncio.Condition()
+        self._closed = False
+
+    @property
+    def idle_count(self) -> int:
+        return len(self._idle)
+
+    async def _open(self) -> aiosqlite.Connection:
+        path = self.path
+        attach = self.attach
+
+        def connector() -> sqlite3.Connection:
+            conn = sqlite3.connect(path, autocommit=True) # Connection is created with autocommit=True, but it is disabled when checked out
+            conn.setlimit(sqlite3.SQLITE_LIMIT_ATTACHED, len(attach)) # Limit the number of attached dbs as a security measure
+            return conn
+
+        db = await aiosqlite.Connection(connector, iter_chunk_size=64)
+        try:
+            if not self.key.readonly:
+                if self.key.foreign_keys:
+                    await db.execute("pragma foreign_keys = ON;")
+                await db.execute("pragma synchronous = NORMAL;")
+                await db.execute("PRAGMA busy_timeout = 5000")
+            for name, attach_path in attach.items():
+                await db.execute(f"ATTACH DATABASE :path AS :name", {"path": attach_path, "name": name})
+        except BaseException:
+            await db.close()
+            raise
+        return db
+
+    def _take_expired(self, now: float) -> list[PooledConnection]:
+        expired = [conn for conn in self._idle if now - conn.last_used > self.idle_timeout]
+        if expired:
+            self._idle = [conn for conn in self._idle if now - conn.last_used <= self.idle_timeout]
+            self.size -= len(expired)
+        return expired
+
+    async def _close_all(self, conns: Iterable[PooledConnection]):
+        for conn in conns:
+            try:
+                await conn.connection.close()
+            except Exception:
+                logger.warning(f"Failed to close pooled connection to {self.key.db_name}", exc_info=True)
+
+    async def _is_healthy(self, conn: PooledConnection, now: float) -> bool:
+        if not conn.connection.is_alive():
+            return False
+        if now - conn.last_checked < self.health_check_interval:
+            return True
+        try:
+            await conn.connection.execute_fetchall("SELECT 1")
+        except Exception:
+            logger.warning(f"Discarding unhealthy pooled connection to {self.key.db_name}", exc_info=True)
+            return False
+        conn.last_checked = now
+        return True
+
+    async def acquire(self) -> PooledConnection:
+        start = time.monotonic()
+        while True:
+            create = False
+            conn: PooledConnection | None = None
+            expired: list[PooledConnection] = []
+            async with self._condition:
+                self.waiting += 1
+                try:
+                    while True:
+                        if self._closed:
+                            raise ValueError(f"Connection pool for '{self.key.db_name}' is closed.")
+                        expired.extend(self._take_expired(time.monotonic()))
+                        unpinned = [i for i, idle in enumerate(self._idle) if not idle.pinned]
+                        if unpinned:
+                            conn = self._idle.pop(unpinned[-1]) # most recently used, so that cold connections age out
+                            break
+                        if self.size < self.max_size:
+                            self.size += 1
+                            create = True
+                            break
+                        if self._idle:
+                            # take a connection pinned to a request scope rather than waiting for one to be released
+                            conn = self._idle.pop()
+                            conn.pinned = False
+                            break
+                        await self._condition.wait()
+                finally:
+                    self.waiting -= 1
+            await self._close_all(expired)
+
+            if create:
+                try:
+                    db = await self._open()
+                except BaseException:
+                    await self.discard(None)
+                    raise
+                now = time.monotonic()
+                conn = PooledConnection(db, now, now)
+            elif conn is not None and not await self._is_healthy(conn, time.monotonic()):
+                await self.discard(conn)
+                continue
+
+            if conn is not None:
+                pool_wait_time.record((time.monotonic() - start) * 1000, {"db.name": self.key.db_name, "db.readonly": self.key.readonly})
+                return conn
+
+    async def release(self, conn: PooledConnection, pinned: bool = False):
+        async with self._condition:
+            if not self._closed and conn.connection.is_alive():
+                conn.last_used = time.monotonic()
+                conn.pinned = pinned
+                self._idle.append(conn)
+                self._condition.notify()
+                return
+        await self.discard(conn)
+
+    async def reclaim(self, conn: PooledConnection) -> bool:
+        """Checks out a specific idle connection, returning False if it has been taken or closed since it was released."""
+        async with self._condition:
+            if self._closed or conn not in self._idle:
+                return False
+            self._idle.remove(conn)
+        conn.pinned = False
+        if not await self._is_healthy(conn, time.monotonic()):
+            await self.discard(conn)
+            return False
+        return True
+
+    async def unpin(self, conn: PooledConnection):
+        async with self._condition:
+            conn.pinned = False
+
+    async def discard(self, conn: PooledConnection | None):
+        async with self._condition:
+            self.size -= 1
+            self._condition.notify()
+        if conn is not None:
+            await self._close_all([conn])
+
+    async def close(self):
+        async with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self.size -= len(idle)
+            self._condition.notify_all()
+        await self._close_all(idle)
+
+
+@dataclass
+class WriteTransaction:
+    ready: asyncio.Future[None]
+    done: asyncio.Event
+    started_at: float = 0
+
+    def finish(self):
+        self.done.set()
+
+
+class DBWriter:
+    """
+    Runs the write transactions for a single database file one at a time, in the order they
+    were submitted. Queued transactions are handed the database by the writer task in turn and
+    the next one only starts once the previous has returned its connection, so concurrent
+    writers wait in the queue rather than spinning on SQLITE_BUSY.
+    """
+
+    def __init__(self, db_name: str):
+        self.db_name = db_name
+        self._queue: asyncio.Queue[WriteTransaction] = asyncio.Queue()
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    async def begin(self) -> WriteTransaction:
+        """Queues a write transaction and waits until it is its turn to write."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name=f"db writer: {self.db_name}")
+        tx = WriteTransaction(asyncio.get_running_loop().create_future(), asyncio.Event())
+        queued_at = time.monotonic()
+        self._queue.put_nowait(tx)
+        try:
+            await tx.ready
+        except asyncio.CancelledError:
+            # if we were cancelled after being handed the database, give it straight back
+            tx.finish()
+            raise
+        tx.started_at = time.monotonic()
+        write_wait_time.record((tx.started_at - queued_at) * 1000, {"db.name": self.db_name})
+        return tx
+
+    async def _run(self):
+        while True:
+            tx = await self._queue.get()
+            if tx.ready.done(): # cancelled while queued
+                continue
+            tx.ready.set_result(None)
+            await tx.done.wait()
+            write_transaction_time.record((time.monotonic() - tx.started_at) * 1000, {"db.name": self.db_name})
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class DBRequestScope:
+    """
+    Lends the same pooled connection to every connection opened with the same settings while
+    the scope is active, so that the commands run while handling a single request reuse one
+    connection per database. Each checkout is still its own transaction: whatever it doesn't
+    commit is rolled back when it ends, and write checkouts still wait for the database's writer.
+    The scope deliberately doesn't hold one transaction open for the whole request, since that
+    would keep the writer locked while a request waits on S3, Discord or its background tasks.
+    Between checkouts the connection sits in its pool pinned to the scope, where other tasks only
+    take it if there is no other idle connection, so a scope never makes anyone wait for it.
+    """
+
+    def __init__(self):
+        self._connections: dict[PoolKey, tuple[ConnectionPool, PooledConnection]] = {}
+        self._lent: set[PoolKey] = set()
+
+    async def acquire(self, pool: ConnectionPool) -> PooledConnection:
+        key = pool.key
+        if key in self._lent: # e.g. a command running concurrently in the same request
+            return await pool.acquire()
+        held = self._connections.get(key)
+        # the pool may have been replaced since, e.g. if its database was reset
+        if held is not None and held[0] is pool and await pool.reclaim(held[1]):
+            conn = held[1]
+        else:
+            conn = await pool.acquire()
+            self._connections[key] = (pool, conn)
+        self._lent.add(key)
+        return conn
+
+    def _is_held(self, pool: ConnectionPool, conn: PooledConnection) -> bool:
+        held = self._connections.get(pool.key)
+        return held is not None and held[1] is conn
+
+    async def release(self, pool: ConnectionPool, conn: PooledConnection):
+        if self._is_held(pool, conn):
+            self._lent.discard(pool.key)
+            await pool.release(conn, pinned=True)
+        else:
+            await pool.release(conn)
+
+    async def discard(self, pool: ConnectionPool, conn: PooledConnection):
+        if self._is_held(pool, conn):
+            del self._connections[pool.key]
+            self._lent.discard(pool.key)
+        await pool.discard(conn)
+
+    async def close(self):
+        held = list(self._connections.values())
+        self._connections.clear()
+        self._lent.clear()
+        for pool, conn in held:
+            await pool.unpin(conn)
+
+
+_request_scope: ContextVar[DBRequestScope | None] = ContextVar("db_request_scope", default=None)
 
 
 @dataclass
 class DBWrapperConnection():
-    connection: aiosqlite.Connection
-    readonly: bool
-    attach: dict[str, str]
+    pool: ConnectionPool
     autocommit: bool
-    foreign_keys: bool = True
+    writer: DBWriter | None = None
+    scope: DBRequestScope | None = None
+    _conn: PooledConnection | None = field(default=None, init=False)
+    _tx: WriteTransaction | None = field(default=None, init=False)
 
     async def __aenter__(self) -> aiosqlite.Connection:
-        db = await self.connection
-        if not self.readonly:
-            if self.foreign_keys:
-                await db.execute("pragma foreign_keys = ON;")
-            await db.execute("pragma synchronous = NORMAL;")
-            await db.execute("PRAGMA busy_timeout = 5000")
-        for name, path in self.attach.items():
-            await db.execute(f"ATTACH DATABASE :path AS :name", {"path": path, "name": name})
+        if self.writer is not None:
+            self._tx = await self.writer.begin()
+        try:
+            conn = await self.scope.acquire(self.pool) if self.scope else await self.pool.acquire()
+        except BaseException:
+            self._finish_write()
+            raise
+        db = conn.connection
 
         def set_autocommit(new_autocommit_value: bool):
-            self.connection._conn.autocommit = new_autocommit_value # pyright: ignore[reportPrivateUsage]
+            db._conn.autocommit = new_autocommit_value # pyright: ignore[reportPrivateUsage]
 
-        await self.connection._execute(set_autocommit, self.autocommit) # pyright: ignore[reportUnknownMemberType, reportPrivateUsage]
+        try:
+            await db._execute(set_autocommit, self.autocommit) # pyright: ignore[reportUnknownMemberType, reportPrivateUsage]
+        except BaseException:
+            await self._return(conn)
+            self._finish_write()
+            raise
+        self._conn = conn
         return db
 
+    def _finish_write(self):
+        if self._tx is not None:
+            self._tx.finish()
+            self._tx = None
+
     async def __aexit__(self, *_: Any) -> None:
-        await self.connection.close()
+        try:
+            await self._release()
+        finally:
+            self._finish_write()
+
+    async def _release(self) -> None:
+        conn = self._conn
+        if conn is None:
+            return
+        self._conn = None
+        db = conn.connection
+
+        def reset():
+            # Anything that wasn't committed is thrown away, the same as if the connection had been closed.
+            # Switching back to autocommit afterwards ends the transaction that sqlite3 implicitly opens
+            # after a rollback, so that idle connections don't hold on to a read snapshot.
+            db._conn.rollback() # pyright: ignore[reportPrivateUsage]
+            db._conn.autocommit = True # pyright: ignore[reportPrivateUsage]
+
+        try:
+            await db._execute(reset) # pyright: ignore[reportUnknownMemberType, reportPrivateUsage]
+            db.row_factory = None
+            db.text_factory = str
+        except Exception:
+            logger.warning(f"Failed to reset connection to {self.pool.key.db_name}, discarding it", exc_info=True)
+            if self.scope:
+                await self.scope.discard(self.pool, conn)
+            else:
+                await self.pool.discard(conn)
+            return
+        await self._return(conn)
+
+    async def _return(self, conn: PooledConnection):
+        if self.scope:
+            await self.scope.release(self.pool, conn)
+        else:
+            await self.pool.release(conn)
 
 
 @dataclass
 class DBWrapper():
     db_paths: dict[str, str]
+    pool_max_size: int = 8
+    pool_idle_timeout: float = 300
+    pool_health_check_interval: float = 30
+    _pools: dict[PoolKey, ConnectionPool] = field(default_factory=lambda: {}, init=False)
+    _writers: dict[str, DBWriter] = field(default_factory=lambda: {}, init=False)
+
+    def __post_init__(self):
+        meter.create_observable_gauge(
+            "db.pool.connections",
+            callbacks=[self._observe_pools],
+            description="Number of pooled database connections, split by whether they are idle or checked out",
+        )
+        meter.create_observable_gauge(
+            "db.pool.waiting",
+            callbacks=[self._observe_waiting],
+            description="Number of tasks waiting for a pooled database connection",
+        )
+        meter.create_observable_gauge(
+            "db.writer.queue_depth",
+            callbacks=[self._observe_writers],
+            description="Number of write transactions queued behind the one currently writing to the database",
+        )
+
+    def _observe_pools(self, options: CallbackOptions) -> Iterable[Observation]:
+        for key, pool in self._pools.items():
+            attributes = {"db.name": key.db_name, "db.readonly": key.readonly, "db.attach": ",".join(key.attach)}
+            yield Observation(pool.idle_count, {**attributes, "state": "idle"})
+            yield Observation(pool.size - pool.idle_count, {**attributes, "state": "in_use"})
 
-    def reset_db(self, db_name: str = 'main'):
+    def _observe_waiting(self, options: CallbackOptions) -> Iterable[Observation]:
+        for key, pool in self._pools.items():
+            yield Observation(pool.waiting, {"db.name": key.db_name, "db.readonly": key.readonly, "db.attach": ",".join(key.attach)})
+
+    def _observe_writers(self, options: CallbackOptions) -> Iterable[Observation]:
+        for db_name, writer in self._writers.items():
+            yield Observation(writer.depth, {"db.name": db_name})
+
+    async def reset_db(self, db_name: str = 'main'):
         """Resets the specified database file. Defaults to 'main'."""
         path = self.db_paths.get(db_name)
         if path:
+            # close any pooled connections which point to the file before truncating it
+            for key in [key for key in self._pools if key.db_name == db_name or db_name in key.attach]:
+                await self._pools.pop(key).close()
             logging.info(f"Resetting database file: {path}")
             open(path, 'w').close()
         else:
             raise ValueError(f"Database '{db_name}' not configured for reset.")
 
-    def connect(self, db_name: str = 'main', attach: list[str] | None = None, readonly: bool = False, autocommit: bool = False, foreign_keys: bool = True):
-        """Connects to the specified database."""
-        path = self.db_paths.get(db_name)
-        if not path:
-            raise ValueError(f"Database '{db_name}' not configured.")
+    async def close(self):
+        """Stops the database writers and closes all pooled connections."""
+        writers = list(self._writers.values())
+        self._writers.clear()
+        for writer in writers:
+            await writer.close()
+        pools = list(self._pools.values())
+        self._pools.clear()
+        for pool in pools:
+            await pool.close()
 
-        if not attach:
-            attach = []
+    def _get_pool(self, key: PoolKey) -> ConnectionPool:
+        pool = self._pools.get(key)
+        if pool is None:
+            path = self.db_paths.get(key.db_name)
+            if not path:
+                raise ValueError(f"Database '{key.db_name}' not configured.")
 
-        attach_dict: dict[str, str] = {}
-        for db in attach:
-            if db not in self.db_paths:
-                raise ValueError(f"Database '{db}' not configured.")
-            attach_dict[db] = self.db_paths[db]
+            attach_dict: dict[str, str] = {}
+            for db in key.attach:
+                if db not in self.db_paths:
+                    raise ValueError(f"Database '{db}' not configured.")
+                attach_dict[db] = self.db_paths[db]
 
-        if readonly:
-            path = f"file:{path}?mode=ro"
-            for db in attach_dict:
-                attach_dict[db] = f"file:{attach_dict[db]}?mode=ro"
+            if key.readonly:
+                path = f"file:{path}?mode=ro"
+                for db in attach_dict:
+                    attach_dict[db] = f"file:{attach_dict[db]}?mode=ro"
 
-        def connector() -> sqlite3.Connection:
-            conn = sqlite3.connect(path, autocommit=True) # Connection is created with autocommit=True, but it is disabled later
-            conn.setlimit(sqlite3.SQLITE_LIMIT_ATTACHED, len(attach_dict)) # Limit the number of attached dbs as a security measure
-            return conn
+            pool = ConnectionPool(key, path, attach_dict, self.pool_max_size, self.pool_idle_timeout, self.pool_health_check_interval)
+            self._pools[key] = pool
+        return pool
+
+    def connect(self, db_name: str = 'main', attach: list[str] | None = None, readonly: bool = False, autocommit: bool = False, foreign_keys: bool = True):
+        """
+        Checks out a connection to the specified database from its pool.
+        Connections which aren't readonly are queued behind the database's writer, so only
+        use readonly=False if the connection is going to write to the database.
+        """
+        key = PoolKey(db_name, tuple(sorted(set(attach or []))), readonly, foreign_keys)
+        pool = self._get_pool(key)
+        writer = None
+        if not readonly:
+            writer = self._writers.get(db_name)
+            if writer is None:
+                writer = self._writers[db_name] = DBWriter(db_name)
+        return DBWrapperConnection(pool, autocommit, writer, _request_scope.get())
 
-        db_connection = aiosqlite.Connection(connector, iter_chunk_size=64)
-        return DBWrapperConnection(db_connection, readonly, attach_dict, autocommit, foreign_keys=foreign_keys)
+    @asynccontextmanager
+    async def request_scope(self) -> AsyncGenerator[DBRequestScope, None]:
+        """
+        Shares connections between everything that connects to the databases within the block,
+        see DBRequestScope. Nested scopes reuse the outer one.
+        """
+        scope = _request_scope.get()
+        if scope is not None:
+            yield scope
+            return
+        scope = DBRequestScope()
+        token = _request_scope.set(scope)
+        try:
+            yield scope
+        finally:
+            _request_scope.reset(token)
+            await scope.close()
@@ -937,6 +937,19 @@ class JobState(TableModel):
         )"""
 
 
+@dataclass
+class JobRunRequest(TableModel):
+    job_name: str
+    requested_on: int
+
+    @staticmethod
+    def get_create_table_command():
+        return """CREATE TABLE IF NOT EXISTS job_run_requests(
+            job_name TEXT PRIMARY KEY,
+            requested_on INTEGER NOT NULL
+        ) WITHOUT ROWID"""
+
+
     
 all_tables : list[type[TableModel]] = [
     Player, FriendCode, User, UserDiscord, Role, Permission, UserRole, RolePermission, 
@@ -948,4 +961,4 @@ all_tables : list[type[TableModel]] = [
     TeamTransfer, TeamEdit, RosterEdit, FriendCodeEdit,
     UserSettings, Notifications, PlayerBans, PlayerBansHistorical,
     PlayerNameEdit, PlayerClaim, FilteredWords,
-    Post, SeriesPost, TournamentPost, JobState]
+    Post, SeriesPost, TournamentPost, JobState, JobRunRequest]
@@ -16,6 +16,13 @@ class UserIPTimeRangesUserIPId(IndexModel):
         return """CREATE INDEX IF NOT EXISTS idx_user_ip_time_ranges_user_ip_id
             ON user_ip_time_ranges(user_ip_id)"""
 
+@dataclass
+class UserIPTimeRangesUserIPIdGranularityDateEarliest(IndexModel):
+    @staticmethod
+    def get_create_index_command() -> str:
+        return """CREATE INDEX IF NOT EXISTS idx_user_ip_time_ranges_user_ip_id_granularity_date_earliest
+            ON user_ip_time_ranges(user_ip_id, granularity, date_earliest)"""
+
 # Indexes for UserLogin table
 @dataclass
 class UserLoginSessionID(IndexModel):
@@ -30,6 +37,13 @@ class UserLoginFingerprintId(IndexModel):
     def get_create_index_command() -> str:
         return """CREATE INDEX IF NOT EXISTS idx_user_logins_fingerprint_id
             ON user_logins(fingerprint, id)"""
+
+@dataclass
+class UserLoginPersistentSessionIDId(IndexModel):
+    @staticmethod
+    def get_create_index_command() -> str:
+        return """CREATE INDEX IF NOT EXISTS idx_user_logins_persistent_session_id_id
+            ON user_logins(persistent_session_id, id)"""
     
 @dataclass
 class UserLoginUserID(IndexModel):
@@ -85,7 +99,10 @@ class UserIPIPAddressID(IndexModel):
 all_indices: list[type[IndexModel]] = [
     UserIPTimeRangesGranularityDateLatest,
     UserIPTimeRangesUserIPId,
+    UserIPTimeRangesUserIPIdGranularityDateEarliest,
     UserLoginSessionID,
+    UserLoginFingerprintId,
+    UserLoginPersistentSessionIDId,
     IPAddressIsCheckedIsVPNCheckedAt,
     IPAddressIsCheckedCheckedAt,
     IPAddressIPCityASN,
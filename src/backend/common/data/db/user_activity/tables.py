@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from common.data.db.common import TableModel
+from common.data.db.common import TableChange, TableModel
 
 @dataclass
 class UserLogin(TableModel):
@@ -87,4 +87,4 @@ class UserIPTimeRange(TableModel):
             granularity INTEGER NOT NULL DEFAULT 0
         )"""
 
-all_tables: list[type[TableModel]] = [UserLogin, IPAddress, UserIP, UserIPTimeRange]
+all_tables: list[type[TableModel]] = [UserLogin, IPAddress, UserIP, UserIPTimeRange, TableChange]
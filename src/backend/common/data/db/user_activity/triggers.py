@@ -0,0 +1,43 @@
+from dataclasses import dataclass
+from common.data.db.common import TriggerModel
+
+# These triggers count the changes to the tables which the worker's alt detection jobs read,
+# so that the worker can tell which jobs have new rows to look at from the table_changes table
+@dataclass
+class UserLoginsInsertChange(TriggerModel):
+    @staticmethod
+    def get_create_trigger_command() -> str:
+        return """CREATE TRIGGER IF NOT EXISTS trg_user_logins_insert_change
+            AFTER INSERT ON user_logins
+            BEGIN
+                INSERT INTO table_changes(table_name, change_count) VALUES ('user_logins', 1)
+                ON CONFLICT(table_name) DO UPDATE SET change_count = change_count + 1;
+            END"""
+
+@dataclass
+class UserIPsInsertChange(TriggerModel):
+    @staticmethod
+    def get_create_trigger_command() -> str:
+        return """CREATE TRIGGER IF NOT EXISTS trg_user_ips_insert_change
+            AFTER INSERT ON user_ips
+            BEGIN
+                INSERT INTO table_changes(table_name, change_count) VALUES ('user_ips', 1)
+                ON CONFLICT(table_name) DO UPDATE SET change_count = change_count + 1;
+            END"""
+
+@dataclass
+class IPAddressesCheckedChange(TriggerModel):
+    @staticmethod
+    def get_create_trigger_command() -> str:
+        return """CREATE TRIGGER IF NOT EXISTS trg_ip_addresses_checked_change
+            AFTER UPDATE OF is_checked, checked_at ON ip_addresses
+            BEGIN
+                INSERT INTO table_changes(table_name, change_count) VALUES ('ip_addresses', 1)
+                ON CONFLICT(table_name) DO UPDATE SET change_count = change_count + 1;
+            END"""
+
+all_triggers: list[type[TriggerModel]] = [
+    UserLoginsInsertChange,
+    UserIPsInsertChange,
+    IPAddressesCheckedChange
+]
@@ -0,0 +1,230 @@
+"""
+In-memory materialized time trial leaderboards.
+
+Each (game, track) is loaded from DuckDB the first time its leaderboard is requested, and from then
+on is kept up to date by the commands which modify time trials, which refresh the records of the
+player they changed. Only each player's best record per validation filter is kept in rank order,
+so reading a leaderboard doesn't need a window function or a join on the proofs table.
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import AsyncIterator, Iterable
+from dataclasses import dataclass, field
+from datetime import datetime
+from logging import getLogger
+from typing import Any, cast
+import asyncio
+
+from common.data.duckdb.proofs import proofs_column, proofs_from_column
+from common.data.duckdb.wrapper import DuckDBWrapper
+from common.data.models import ProofResponseData, TimeTrialResponseData
+
+logger = getLogger(__name__)
+
+RECORD_COLUMNS = f"tt.id, tt.version, tt.player_id, tt.game, tt.track, tt.time_ms, {proofs_column(include_invalid=False)}, tt.created_at, tt.updated_at, tt.validation_status"
+
+
+def get_leaderboard_filter(include_unvalidated: bool, include_proofless: bool) -> frozenset[str]:
+    """Gets the validation statuses shown on a leaderboard. Valid records are always shown, invalid records never are."""
+    statuses = ["valid"]
+    if include_unvalidated:
+        statuses.append("unvalidated")
+    if include_proofless:
+        statuses.append("proofless")
+    return frozenset(statuses)
+
+LEADERBOARD_FILTERS = [get_leaderboard_filter(unvalidated, proofless) for unvalidated in (False, True) for proofless in (False, True)]
+
+
+def leaderboard_record_from_row(row: tuple[Any, ...]) -> TimeTrialResponseData:
+    """Converts a row selected with RECORD_COLUMNS to a leaderboard record."""
+    id, version, player_id, game, track, time_ms, proofs, created_at, updated_at, validation_status = row
+    proof_responses = [
+        ProofResponseData(
+            id=proof.id,
+            url=proof.url,
+            type=proof.type,
+            created_at=proof.created_at,
+            status=proof.status,
+            validator_id=proof.validator_id,
+            validated_at=proof.validated_at,
+        )
+        for proof in proofs_from_column(proofs)
+    ]
+    return TimeTrialResponseData(
+        id=id,
+        version=version,
+        player_id=player_id,
+        game=game,
+        track=track,
+        time_ms=time_ms,
+        proofs=proof_responses,
+        created_at=created_at,
+        updated_at=updated_at,
+        validation_status=validation_status,
+        player_name=None,
+        player_country_code=None,
+    )
+
+
+type RankKey = tuple[int, datetime, int]
+
+
+def rank_key(record: TimeTrialResponseData) -> RankKey:
+    return (record.time_ms, cast(datetime, record.created_at), record.player_id)
+
+
+def encode_cursor(key: RankKey) -> str:
+    time_ms, created_at, player_id = key
+    return f"{time_ms}_{created_at.isoformat()}_{player_id}"
+
+
+def decode_cursor(cursor: str) -> RankKey | None:
+    """Decodes a cursor created by encode_cursor, returning None if it is malformed."""
+    try:
+        time_ms, created_at, player_id = cursor.split("_")
+        return (int(time_ms), datetime.fromisoformat(created_at), int(player_id))
+    except ValueError:
+        return None
+
+
+@dataclass
+class TrackLeaderboard:
+    """Each player's best record on a track, in rank order, for every leaderboard filter."""
+    ranking: dict[frozenset[str], list[RankKey]] = field(default_factory=lambda: {f: [] for f in LEADERBOARD_FILTERS})
+    bests: dict[frozenset[str], dict[int, TimeTrialResponseData]] = field(default_factory=lambda: {f: {} for f in LEADERBOARD_FILTERS})
+
+    def set_player_records(self, player_id: int, records: Iterable[TimeTrialResponseData]):
+        """Replaces a player's records, which must be sorted by time and then submission date."""
+        records = list(records)
+        for statuses in LEADERBOARD_FILTERS:
+            ranking = self.ranking[statuses]
+            bests = self.bests[statuses]
+            old_best = bests.pop(player_id, None)
+            if old_best is not None:
+                old_key = rank_key(old_best)
+                index = bisect_left(ranking, old_key)
+                if index < len(ranking) and ranking[index] == old_key:
+                    del ranking[index]
+            new_best = next((r for r in records if r.validation_status in statuses), None)
+            if new_best is not None:
+                bests[player_id] = new_best
+                insort(ranking, rank_key(new_best))
+
+    def records(self, statuses: frozenset[str], start: int = 0, stop: int | None = None) -> list[TimeTrialResponseData]:
+        bests = self.bests[statuses]
+        return [bests[player_id] for _, _, player_id in self.ranking[statuses][start:stop]]
+
+    def keys(self, statuses: frozenset[str], start: int = 0, stop: int | None = None) -> list[RankKey]:
+        return self.ranking[statuses][start:stop]
+
+    def count(self, statuses: frozenset[str]) -> int:
+        return len(self.ranking[statuses])
+
+    def rank(self, statuses: frozenset[str], time_ms: int) -> int:
+        """Gets the rank of a time, which is one more than the number of players with a faster time."""
+        return bisect_left(self.ranking[statuses], time_ms, key=lambda key: key[0]) + 1
+
+    def index_after(self, statuses: frozenset[str], key: RankKey) -> int:
+        """Gets the position of the first record which ranks after the given key."""
+        return bisect_right(self.ranking[statuses], key)
+
+    def index_of_player(self, statuses: frozenset[str], player_id: int) -> int | None:
+        best = self.bests[statuses].get(player_id)
+        if best is None:
+            return None
+        return bisect_left(self.ranking[statuses], rank_key(best))
+
+
+class LeaderboardCache:
+    """Process-wide cache of materialized track leaderboards."""
+
+    def __init__(self, duckdb_wrapper: DuckDBWrapper):
+        self._duckdb_wrapper = duckdb_wrapper
+        self._tracks: dict[tuple[str, str], TrackLeaderboard] = {}
+        self._locks: dict[tuple[str, str], asyncio.Lock] = {}
+
+    def _lock(self, key: tuple[str, str]) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    async def get(self, game: str, track: str) -> TrackLeaderboard:
+        """Gets the leaderboard for a track, loading it from DuckDB if it isn't cached yet."""
+        key = (game, track)
+        leaderboard = self._tracks.get(key)
+        if leaderboard is not None:
+            return leaderboard
+        async with self._lock(key):
+            leaderboard = self._tracks.get(key)
+            if leaderboard is None:
+                leaderboard = await self._load(game, track)
+                self._tracks[key] = leaderboard
+            return leaderboard
+
+    async def _load(self, game: str, track: str) -> TrackLeaderboard:
+        query = f"""
+            SELECT {RECORD_COLUMNS}
+            FROM time_trials tt
+            WHERE tt.game = $game AND tt.track = $track AND tt.is_invalid = false AND tt.validation_status != 'invalid'
+            ORDER BY tt.player_id, tt.time_ms ASC, tt.created_at ASC
+        """
+        leaderboard = TrackLeaderboard()
+        player_id: int | None = None
+        player_records: list[TimeTrialResponseData] = []
+        async with self._duckdb_wrapper.connection() as conn:
+            async with conn.execute(query, {"game": game, "track": track}) as cursor:
+                async for row in cast(AsyncIterator[tuple[Any, ...]], cursor):
+                    try:
+                        record = leaderboard_record_from_row(row)
+                    except Exception as e:
+                        logger.error(f"Error processing leaderboard record {row[0]}: {e}")
+                        continue
+                    if record.player_id != player_id:
+                        if player_id is not None:
+                            leaderboard.set_player_records(player_id, player_records)
+                        player_id, player_records = record.player_id, []
+                    player_records.append(record)
+        if player_id is not None:
+            leaderboard.set_player_records(player_id, player_records)
+        return leaderboard
+
+    async def refresh_player(self, game: str, track: str, player_id: int):
+        """
+        Re-reads a player's records on a track after they have been changed. Tracks which
+        aren't cached are skipped, they will pick up the change when they are loaded.
+        """
+        key = (game, track)
+        if key not in self._tracks and key not in self._locks:
+            return
+        # if the track is being loaded, wait for it to finish in case it read the records before they changed
+        async with self._lock(key):
+            leaderboard = self._tracks.get(key)
+            if leaderboard is None:
+                return
+            query = f"""
+                SELECT {RECORD_COLUMNS}
+                FROM time_trials tt
+                WHERE tt.game = $game AND tt.track = $track AND tt.player_id = $player_id
+                    AND tt.is_invalid = false AND tt.validation_status != 'invalid'
+                ORDER BY tt.time_ms ASC, tt.created_at ASC
+            """
+            try:
+                async with self._duckdb_wrapper.connection() as conn:
+                    async with conn.execute(query, {"game": game, "track": track, "player_id": player_id}) as cursor:
+                        rows = cast(Iterable[tuple[Any, ...]], await cursor.fetchall()) # pyright: ignore[reportUnknownMemberType]
+                leaderboard.set_player_records(player_id, [leaderboard_record_from_row(row) for row in rows])
+            except Exception:
+                # rather than serve a leaderboard which is out of date, reload it on the next read
+                logger.exception(f"Failed to refresh leaderboard for {game}/{track}, evicting it")
+                del self._tracks[key]
+
+    async def invalidate(self, game: str, track: str):
+        """Drops a track's leaderboard so that it is reloaded on the next read, for when many of its records changed at once."""
+        key = (game, track)
+        async with self._lock(key):
+            self._tracks.pop(key, None)
+
+    def clear(self):
+        self._tracks.clear()
@@ -21,8 +21,8 @@ class DuckDBTableModel(ABC):
         pass
 
 @dataclass
-class TimeTrialProof:
-    """Not a table, but is the type used inside the TimeTrial model to represent proofs."""
+class TimeTrialProof(DuckDBTableModel):
+    """Proof submitted for a time trial, kept in submission order by the position column."""
     id: str
     url: str
     type: str
@@ -31,9 +31,27 @@ class TimeTrialProof:
     validator_id: int | None = None
     validated_at: str | None = None
 
+    @staticmethod
+    def get_create_table_command() -> str:
+        return '''
+        CREATE TABLE IF NOT EXISTS time_trial_proofs (
+            id VARCHAR PRIMARY KEY,
+            time_trial_id VARCHAR NOT NULL,
+            position INTEGER NOT NULL,
+            url VARCHAR NOT NULL,
+            type VARCHAR NOT NULL,
+            status VARCHAR NOT NULL DEFAULT 'unvalidated',
+            validator_id INTEGER,
+            validated_at VARCHAR,
+            created_at VARCHAR NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_time_trial_proofs_time_trial_id ON time_trial_proofs(time_trial_id);
+        CREATE INDEX IF NOT EXISTS idx_time_trial_proofs_status ON time_trial_proofs(status);
+        '''
+
 @dataclass
 class TimeTrial(DuckDBTableModel):
-    """Time trial record with embedded proofs and validation data."""
+    """Time trial record with validation data. Its proofs are stored in the time_trial_proofs table."""
     
     id: str = field(default_factory=lambda: str(uuid.uuid4()))
     version: int = 1
@@ -57,7 +75,6 @@ class TimeTrial(DuckDBTableModel):
             game VARCHAR NOT NULL,
             track VARCHAR NOT NULL,
             time_ms INTEGER NOT NULL,
-            proofs JSON NOT NULL DEFAULT '[]',
             is_invalid BOOLEAN NOT NULL DEFAULT false,
             validation_status VARCHAR NOT NULL DEFAULT 'proofless',
             created_at TIMESTAMP NOT NULL,
@@ -69,7 +86,48 @@ class TimeTrial(DuckDBTableModel):
         '''
 
 
-# Registry of all DuckDB table models for schema setup
+@dataclass
+class PlayerDim(DuckDBTableModel):
+    """
+    Copy of the player details shown alongside time trials, kept up to date from the SQLite players
+    table by SyncPlayersDimCommand so that time trials can be joined to players in a single query.
+    """
+    id: int
+    name: str
+    country_code: str
+    is_banned: bool
+
+    @staticmethod
+    def get_create_table_command() -> str:
+        return '''
+        CREATE TABLE IF NOT EXISTS players_dim (
+            id INTEGER PRIMARY KEY,
+            name VARCHAR NOT NULL,
+            country_code VARCHAR NOT NULL,
+            is_banned BOOLEAN NOT NULL
+        );
+        '''
+
+
+class PendingProofValidation(DuckDBTableModel):
+    """View of the proofs waiting for validation, which are the unvalidated proofs of records without a valid proof."""
+
+    @staticmethod
+    def get_create_table_command() -> str:
+        return '''
+        CREATE OR REPLACE VIEW pending_proof_validations AS
+        SELECT p.id AS proof_id, p.position, p.url, p.type, p.created_at AS proof_created_at,
+               tt.id AS time_trial_id, tt.player_id, tt.game, tt.track, tt.time_ms, tt.version, tt.created_at
+        FROM time_trials tt
+        JOIN time_trial_proofs p ON p.time_trial_id = tt.id
+        WHERE tt.validation_status = 'unvalidated' AND tt.is_invalid = false AND p.status = 'unvalidated';
+        '''
+
+
+# Registry of all DuckDB table models for schema setup, views must come after the tables they use
 ALL_DUCKDB_TABLES = [
     TimeTrial,
+    TimeTrialProof,
+    PlayerDim,
+    PendingProofValidation,
 ]
\ No newline at end of file
@@ -0,0 +1,69 @@
+"""
+Queries for the time_trial_proofs table.
+
+Proofs used to be stored as a JSON array in time_trials.proofs. They now have a row each, so the
+validation queue and validation status can be worked out in SQL instead of decoding every record.
+"""
+
+from collections.abc import Iterable
+from typing import Any
+import aioduckdb
+
+from common.data.duckdb.models import TimeTrialProof
+
+
+def proofs_column(include_invalid: bool = True) -> str:
+    """
+    A correlated subquery selecting the proofs of the time trial aliased as tt, in the order they
+    were submitted, as a list of structs. Convert the selected value with proofs_from_column.
+    """
+    status_condition = "" if include_invalid else "AND p.status != 'invalid'"
+    return f"""(
+        SELECT list(struct_pack(
+            id := p.id, url := p.url, type := p.type, created_at := p.created_at,
+            status := p.status, validator_id := p.validator_id, validated_at := p.validated_at
+        ) ORDER BY p.position)
+        FROM time_trial_proofs p
+        WHERE p.time_trial_id = tt.id {status_condition}
+    )"""
+
+
+def proofs_from_column(value: list[dict[str, Any]] | None) -> list[TimeTrialProof]:
+    return [TimeTrialProof(**proof) for proof in value] if value else []
+
+
+# Works out the validation status of each updated row of time_trials from its proofs:
+# - valid: there exists a proof with status "valid"
+# - invalid: is_invalid is true OR has proofs but all are marked "invalid"
+# - unvalidated: there exists a proof with status "unvalidated", but no proof with status "valid"
+# - proofless: there are no proofs at all
+VALIDATION_STATUS_EXPRESSION = """
+    CASE
+        WHEN time_trials.is_invalid THEN 'invalid'
+        WHEN NOT EXISTS (SELECT 1 FROM time_trial_proofs p WHERE p.time_trial_id = time_trials.id) THEN 'proofless'
+        WHEN EXISTS (SELECT 1 FROM time_trial_proofs p WHERE p.time_trial_id = time_trials.id AND p.status = 'valid') THEN 'valid'
+        WHEN EXISTS (SELECT 1 FROM time_trial_proofs p WHERE p.time_trial_id = time_trials.id AND p.status = 'unvalidated') THEN 'unvalidated'
+        ELSE 'invalid'
+    END
+"""
+
+
+async def insert_proofs(conn: aioduckdb.Connection, time_trial_id: str, proofs: Iterable[TimeTrialProof]):
+    """Inserts the proofs of a time trial. Runs on the connection itself, so it takes part in any open transaction."""
+    rows = [
+        (proof.id, time_trial_id, position, proof.url, proof.type, proof.status, proof.validator_id, proof.validated_at, proof.created_at)
+        for position, proof in enumerate(proofs)
+    ]
+    if not rows:
+        return
+    insert_query = """
+        INSERT INTO time_trial_proofs (id, time_trial_id, position, url, type, status, validator_id, validated_at, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    await conn.executemany(insert_query, rows)
+
+
+async def replace_proofs(conn: aioduckdb.Connection, time_trial_id: str, proofs: Iterable[TimeTrialProof]):
+    """Replaces all of the proofs of a time trial. Should be run inside a transaction."""
+    await conn.execute_on_self("DELETE FROM time_trial_proofs WHERE time_trial_id = $time_trial_id", {"time_trial_id": time_trial_id})
+    await insert_proofs(conn, time_trial_id, proofs)
@@ -1,54 +1,118 @@
 """DuckDB wrapper providing async connection management."""
 
 import aioduckdb
+import asyncio
+import duckdb
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
 from types import TracebackType
+from typing import Any
 import logging
+import msgspec
 import os
 
 logger = logging.getLogger(__name__)
 
 
+@asynccontextmanager
+async def transaction(conn: aioduckdb.Connection) -> AsyncGenerator[None]:
+    """
+    Runs the statements in the block in a single transaction, which is committed if the block succeeds.
+    Statements must be run with execute_on_self or executemany, since execute runs each statement
+    on a new cursor which has its own transaction context. The cursors returned by execute_on_self
+    wrap the connection itself, so they must not be used as context managers, which would close it.
+    """
+    await conn.execute_on_self("BEGIN TRANSACTION")
+    try:
+        yield
+    except BaseException:
+        await conn.rollback()
+        raise
+    await conn.commit()
+
+
+def write_ndjson(path: str, items: list[Any]):
+    """Writes items to a newline-delimited JSON file, for DuckDB to read in bulk with read_json."""
+    encoder = msgspec.json.Encoder()
+    with open(path, "wb") as f:
+        for item in items:
+            f.write(encoder.encode(item))
+            f.write(b"\n")
+
+
 class DuckDBWrapperConnection:
-    """Async context manager for DuckDB connections."""
-    
-    def __init__(self, db_path: str):
-        self.db_path = db_path
+    """Async context manager for cursors on the shared DuckDB database."""
+
+    def __init__(self, wrapper: "DuckDBWrapper"):
+        self.wrapper = wrapper
         self.conn: aioduckdb.Connection | None = None
 
     async def __aenter__(self) -> aioduckdb.Connection:
         try:
-            self.conn = await aioduckdb.connect(database=self.db_path, read_only=False)
-            logger.debug(f"Connected to DuckDB at {self.db_path}")
+            database = await self.wrapper.open()
+            # Cursors are duplicate connections to the same in-process database, so they share its
+            # catalog and buffer pool, but each one gets its own transaction context
+            self.conn = await aioduckdb.Connection(database.cursor, iter_chunk_size=64)
             return self.conn
         except Exception as e:
-            logger.error(f"Failed to connect to DuckDB at {self.db_path}: {e}")
+            logger.error(f"Failed to connect to DuckDB at {self.wrapper.db_path}: {e}")
             raise
 
     async def __aexit__(self, exc_type: type | None, exc_val: BaseException | None, exc_tb: TracebackType | None) -> None:
         if self.conn:
             try:
                 await self.conn.close()
-                logger.debug(f"Closed DuckDB connection to {self.db_path}")
             except Exception as e:
-                logger.error(f"Error closing DuckDB connection: {e}")
+                logger.error(f"Error closing DuckDB cursor: {e}")
             finally:
                 self.conn = None
 
 
 class DuckDBWrapper:
-    """DuckDB wrapper providing connection management."""
-    
-    def __init__(self, db_path: str):
+    """
+    DuckDB wrapper providing connection management. The database file is opened once, the first
+    time it is needed, and stays open until close is called, so queries run against a warm buffer pool.
+    It is opened lazily since DuckDB only allows one process to open a database for writing.
+    """
+
+    def __init__(self, db_path: str, threads: int | None = None, memory_limit: str | None = None):
         self.db_path = db_path
+        self.threads = threads
+        self.memory_limit = memory_limit
+        self._database: duckdb.DuckDBPyConnection | None = None
+        self._lock = asyncio.Lock()
         logger.info(f"Initialized DuckDB wrapper for {db_path}")
 
+    async def open(self) -> duckdb.DuckDBPyConnection:
+        """Open the database if it isn't already open."""
+        if self._database is not None:
+            return self._database
+        async with self._lock:
+            if self._database is None:
+                config: dict[str, str | bool | int | float | list[str]] = {}
+                if self.threads is not None:
+                    config["threads"] = self.threads
+                if self.memory_limit is not None:
+                    config["memory_limit"] = self.memory_limit
+                self._database = await asyncio.to_thread(duckdb.connect, self.db_path, read_only=False, config=config)
+                logger.info(f"Opened DuckDB database at {self.db_path}")
+            return self._database
+
+    async def close(self):
+        async with self._lock:
+            if self._database is not None:
+                database, self._database = self._database, None
+                await asyncio.to_thread(database.close)
+                logger.info(f"Closed DuckDB database at {self.db_path}")
+
     def connection(self) -> DuckDBWrapperConnection:
-        """Create a new connection context manager."""
-        return DuckDBWrapperConnection(self.db_path)
-    
-    def reset_db(self):
+        """Create a new cursor context manager."""
+        return DuckDBWrapperConnection(self)
+
+    async def reset_db(self):
+        await self.close()
         logging.info(f"Resetting DuckDB file: {self.db_path}")
         try:
             os.remove(self.db_path)
         except FileNotFoundError:
-            logging.info(f"DuckDB file {self.db_path} not found.")
\ No newline at end of file
+            logging.info(f"DuckDB file {self.db_path} not found.")
@@ -29,6 +29,8 @@ class AltFlagFilter:
     from_date: int | None = None
     to_date: int | None = None
     page: int | None = None
+    cursor: str | None = None  # next_cursor from a previous page, to get the flags after it
+    include_data: bool = True  # set to False to leave out each flag's data
 
 @dataclass
 class PlayerAltFlagRequestData:
@@ -45,17 +47,31 @@ class AltFlag:
     id: int
     type: str
     flag_key: str
-    data: str
+    data: str | None
     score: int
     date: int
     fingerprint_hash: str | None
     users: list[AltFlagUser]
 
+@dataclass
+class AltClusterLink:
+    user_id_1: int
+    user_id_2: int
+    score: int # total score of the flags between the two users
+    flag_count: int
+
+@dataclass
+class AltCluster:
+    cluster_id: int
+    users: list[AltFlagUser]
+    links: list[AltClusterLink]
+
 @dataclass
 class AltFlagList:
     flags: list[AltFlag]
     count: int
     page_count: int
+    next_cursor: str | None = None
 
 @dataclass
 class IPAddress:
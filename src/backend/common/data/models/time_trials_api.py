@@ -2,8 +2,8 @@
 Time trials API request and response models.
 """
 
-from dataclasses import dataclass
-from typing import TypedDict
+from dataclasses import dataclass, field
+from typing import Literal, TypedDict
 
 
 class EditProofDict(TypedDict, total=False):
@@ -62,6 +62,7 @@ class TimeTrialResponseData:
     validation_status: str = "proofless"
     player_name: str | None = None
     player_country_code: str | None = None
+    rank: int | None = None  # Only set for leaderboard records, tied times share a rank
 
 
 @dataclass
@@ -84,20 +85,48 @@ class ProofWithValidationStatusResponseData:
 class ListProofsForValidationResponseData:
     """Response data for listing proofs with their validation statuses."""
     proofs: list[ProofWithValidationStatusResponseData]
+    count: int = 0
+    page_count: int = 0
+
+
+@dataclass
+class ProofValidationQueueFilter:
+    """Filter parameters for the proof validation queue, which is ordered oldest first."""
+    game: str | None = None
+    track: str | None = None
+    page: int | None = None
+
+
+@dataclass
+class ProofValidationQueueCountResponseData:
+    count: int
 
 
 @dataclass
 class LeaderboardFilter:
-    """Filter parameters for leaderboard queries."""
+    """
+    Filter parameters for leaderboard queries.
+    Pages are selected by cursor if one is given, otherwise by the page containing player_id's
+    best time if it is given, otherwise by page number.
+    """
     game: str
     track: str
     include_unvalidated: bool = False
     include_proofless: bool = False
+    page: int | None = None
+    limit: int = 50
+    cursor: str | None = None  # next_cursor from a previous page, to get the records after it
+    player_id: int | None = None  # Jump to the page containing this player's rank
+    country_code: str | None = None  # Only rank players from this country
 
 @dataclass
 class LeaderboardResponseData:
     """Response data for leaderboard queries."""
     records: list[TimeTrialResponseData]
+    count: int = 0
+    page: int = 1
+    page_count: int = 0
+    next_cursor: str | None = None
 
 
 @dataclass
@@ -153,4 +182,41 @@ class TimesheetFilter:
 @dataclass
 class TimesheetResponseData:
     """Response data for timesheet queries."""
-    records: list[TimeTrialResponseData]
\ No newline at end of file
+    records: list[TimeTrialResponseData]
+
+
+@dataclass
+class TimeTrialImportRow:
+    """A time trial in a bulk import file, which is either CSV with a header row or newline-delimited JSON."""
+    player_id: int
+    game: str
+    track: str  # Track ID from the game data
+    time_ms: int
+    created_at: str | None = None  # ISO 8601, UTC if no offset is given. Defaults to the time of the import
+    proof_url: str | None = None
+    proof_type: str | None = None
+    proof_status: Literal["unvalidated", "valid", "invalid"] = "unvalidated"
+
+
+@dataclass
+class TimeTrialImportFilter:
+    """Query parameters for bulk time trial imports."""
+    format: Literal["csv", "ndjson"] = "csv"
+    dry_run: bool = False  # Validate the file and count what would be imported without writing anything
+
+
+@dataclass
+class TimeTrialImportError:
+    line: int
+    error: str
+
+
+@dataclass
+class TimeTrialImportResponseData:
+    """Result of a bulk time trial import. Only the first errors are listed."""
+    dry_run: bool
+    processed: int = 0
+    imported: int = 0
+    duplicates: int = 0  # Rows matching a record with the same player, game, track and time
+    rejected: int = 0
+    errors: list[TimeTrialImportError] = field(default_factory=lambda: [])
@@ -0,0 +1,142 @@
+"""
+Process-wide cache of each user's effective permissions, so that checking a permission is a
+dictionary lookup instead of a join across the role tables for every scope.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import time
+
+from common.data.db import DBWrapper
+from common.data.models import Problem
+
+# Permission names mapped to whether any of the user's roles deny them
+type PermissionMap = dict[str, bool]
+
+
+@dataclass
+class PermissionSnapshot:
+    """The permissions a user has from their global roles and their series, tournament and team roles."""
+    permissions: PermissionMap = field(default_factory=lambda: {})
+    series: dict[int, PermissionMap] = field(default_factory=lambda: {})
+    tournaments: dict[int, PermissionMap] = field(default_factory=lambda: {})
+    teams: dict[int, PermissionMap] = field(default_factory=lambda: {})
+    # time.time() at which the snapshot must be reloaded, either from its TTL or from one of its roles expiring
+    expires_at: float = 0
+
+    def check(self, permission_name: str, check_denied_only: bool, series_id: int | None,
+              tournament_id: int | None, team_id: int | None) -> bool:
+        """
+        Scopes are checked from global roles down to team roles, and the first scope where the
+        user has a role with the permission decides the result, which is denied if any of those
+        roles deny it.
+        """
+        scopes = [self.permissions]
+        if series_id:
+            scopes.append(self.series.get(series_id, {}))
+        if tournament_id:
+            scopes.append(self.tournaments.get(tournament_id, {}))
+        if team_id:
+            scopes.append(self.teams.get(team_id, {}))
+        for scope in scopes:
+            is_denied = scope.get(permission_name)
+            if is_denied is not None:
+                return not is_denied
+        # if we haven't found any instance of the permission at this point, return true if we're
+        # only checking for denied permissions, otherwise false since the permission doesn't exist
+        return check_denied_only
+
+
+class PermissionCache:
+    """
+    Caches a PermissionSnapshot for each recently seen user, evicting the least recently used
+    past max_size. Commands which grant or remove roles invalidate the snapshots of the users
+    they change. Every invalidation bumps a version number, and a snapshot which was being loaded
+    while the version changed isn't stored, since it may have read the roles before the change.
+    Other processes only see changes once their snapshots expire after ttl seconds.
+    """
+
+    def __init__(self, db_wrapper: DBWrapper, ttl: float = 300, max_size: int = 10000):
+        self._db_wrapper = db_wrapper
+        self.ttl = ttl
+        self.max_size = max_size
+        self._snapshots: OrderedDict[int, PermissionSnapshot] = OrderedDict()
+        self._tournament_series: dict[int, int | None] = {}
+        self._version = 0
+
+    async def get(self, user_id: int) -> PermissionSnapshot:
+        snapshot = self._snapshots.get(user_id)
+        if snapshot is not None and snapshot.expires_at > time.time():
+            self._snapshots.move_to_end(user_id)
+            return snapshot
+
+        version = self._version
+        snapshot = await self._load(user_id)
+        if version == self._version:
+            self._snapshots[user_id] = snapshot
+            self._snapshots.move_to_end(user_id)
+            while len(self._snapshots) > self.max_size:
+                self._snapshots.popitem(last=False)
+        return snapshot
+
+    async def _load(self, user_id: int) -> PermissionSnapshot:
+        now = time.time()
+        timestamp = int(now)
+        snapshot = PermissionSnapshot()
+        # roles past their expiry are left out even if RemoveExpiredRolesCommand hasn't deleted them yet
+        role_tables = [
+            ("user_roles", "role_permissions", "permissions", None, None),
+            ("user_series_roles", "series_role_permissions", "series_permissions", "series_id", snapshot.series),
+            ("user_tournament_roles", "tournament_role_permissions", "tournament_permissions", "tournament_id", snapshot.tournaments),
+            ("user_team_roles", "team_role_permissions", "team_permissions", "team_id", snapshot.teams),
+        ]
+        earliest_expiry: int | None = None
+        async with self._db_wrapper.connect(readonly=True) as db:
+            for user_roles, role_permissions, permissions, scope_column, scopes in role_tables:
+                query = f"""
+                    SELECT {f'ur.{scope_column}' if scope_column else 'NULL'}, p.name, rp.is_denied, ur.expires_on
+                    FROM {user_roles} ur
+                    JOIN {role_permissions} rp ON rp.role_id = ur.role_id
+                    JOIN {permissions} p ON rp.permission_id = p.id
+                    WHERE ur.user_id = ? AND (ur.expires_on IS NULL OR ur.expires_on >= ?)
+                """
+                async with db.execute(query, (user_id, timestamp)) as cursor:
+                    rows = await cursor.fetchall()
+                for scope_id, name, is_denied, expires_on in rows:
+                    permission_map = snapshot.permissions if scopes is None else scopes.setdefault(scope_id, {})
+                    permission_map[name] = permission_map.get(name, False) or bool(is_denied)
+                    if expires_on is not None and (earliest_expiry is None or expires_on < earliest_expiry):
+                        earliest_expiry = expires_on
+        snapshot.expires_at = now + self.ttl
+        if earliest_expiry is not None:
+            # roles stop applying once the current time is past expires_on
+            snapshot.expires_at = min(snapshot.expires_at, earliest_expiry + 1)
+        return snapshot
+
+    async def get_tournament_series_id(self, tournament_id: int) -> int | None:
+        if tournament_id in self._tournament_series:
+            return self._tournament_series[tournament_id]
+        version = self._version
+        async with self._db_wrapper.connect(readonly=True) as db:
+            async with db.execute("SELECT series_id FROM tournaments WHERE id = ?", (tournament_id,)) as cursor:
+                row = await cursor.fetchone()
+                if not row:
+                    raise Problem("Tournament not found", status=400)
+                series_id: int | None = row[0]
+        if version == self._version:
+            self._tournament_series[tournament_id] = series_id
+        return series_id
+
+    def invalidate_user(self, *user_ids: int):
+        self._version += 1
+        for user_id in user_ids:
+            self._snapshots.pop(user_id, None)
+
+    def invalidate_tournament(self, tournament_id: int):
+        self._version += 1
+        self._tournament_series.pop(tournament_id, None)
+
+    def clear(self):
+        self._version += 1
+        self._snapshots.clear()
+        self._tournament_series.clear()
@@ -0,0 +1,74 @@
+"""
+Process-wide cache of player summaries, for commands which show players alongside data read from
+another store such as the time trials DuckDB database.
+"""
+
+from collections.abc import Iterable
+import time
+
+from common.data.db import DBWrapper
+from common.data.models import PlayerBasic
+
+
+class PlayerSummaryCache:
+    """
+    Caches each player's name, country and ban status. Entries expire after ttl seconds, and are
+    evicted sooner by the commands which change them. Other processes only see those changes once
+    their own entries expire.
+
+    The IDs of invalidated players are also collected until take_changed is called, so that copies
+    of the players table such as DuckDB's players_dim can be updated without reading every player.
+    """
+
+    def __init__(self, db_wrapper: DBWrapper, ttl: float = 300, max_size: int = 50000):
+        self._db_wrapper = db_wrapper
+        self.ttl = ttl
+        self.max_size = max_size
+        # dicts keep insertion order, so the first entry is always the one which was loaded longest ago
+        self._entries: dict[int, tuple[PlayerBasic, float]] = {}
+        self._changed: set[int] = set()
+
+    async def get_many(self, player_ids: Iterable[int]) -> dict[int, PlayerBasic]:
+        """Gets the summaries of the given players, leaving out any which don't exist."""
+        now = time.monotonic()
+        found: dict[int, PlayerBasic] = {}
+        missing: set[int] = set()
+        for player_id in player_ids:
+            entry = self._entries.get(player_id)
+            if entry is not None and entry[1] > now:
+                found[player_id] = entry[0]
+            else:
+                missing.add(player_id)
+        if not missing:
+            return found
+
+        async with self._db_wrapper.connect(readonly=True) as db:
+            placeholders = ', '.join(['?'] * len(missing))
+            async with db.execute(f"SELECT id, name, country_code, is_banned FROM players WHERE id IN ({placeholders})", list(missing)) as cursor:
+                rows = await cursor.fetchall()
+
+        expires_at = now + self.ttl
+        for player_id, name, country_code, is_banned in rows:
+            player = PlayerBasic(player_id, name, country_code, bool(is_banned))
+            found[player_id] = player
+            self._entries.pop(player_id, None)
+            self._entries[player_id] = (player, expires_at)
+        while len(self._entries) > self.max_size:
+            del self._entries[next(iter(self._entries))]
+        return found
+
+    async def get(self, player_id: int) -> PlayerBasic | None:
+        return (await self.get_many([player_id])).get(player_id)
+
+    def invalidate(self, *player_ids: int):
+        for player_id in player_ids:
+            self._entries.pop(player_id, None)
+            self._changed.add(player_id)
+
+    def take_changed(self) -> set[int]:
+        """Gets the IDs of the players invalidated since the last call."""
+        changed, self._changed = self._changed, set()
+        return changed
+
+    def clear(self):
+        self._entries.clear()
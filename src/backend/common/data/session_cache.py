@@ -0,0 +1,72 @@
+"""
+Process-wide cache of the users that session cookies and API tokens belong to, so that
+authenticating a request doesn't need a database connection.
+"""
+
+from collections import OrderedDict
+from typing import Literal
+import time
+
+from common.data.models import User
+from common.telemetry import get_meter
+
+meter = get_meter(__name__)
+
+lookups = meter.create_counter(
+    "auth.session_cache.lookups",
+    description="Number of session and API token lookups, split by whether they were served from the cache",
+)
+
+type CredentialKind = Literal["session", "token"]
+
+
+class SessionCache:
+    """
+    Least recently used cache of the user each session ID or API token ID belongs to. Entries expire
+    after ttl seconds, or when the credential itself expires if that is sooner, and are evicted sooner when the session or token is deleted or its user is
+    linked to a different player. Only credentials which exist are cached, so a deleted session can
+    only be served by another process until its entry there expires.
+    """
+
+    def __init__(self, ttl: float = 60, max_size: int = 10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[tuple[CredentialKind, str], tuple[User, float]] = OrderedDict()
+
+    def get(self, kind: CredentialKind, credential_id: str) -> User | None:
+        key = (kind, credential_id)
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            lookups.add(1, {"auth.credential": kind, "cache.result": "miss"})
+            return None
+        self._entries.move_to_end(key)
+        lookups.add(1, {"auth.credential": kind, "cache.result": "hit"})
+        return entry[0]
+
+    def set(self, kind: CredentialKind, credential_id: str, user: User, expires_in: float | None = None):
+        """Caches a credential's user. expires_in caps the entry's lifetime at the seconds left until the credential expires."""
+        key = (kind, credential_id)
+        ttl = self.ttl if expires_in is None else min(self.ttl, expires_in)
+        if ttl <= 0:
+            self._entries.pop(key, None)
+            return
+        self._entries[key] = (user, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, kind: CredentialKind, credential_id: str):
+        self._entries.pop((kind, credential_id), None)
+
+    def invalidate_user(self, user_id: int):
+        """Evicts every session and token of a user, e.g. after their user is linked to another player."""
+        for key in [key for key, (user, _) in self._entries.items() if user.id == user_id]:
+            del self._entries[key]
+
+    def invalidate_player(self, player_id: int):
+        """Evicts every session and token of the users linked to a player."""
+        for key in [key for key, (user, _) in self._entries.items() if user.player_id == player_id]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
@@ -12,6 +12,13 @@ from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader, Metr
 from opentelemetry.sdk._logs import LoggerProvider, LoggingHandler
 from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
 
+def get_meter(name: str) -> metrics.Meter:
+    """
+    Gets a meter for recording metrics. Instruments can be created at import time,
+    they will start exporting once setup_telemetry has configured the meter provider.
+    """
+    return metrics.get_meter(name)
+
 def setup_telemetry():
     tracer_provider = TracerProvider()
     otlp = bool(os.environ.get('OTEL_EXPORTER_OTLP_ENDPOINT')) # if not set, assume no OTLP
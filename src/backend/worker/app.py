@@ -1,82 +1,234 @@
 import asyncio
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import logging
-from common.telemetry import setup_telemetry
+import random
+import time
+from common.telemetry import get_meter, setup_telemetry
 from opentelemetry import trace
-from worker.data import on_startup
+from common.data.commands import ClaimJobRunRequestsCommand, GetTableChangeCountsCommand
+from worker.data import handle, on_startup
 from worker import settings
 from worker.jobs import Job, get_all_jobs
+from worker.jobs.base import JobConcurrency
+
+meter = get_meter("worker.jobs")
+
+job_duration = meter.create_histogram(
+    "worker.job.duration",
+    unit="s",
+    description="Time taken by each run of a job",
+)
+job_lag = meter.create_histogram(
+    "worker.job.lag",
+    unit="s",
+    description="Time between a job being due to run and it starting, including time spent waiting for a free slot",
+)
+
+# the longest a failing job waits before being retried
+MAX_BACKOFF = timedelta(minutes=30)
 
 class JobRunner:
-    def __init__(self, job: Job):
+    """
+    Runs a single job every job.delay, plus up to jitter of that delay so that jobs with the same delay
+    don't all start on the same tick. After a failure the delay doubles for each consecutive failure,
+    up to max_backoff, so a job that is failing doesn't keep hammering whatever it depends on.
+    """
+
+    def __init__(self, job: Job, jitter: float = 0.1, max_backoff: timedelta = MAX_BACKOFF):
         self._job = job
-        self._longer_than_delay = False
-        self._last_run = None
-        self._task = None
+        self._jitter = jitter
+        self._max_backoff = max_backoff
+        self._failures = 0
+        self._next_run = datetime.now(timezone.utc)
+        self._last_started: datetime | None = None
+        # the earliest a run was asked for while the job was running, which is applied once it finishes
+        self._requested: datetime | None = None
+        self._task: asyncio.Task[None] | None = None
         self._tracer = trace.get_tracer("worker.jobs")
 
-    def start(self):
-        async def run_with_error_handler():
+    @property
+    def job(self):
+        return self._job
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    @property
+    def next_run(self):
+        return self._next_run
+
+    @property
+    def failing(self):
+        return self._failures > 0
+
+    def is_due(self, now: datetime):
+        return not self.running and now >= self._next_run
+
+    def run_now(self):
+        """Makes the job due straight away. If it is already running, it runs again as soon as it finishes."""
+        self._request_run(datetime.now(timezone.utc))
+
+    def run_soon(self):
+        """
+        Makes the job due once job.min_delay has passed since it last started, so that a burst of
+        calls only leads to one run. If it is already running, the run waits for it to finish.
+        """
+        now = datetime.now(timezone.utc)
+        self._request_run(max(now, self._last_started + self._job.min_delay) if self._last_started else now)
+
+    def _request_run(self, at: datetime):
+        if self.running:
+            self._requested = at if self._requested is None else min(self._requested, at)
+        else:
+            self._next_run = min(self._next_run, at)
+
+    def start(self, slots: asyncio.Semaphore):
+        due = self._next_run
+        self._task = asyncio.create_task(self._run(due, slots), name=f"job: {self._job.name}")
+        return self._task
+
+    async def _run(self, due: datetime, slots: asyncio.Semaphore):
+        async with slots:
+            started_at = datetime.now(timezone.utc)
+            self._last_started = started_at
+            job_lag.record((started_at - due).total_seconds(), {"job.name": self._job.name})
+            start = time.monotonic()
+            outcome = "success"
             with self._tracer.start_as_current_span(
                 f"job.run: {self._job.name}",
                 attributes={
                     "job.name": self._job.name,
                     "job.delay_seconds": self._job.delay.total_seconds(),
+                    "job.concurrency": self._job.concurrency,
                 }
             ):
                 try:
                     await self._job.run()
+                    self._failures = 0
                 except Exception:
+                    outcome = "failure"
+                    self._failures += 1
                     logging.error(
                         f"Job '{self._job.name}' failed",
                         exc_info=True,
-                        extra={"job_name": self._job.name}
-                    )
-                    raise
-        
-        self._longer_than_delay = False
-        self._last_run = datetime.now(timezone.utc)
-        self._task = asyncio.create_task(run_with_error_handler())
-
-    def tick(self):
-        if self._last_run is None or self._task is None:
-            self.start()
-            return
-        
-        time_since_last_run = datetime.now(timezone.utc) - self._last_run
-        if time_since_last_run >= self._job.delay:
-            if self._task.done():
-                if self._longer_than_delay:
-                    logging.warning(
-                        f"Job '{self._job.name}' took {time_since_last_run} (delay: {self._job.delay})",
-                        extra={
-                            "job_name": self._job.name,
-                            "duration_seconds": time_since_last_run.total_seconds(),
-                            "delay_seconds": self._job.delay.total_seconds(),
-                        }
+                        extra={"job_name": self._job.name, "consecutive_failures": self._failures}
                     )
+            duration = time.monotonic() - start
+            job_duration.record(duration, {"job.name": self._job.name, "job.outcome": outcome})
 
-                self.start()
-            else:
-                if not self._longer_than_delay:
-                    logging.warning(
-                        f"Job '{self._job.name}' still running after {time_since_last_run} (delay: {self._job.delay})",
-                        extra={
-                            "job_name": self._job.name,
-                            "duration_seconds": time_since_last_run.total_seconds(),
-                            "delay_seconds": self._job.delay.total_seconds(),
-                        }
-                    )
-                    self._longer_than_delay = True
+        if duration >= self._job.delay.total_seconds():
+            logging.warning(
+                f"Job '{self._job.name}' took {timedelta(seconds=duration)} (delay: {self._job.delay})",
+                extra={
+                    "job_name": self._job.name,
+                    "duration_seconds": duration,
+                    "delay_seconds": self._job.delay.total_seconds(),
+                }
+            )
+        delay = self._job.delay
+        if self._failures:
+            delay = max(delay, min(delay * 2 ** self._failures, self._max_backoff))
+        delay += delay * random.uniform(0, self._jitter)
+        self._next_run = started_at + delay
+        # a run was asked for while the job was running
+        if self._requested is not None:
+            self._next_run = min(self._next_run, self._requested)
+            self._requested = None
+
+class JobScheduler:
+    """
+    Starts each job once it is due, limiting how many jobs of each concurrency class run at once so
+    that a few heavy cpu jobs can't stall the io jobs which other things are waiting on.
+    """
+
+    def __init__(self, jobs: list[Job], concurrency_limits: dict[JobConcurrency, int] | None = None):
+        self._runners = {job.name: JobRunner(job) for job in jobs}
+        limits = concurrency_limits or {"io": 8, "cpu": 1}
+        self._slots = {concurrency: asyncio.Semaphore(limit) for concurrency, limit in limits.items()}
+        self._wake = asyncio.Event()
+        self._watchers: dict[tuple[str, str], list[JobRunner]] = {}
+        for runner in self._runners.values():
+            for table in runner.job.watched_tables:
+                self._watchers.setdefault(table, []).append(runner)
+
+    def run_now(self, job_name: str):
+        runner = self._runners.get(job_name)
+        if runner is None:
+            raise KeyError(f"No job named '{job_name}'")
+        runner.run_now()
+        self._wake.set()
+
+    def tables_changed(self, tables: list[tuple[str, str]]):
+        """Runs the jobs watching any of the tables soon, unless they are backing off after failing."""
+        for table in tables:
+            for runner in self._watchers.get(table, []):
+                if not runner.failing:
+                    runner.run_soon()
+        self._wake.set()
+
+    async def watch_table_changes(self, interval: float = 1, retry_interval: float = 60):
+        """
+        Polls the table_changes tables of the databases with watched tables, which only hold a row
+        per tracked table, and runs the jobs watching any table whose change count has gone up.
+        """
+        db_names = {db_name for db_name, _ in self._watchers}
+        last_counts: dict[str, dict[str, int]] = {}
+        while True:
+            try:
+                changed: list[tuple[str, str]] = []
+                for db_name in db_names:
+                    counts = await handle(GetTableChangeCountsCommand(db_name))
+                    previous = last_counts.get(db_name)
+                    # the first poll only sets the baseline, since every job runs on startup anyway
+                    if previous is not None:
+                        changed.extend((db_name, table) for table, count in counts.items() if count != previous.get(table))
+                    last_counts[db_name] = counts
+                if changed:
+                    self.tables_changed(changed)
+            except Exception:
+                logging.error("Failed to check for table changes", exc_info=True)
+                await asyncio.sleep(retry_interval)
+                continue
+            await asyncio.sleep(interval)
+
+    async def watch_run_requests(self, interval: float = 5, retry_interval: float = 60):
+        """Runs the jobs which admins have asked to run through the API (see RequestJobRunCommand)."""
+        while True:
+            try:
+                for job_name in await handle(ClaimJobRunRequestsCommand()):
+                    try:
+                        self.run_now(job_name)
+                        logging.info(f"Job '{job_name}' was requested to run now", extra={"job_name": job_name})
+                    except KeyError:
+                        logging.warning(f"Ignoring request to run unknown job '{job_name}'", extra={"job_name": job_name})
+            except Exception:
+                logging.error("Failed to check for job run requests", exc_info=True)
+                await asyncio.sleep(retry_interval)
+                continue
+            await asyncio.sleep(interval)
+
+    async def run(self):
+        while True:
+            self._wake.clear()
+            now = datetime.now(timezone.utc)
+            for runner in self._runners.values():
+                if runner.is_due(now):
+                    task = runner.start(self._slots[runner.job.concurrency])
+                    task.add_done_callback(lambda _: self._wake.set())
+            # sleep until the next job is due, a job finishes or run_now is called
+            next_run = min((r.next_run for r in self._runners.values() if not r.running), default=now + timedelta(minutes=1))
+            timeout = max((next_run - now).total_seconds(), 0)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except TimeoutError:
+                pass
 
 
 async def main():
     await on_startup()
-    jobs = [JobRunner(job) for job in get_all_jobs()]
-    while True:
-        for job in jobs:
-            job.tick()
-        await asyncio.sleep(1)
+    scheduler = JobScheduler(get_all_jobs())
+    await asyncio.gather(scheduler.run(), scheduler.watch_table_changes(), scheduler.watch_run_requests())
 
 
 if __name__ == "__main__":
@@ -86,4 +238,4 @@ if __name__ == "__main__":
         debugpy.wait_for_client()  # blocks execution until client is attached
 
     setup_telemetry()
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -13,6 +13,7 @@ from worker.jobs import (
     ip_match_detection,
     persistent_cookie_detection,
     fingerprint_match_detection,
+    alt_graph,
     db_backup,
     close_tournament_registrations
 )
@@ -32,6 +33,7 @@ def get_all_jobs():
         _jobs.extend(ip_match_detection.get_jobs())
         _jobs.extend(persistent_cookie_detection.get_jobs())
         _jobs.extend(fingerprint_match_detection.get_jobs())
+        _jobs.extend(alt_graph.get_jobs())
         _jobs.extend(db_backup.get_jobs())
         _jobs.extend(close_tournament_registrations.get_jobs())
     return _jobs
\ No newline at end of file
@@ -1,7 +1,7 @@
 from datetime import timedelta
 from common.data.commands import CompressUserActivityTimeRangesCommand
 from worker.data import handle
-from worker.jobs.base import Job
+from worker.jobs.base import Job, JobConcurrency
 
 class CompressUserActivityTimeRangesJob(Job):
     @property
@@ -11,6 +11,10 @@ class CompressUserActivityTimeRangesJob(Job):
     @property
     def delay(self):
         return timedelta(minutes=15)  # Run every 15 minutes
+
+    @property
+    def concurrency(self) -> JobConcurrency:
+        return "cpu"
     
     async def run(self):
         await handle(CompressUserActivityTimeRangesCommand())
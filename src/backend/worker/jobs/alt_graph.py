@@ -0,0 +1,172 @@
+import asyncio
+from datetime import timedelta
+from dataclasses import dataclass
+from itertools import combinations
+
+from aiosqlite import Connection
+
+from common.data.command import Command
+from common.data.db import DBWrapper
+from worker.data import handle
+from worker.jobs.base import Job, JobConcurrency
+
+def _get_links(flag_users: dict[int, tuple[int, list[int]]]) -> dict[tuple[int, int], tuple[int, int]]:
+    """Gets the score and number of flags for each link between the users of the flags, with user_id_1 < user_id_2"""
+    links: dict[tuple[int, int], tuple[int, int]] = {}
+    for score, users in flag_users.values():
+        for pair in combinations(sorted(users), 2):
+            link_score, link_flags = links.get(pair, (0, 0))
+            links[pair] = (link_score + score, link_flags + 1)
+    return links
+
+def _merge_clusters(links: list[tuple[int, int]], current_clusters: dict[int, int]) -> tuple[dict[int, int], dict[int, int]]:
+    """
+    Union-find over the clusters the linked users are already in, where users who aren't in a
+    cluster yet start in a cluster of their own. Since a cluster's ID is its lowest user ID, the
+    merged cluster takes the lowest ID of the clusters being merged. Returns the new ID of each
+    existing cluster which was merged, and the cluster ID of each user who wasn't in one yet.
+    """
+    parents: dict[int, int] = {}
+    def find(cluster_id: int) -> int:
+        root = cluster_id
+        while parents.get(root, root) != root:
+            root = parents[root]
+        # point everything on the path straight at the root
+        while cluster_id != root:
+            parents[cluster_id], cluster_id = root, parents[cluster_id]
+        return root
+
+    for user_id_1, user_id_2 in links:
+        root_1 = find(current_clusters.get(user_id_1, user_id_1))
+        root_2 = find(current_clusters.get(user_id_2, user_id_2))
+        if root_1 != root_2:
+            parents[max(root_1, root_2)] = min(root_1, root_2)
+
+    merged_clusters = {cluster_id: find(cluster_id) for cluster_id in set(current_clusters.values()) if find(cluster_id) != cluster_id}
+    new_users = {user_id: find(user_id) for pair in links for user_id in pair if user_id not in current_clusters}
+    return merged_clusters, new_users
+
+@dataclass
+class UpdateAltGraphCommand(Command[None]):
+    """
+    Adds the alt flags created since the last run to the alt graph. Every pair of users on a flag is
+    linked in alt_graph_edges, adding the flag's score to the link's score. Once a link's total score
+    reaches min_cluster_score, the clusters of its users in alt_clusters are merged, so that chains of
+    weak links (e.g. single mobile IP matches) don't join unrelated users into one huge cluster. Flags are added in batches of batch_size, each in its own transaction
+    along with the last flag ID in alt_graph_progress, so a batch is never added to the graph twice.
+    """
+    batch_size: int = 5000
+    min_cluster_score: int = 10
+
+    async def handle(self, db_wrapper: DBWrapper):
+        while True:
+            async with db_wrapper.connect(db_name='alt_flags') as db:
+                async with db.execute("SELECT last_flag_id FROM alt_graph_progress WHERE id = 0") as cursor:
+                    row = await cursor.fetchone()
+                    last_flag_id = row[0] if row else -1
+
+                # flags without any users still move the progress past them
+                get_flags_query = """
+                    SELECT f.id, f.score, uf.user_id
+                    FROM (SELECT id, score FROM alt_flags WHERE id > :last_flag_id ORDER BY id LIMIT :limit) f
+                    LEFT JOIN user_alt_flags uf ON uf.flag_id = f.id
+                    ORDER BY f.id
+                """
+                rows = await db.execute_fetchall(get_flags_query, {"last_flag_id": last_flag_id, "limit": self.batch_size})
+                if not rows:
+                    break
+
+                flag_users: dict[int, tuple[int, list[int]]] = {}
+                for flag_id, score, user_id in rows:
+                    users = flag_users.setdefault(flag_id, (score, []))[1]
+                    if user_id is not None:
+                        users.append(user_id)
+
+                links = await asyncio.to_thread(_get_links, flag_users)
+                if links:
+                    await self._add_links(db, links)
+                update_progress_query = """
+                    INSERT INTO alt_graph_progress(id, last_flag_id) VALUES (0, :last_flag_id)
+                    ON CONFLICT(id) DO UPDATE SET last_flag_id = excluded.last_flag_id
+                """
+                await db.execute(update_progress_query, {"last_flag_id": max(flag_users)})
+                await db.commit()
+
+    async def _add_links(self, db: Connection, links: dict[tuple[int, int], tuple[int, int]]):
+        insert_edges_query = """
+            INSERT INTO alt_graph_edges(user_id, linked_user_id, score, flag_count)
+            VALUES (:user_id, :linked_user_id, :score, :flag_count)
+            ON CONFLICT(user_id, linked_user_id) DO UPDATE SET
+                score = score + excluded.score,
+                flag_count = flag_count + excluded.flag_count
+        """
+        await db.executemany(insert_edges_query, [
+            {"user_id": a, "linked_user_id": b, "score": score, "flag_count": flag_count}
+            for (user_id_1, user_id_2), (score, flag_count) in links.items()
+            for a, b in ((user_id_1, user_id_2), (user_id_2, user_id_1))
+        ])
+
+        # only the links whose total score, including earlier flags, is high enough join clusters
+        pairs = list(links)
+        strong_links: list[tuple[int, int]] = []
+        for i in range(0, len(pairs), 500):
+            chunk = pairs[i:i+500]
+            get_scores_query = f"""
+                SELECT user_id, linked_user_id, score FROM alt_graph_edges
+                WHERE (user_id, linked_user_id) IN (VALUES {','.join('(?, ?)' for _ in chunk)})
+            """
+            async with db.execute(get_scores_query, [user_id for pair in chunk for user_id in pair]) as cursor:
+                async for user_id_1, user_id_2, score in cursor:
+                    if score >= self.min_cluster_score:
+                        strong_links.append((user_id_1, user_id_2))
+        if not strong_links:
+            return
+
+        user_ids = list({user_id for pair in strong_links for user_id in pair})
+        current_clusters: dict[int, int] = {}
+        for i in range(0, len(user_ids), 500):
+            chunk = user_ids[i:i+500]
+            get_clusters_query = f"SELECT user_id, cluster_id FROM alt_clusters WHERE user_id IN ({','.join('?' * len(chunk))})"
+            async with db.execute(get_clusters_query, chunk) as cursor:
+                async for user_id, cluster_id in cursor:
+                    current_clusters[user_id] = cluster_id
+
+        merged_clusters, new_users = await asyncio.to_thread(_merge_clusters, strong_links, current_clusters)
+        merge_clusters_query = "UPDATE alt_clusters SET cluster_id = :new_cluster_id WHERE cluster_id = :cluster_id"
+        await db.executemany(merge_clusters_query, [
+            {"cluster_id": cluster_id, "new_cluster_id": new_cluster_id}
+            for cluster_id, new_cluster_id in merged_clusters.items()
+        ])
+        insert_clusters_query = "INSERT INTO alt_clusters(user_id, cluster_id) VALUES (:user_id, :cluster_id)"
+        await db.executemany(insert_clusters_query, [
+            {"user_id": user_id, "cluster_id": cluster_id}
+            for user_id, cluster_id in new_users.items()
+        ])
+
+class AltGraphJob(Job):
+    @property
+    def name(self):
+        return "Update Alt Graph"
+
+    @property
+    def delay(self):
+        return timedelta(minutes=15)  # Fallback for changes missed by watched_tables
+
+    @property
+    def concurrency(self) -> JobConcurrency:
+        return "cpu"
+
+    @property
+    def watched_tables(self) -> list[tuple[str, str]]:
+        return [('alt_flags', 'user_alt_flags')]
+
+    async def run(self):
+        # the progress is kept in alt_graph_progress rather than the job state, see UpdateAltGraphCommand
+        await handle(UpdateAltGraphCommand())
+
+_jobs: list[Job] = []
+
+def get_jobs():
+    if not _jobs:
+        _jobs.append(AltGraphJob())
+    return _jobs
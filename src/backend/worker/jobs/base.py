@@ -1,12 +1,17 @@
 from abc import ABC, abstractmethod
 from datetime import timedelta
-from typing import Any, TypeVar
+from typing import Any, Literal, TypeVar
 
 from common.data.commands import GetJobStateCommand, UpdateJobStateCommand
 
 
 T = TypeVar('T')
 
+# io jobs mostly wait on the database or other services, while cpu jobs do enough computation that
+# only a few of them should run at a time. cpu jobs run their pure Python work in a thread
+# (asyncio.to_thread) so that it doesn't stall the event loop, but they still share the GIL.
+JobConcurrency = Literal["io", "cpu"]
+
 class Job(ABC):
     @property
     @abstractmethod
@@ -18,6 +23,26 @@ class Job(ABC):
     def delay(self) -> timedelta:
         pass
 
+    @property
+    def concurrency(self) -> JobConcurrency:
+        return "io"
+
+    @property
+    def watched_tables(self) -> list[tuple[str, str]]:
+        """
+        (db_name, table_name) pairs of tables tracked in their database's table_changes table.
+        The job is run soon after one of them changes (see min_delay), as well as every delay.
+        """
+        return []
+
+    @property
+    def min_delay(self) -> timedelta:
+        """
+        The shortest time between the start of one run and a run triggered by a change to one of
+        the watched tables. Changes within it are coalesced into a single run once it has passed.
+        """
+        return timedelta(minutes=1)
+
     @abstractmethod
     async def run(self):
         pass
@@ -1,21 +1,53 @@
+import asyncio
+from collections.abc import Iterable
 from datetime import timedelta
 from dataclasses import dataclass
+from itertools import combinations, groupby
 import json
 from typing import Any
 
 from common.data.command import Command
 from common.data.db import DBWrapper
 from worker.data import handle
-from worker.jobs.base import Job
+from worker.jobs.base import Job, JobConcurrency
 
 @dataclass
 class IPMatchDetectionState:
     last_user_ip_id: int = -1
     last_checked_timestamp: int = -1
 
+@dataclass
+class IPMatch:
+    user_id_1: int
+    user_id_2: int
+    ip_address_id: int
+    score: int
+    date_1: int
+    date_2: int
+    is_mobile: bool
+    is_vpn: bool
+    country: str | None
+    region: str | None
+    asn: str | None
+
+    @property
+    def flag_key(self):
+        return f"user_id_1={self.user_id_1},user_id_2={self.user_id_2}"
+
 @dataclass
 class DetectIPMatchesCommand(Command[IPMatchDetectionState]):
+    """
+    Flags pairs of users who have used the same IP address. Only IPs which have been checked
+    since the last run, or which users have started using since then, are looked at. For an IP
+    which has only gained new users, only the pairs including one of the new users are checked.
+    IPs used by more than max_users_per_ip users (or max_users_per_mobile_ip for mobile IPs),
+    such as carrier-grade NAT addresses, say little about whether two users are the same person
+    and would add a pair for every two of their users, so they are skipped.
+    """
     state: IPMatchDetectionState
+    max_users_per_ip: int = 50
+    max_users_per_mobile_ip: int = 15
+    chunk_size: int = 500
 
     async def handle(self, db_wrapper: DBWrapper) -> IPMatchDetectionState:
         async with db_wrapper.connect(db_name='user_activity', readonly=True) as db:
@@ -32,100 +64,98 @@ class DetectIPMatchesCommand(Command[IPMatchDetectionState]):
                 max_user_ip_id = row[0] if row[0] is not None else self.state.last_user_ip_id
                 max_checked_at = row[1] if row[1] is not None else self.state.last_checked_timestamp
 
-        if max_user_ip_id == self.state.last_user_ip_id and max_checked_at == self.state.last_checked_timestamp:
-            return self.state
-        
-        new_state = IPMatchDetectionState(
-            last_user_ip_id=max_user_ip_id,
-            last_checked_timestamp=max_checked_at
-        )
-        
-        async with db_wrapper.connect(db_name='alt_flags', attach=["user_activity"]) as db:
-            # Get the max ID before any operations
-            get_max_flag_id_query = """
-                SELECT MAX(id) FROM alt_flags
-            """
-            async with db.execute(get_max_flag_id_query) as cursor:
-                row = await cursor.fetchone()
-                prev_max_flag_id = -1 if not row or row[0] is None else row[0]
+            if max_user_ip_id == self.state.last_user_ip_id and max_checked_at == self.state.last_checked_timestamp:
+                return self.state
             
-            # First, identify all potential matches with their scores
-            matches_query = """
-                WITH ip_matches AS (
-                    SELECT
-                        ui1.user_id AS user_id_1,
-                        ui2.user_id AS user_id_2,
-                        ui1.ip_address_id AS ip_address_id,
-                        CASE
-                            WHEN ip.is_mobile = 1 THEN 1  -- Mobile IPs get lower score
-                            WHEN ip.is_vpn = 1 THEN 3     -- VPN IPs get medium score
-                            ELSE 10                       -- Regular IPs get highest score
-                        END AS score,
-                        'user_id_1=' || ui1.user_id || ',user_id_2=' || ui2.user_id AS flag_key,
-                        MIN(MAX(tr1.date_earliest, tr2.date_earliest)) AS match_date,
-                        tr1.date_earliest AS date_1,
-                        tr2.date_earliest AS date_2,
-                        ip.is_mobile AS is_mobile,
-                        ip.is_vpn AS is_vpn,
-                        ip.country AS country,
-                        ip.region AS region,
-                        ip.asn AS asn
-                    FROM user_activity.user_ips ui1
-                    JOIN user_activity.user_ips ui2 ON 
-                        ui1.ip_address_id = ui2.ip_address_id AND
-                        ui1.user_id < ui2.user_id -- Ensures each pair is only counted once
-                    JOIN user_activity.ip_addresses ip ON ui1.ip_address_id = ip.id
-                    JOIN user_activity.user_ip_time_ranges tr1 ON ui1.id = tr1.user_ip_id
-                    JOIN user_activity.user_ip_time_ranges tr2 ON ui2.id = tr2.user_ip_id
-                    WHERE
-                        (ip.checked_at > :last_checked_timestamp OR ui1.id > :last_user_ip_id OR ui2.id > :last_user_ip_id) AND
-                        ui1.id <= :max_user_ip_id AND
-                        ui2.id <= :max_user_ip_id AND
-                        ip.checked_at <= :max_checked_at AND
-                        ip.is_checked = 1
-                    GROUP BY ui1.user_id, ui2.user_id
-                )
-                SELECT im.user_id_1, im.user_id_2, im.ip_address_id, im.score, im.flag_key, im.match_date, im.date_1, im.date_2, im.is_mobile, im.is_vpn, im.country,
-                    im.region, im.asn
-                FROM ip_matches im
-                LEFT JOIN alt_flags af ON im.flag_key = af.flag_key AND af.type = 'ip_match'
-                WHERE af.score IS NULL OR im.score > af.score
+            new_state = IPMatchDetectionState(
+                last_user_ip_id=max_user_ip_id,
+                last_checked_timestamp=max_checked_at
+            )
+
+            # IPs which were checked since the last run need all their pairs checked, since their score may have changed
+            touched_ips_query = """
+                SELECT id, 1 FROM ip_addresses
+                WHERE is_checked = 1 AND checked_at > :last_checked_timestamp AND checked_at <= :max_checked_at
+                UNION ALL
+                SELECT DISTINCT ip_address_id, 0 FROM user_ips
+                WHERE id > :last_user_ip_id AND id <= :max_user_ip_id
             """
-            
-            potential_matches = await db.execute_fetchall(matches_query, {
+            rechecked_ips: set[int] = set()
+            touched_ips: set[int] = set()
+            async with db.execute(touched_ips_query, {
                 "last_checked_timestamp": self.state.last_checked_timestamp,
+                "max_checked_at": max_checked_at,
                 "last_user_ip_id": self.state.last_user_ip_id,
-                "max_user_ip_id": max_user_ip_id,
-                "max_checked_at": max_checked_at
-            })
-            
-            if not potential_matches:
-                return new_state
+                "max_user_ip_id": max_user_ip_id
+            }) as cursor:
+                async for ip_address_id, is_rechecked in cursor:
+                    touched_ips.add(ip_address_id)
+                    if is_rechecked:
+                        rechecked_ips.add(ip_address_id)
+
+            # The best match for each pair of users across all the touched IPs
+            matches: dict[tuple[int, int], IPMatch] = {}
+            touched_ip_list = list(touched_ips)
+            for i in range(0, len(touched_ip_list), self.chunk_size):
+                chunk = touched_ip_list[i:i+self.chunk_size]
+                ip_users_query = f"""
+                    SELECT ip.id, ip.is_mobile, ip.is_vpn, ip.country, ip.region, ip.asn,
+                        ui.id, ui.user_id, (SELECT MIN(tr.date_earliest) FROM user_ip_time_ranges tr WHERE tr.user_ip_id = ui.id)
+                    FROM ip_addresses ip
+                    JOIN user_ips ui ON ui.ip_address_id = ip.id
+                    WHERE ip.id IN ({','.join('?' * len(chunk))})
+                    AND ip.is_checked = 1 AND ip.checked_at <= ?
+                    AND ui.id <= ?
+                    ORDER BY ip.id
+                """
+                rows = await db.execute_fetchall(ip_users_query, [*chunk, max_checked_at, max_user_ip_id])
+                # pairing up the users is pure Python, so keep it off the event loop
+                await asyncio.to_thread(self._add_chunk_matches, matches, rows, rechecked_ips)
+
+        if not matches:
+            return new_state
+        
+        async with db_wrapper.connect(db_name='alt_flags') as db:
+            # only keep matches which are new or have a higher score than the existing flag,
+            # looking the flags up by the UNIQUE(type, flag_key) index
+            match_list = list(matches.values())
+            existing_scores: dict[str, int] = {}
+            for i in range(0, len(match_list), self.chunk_size):
+                keys = [match.flag_key for match in match_list[i:i+self.chunk_size]]
+                existing_flags_query = f"SELECT flag_key, score FROM alt_flags WHERE type = 'ip_match' AND flag_key IN ({','.join('?' * len(keys))})"
+                async with db.execute(existing_flags_query, keys) as cursor:
+                    async for flag_key, score in cursor:
+                        existing_scores[flag_key] = score
                 
             new_flags: list[dict[str, Any]] = []
-            for (user_id_1, user_id_2, ip_address_id, score, flag_key, match_date, date_1, date_2, is_mobile, is_vpn, country,
-                 region, asn) in potential_matches:
+            for match in match_list:
+                existing_score = existing_scores.get(match.flag_key)
+                if existing_score is not None and match.score <= existing_score:
+                    continue
                 data: dict[str, Any] = {
                     "type": "ip_match",
-                    "flag_key": flag_key,
+                    "flag_key": match.flag_key,
                     "data": json.dumps({
-                        "user_id_1": user_id_1, 
-                        "user_id_2": user_id_2, 
-                        "ip_address_id": ip_address_id,
-                        "date_1": date_1,
-                        "date_2": date_2,
-                        "is_mobile": bool(is_mobile),
-                        "is_vpn": bool(is_vpn),
-                        "country": country,
-                        "region": region,
-                        "asn": asn,
+                        "user_id_1": match.user_id_1, 
+                        "user_id_2": match.user_id_2, 
+                        "ip_address_id": match.ip_address_id,
+                        "date_1": match.date_1,
+                        "date_2": match.date_2,
+                        "is_mobile": match.is_mobile,
+                        "is_vpn": match.is_vpn,
+                        "country": match.country,
+                        "region": match.region,
+                        "asn": match.asn,
                     }),
-                    "score": score,
-                    "date": match_date,
+                    "score": match.score,
+                    "date": max(match.date_1, match.date_2),
                     "login_id": None
                 }
                 new_flags.append(data)
 
+            if not new_flags:
+                return new_state
+
             get_max_flag_id_query = """
                 SELECT MAX(id) FROM alt_flags
             """
@@ -165,6 +195,37 @@ class DetectIPMatchesCommand(Command[IPMatchDetectionState]):
 
         return new_state
 
+    def _add_chunk_matches(self, matches: dict[tuple[int, int], IPMatch], rows: Iterable[Any], rechecked_ips: set[int]):
+        """Adds the matches for each IP in a chunk of rows ordered by IP"""
+        for ip_address_id, ip_rows in groupby(rows, key=lambda row: row[0]):
+            self._add_ip_matches(matches, list(ip_rows), ip_address_id in rechecked_ips)
+
+    def _add_ip_matches(self, matches: dict[tuple[int, int], IPMatch], ip_rows: list[Any], all_pairs: bool):
+        """Adds the matches between the users of a single IP, replacing worse matches for the same pair from other IPs"""
+        ip_address_id, is_mobile, is_vpn, country, region, asn = ip_rows[0][:6]
+        max_users = self.max_users_per_mobile_ip if is_mobile else self.max_users_per_ip
+        if len(ip_rows) > max_users:
+            return
+        if is_mobile:
+            score = 1 # Mobile IPs get lower score
+        elif is_vpn:
+            score = 3 # VPN IPs get medium score
+        else:
+            score = 10 # Regular IPs get highest score
+        
+        # users who haven't been seen on the IP yet can't be matched on it
+        users = [(user_ip_id, user_id, first_seen) for *_, user_ip_id, user_id, first_seen in ip_rows if first_seen is not None]
+        for a, b in combinations(users, 2):
+            # pairs where both users were already on the IP were checked by a previous run
+            if not all_pairs and a[0] <= self.state.last_user_ip_id and b[0] <= self.state.last_user_ip_id:
+                continue
+            (_, user_id_1, date_1), (_, user_id_2, date_2) = sorted((a, b), key=lambda user: user[1])
+            match = IPMatch(user_id_1, user_id_2, ip_address_id, score, date_1, date_2, bool(is_mobile), bool(is_vpn), country, region, asn)
+            # prefer the highest scoring IP, then the one they were first seen together on
+            existing = matches.get((user_id_1, user_id_2))
+            if existing is None or (match.score, -max(date_1, date_2)) > (existing.score, -max(existing.date_1, existing.date_2)):
+                matches[(user_id_1, user_id_2)] = match
+
 class IPMatchDetectionJob(Job):
     @property
     def name(self):
@@ -172,7 +233,15 @@ class IPMatchDetectionJob(Job):
     
     @property
     def delay(self):
-        return timedelta(minutes=1)
+        return timedelta(minutes=15)  # Fallback for changes missed by watched_tables
+
+    @property
+    def concurrency(self) -> JobConcurrency:
+        return "cpu"
+
+    @property
+    def watched_tables(self) -> list[tuple[str, str]]:
+        return [('user_activity', 'user_ips'), ('user_activity', 'ip_addresses')]
     
     async def run(self):
         # Get the previous state
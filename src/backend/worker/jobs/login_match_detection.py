@@ -0,0 +1,177 @@
+import asyncio
+from dataclasses import dataclass
+import json
+from typing import Any, Literal
+
+from common.data.db import DBWrapper
+
+@dataclass
+class LoginMatch:
+    user_id_1: int
+    user_id_2: int
+    key: str
+    date_1: int
+    date_2: int
+    login_id_1: int
+    login_id_2: int
+
+    @property
+    def flag_key(self):
+        return f"user_id_1={self.user_id_1},user_id_2={self.user_id_2}"
+
+def _add_key_matches(matches: dict[tuple[int, int], LoginMatch], users_by_key: dict[str, list[tuple[int, int, int, int]]],
+                     last_login_id: int, max_users_per_key: int):
+    """Adds the matches between the users of each key, replacing later matches for the same pair from other keys"""
+    for key, users in users_by_key.items():
+        # a key shared by lots of users (e.g. the fingerprint of a common phone) doesn't say much about any pair of them
+        if len(users) > max_users_per_key:
+            continue
+        # pairs where neither user has logged in with this key since the last run were checked by a previous run,
+        # so only pair up the users who have
+        new_users = [user for user in users if user[3] > last_login_id]
+        for new_user in new_users:
+            for other_user in users:
+                # pairs of two new users are visited from both sides, so only take them from the lower user ID
+                if other_user[0] == new_user[0] or (other_user[3] > last_login_id and other_user[0] < new_user[0]):
+                    continue
+                (user_id_1, date_1, login_id_1, _), (user_id_2, date_2, login_id_2, _) = sorted((new_user, other_user))
+                existing = matches.get((user_id_1, user_id_2))
+                if existing is None or max(date_1, date_2) < max(existing.date_1, existing.date_2):
+                    matches[(user_id_1, user_id_2)] = LoginMatch(user_id_1, user_id_2, key, date_1, date_2, login_id_1, login_id_2)
+
+async def detect_login_matches(db_wrapper: DBWrapper, last_login_id: int, key_column: Literal['fingerprint', 'persistent_session_id'],
+                               flag_type: str, score: int, max_users_per_key: int, key_data_field: str | None = None,
+                               chunk_size: int = 500) -> int:
+    """
+    Flags pairs of users who have logged in with the same value of key_column, returning the ID of the
+    last login that was checked. Only the values used by logins since last_login_id are looked up, using
+    the index on (key_column, id), and only pairs including a user with one of those new logins are
+    checked. Values used by more than max_users_per_key users are skipped, as are pairs which already
+    have a flag of flag_type.
+    """
+    async with db_wrapper.connect(db_name='user_activity', readonly=True) as db:
+        get_max_query = """
+            SELECT MAX(id) FROM user_logins
+        """
+        async with db.execute(get_max_query) as cursor:
+            row = await cursor.fetchone()
+            if not row or row[0] is None:
+                return last_login_id
+
+            max_login_id = row[0]
+
+        if max_login_id == last_login_id:
+            return last_login_id
+
+        new_keys_query = f"""
+            SELECT DISTINCT {key_column} FROM user_logins
+            WHERE id > :last_login_id AND id <= :max_login_id
+        """
+        new_keys = [row[0] for row in await db.execute_fetchall(new_keys_query, {
+            "last_login_id": last_login_id,
+            "max_login_id": max_login_id
+        })]
+
+        # The earliest match for each pair of users across all the new keys
+        matches: dict[tuple[int, int], LoginMatch] = {}
+        for i in range(0, len(new_keys), chunk_size):
+            chunk = new_keys[i:i+chunk_size]
+            key_users_query = f"""
+                SELECT {key_column}, user_id, MIN(date), MIN(id), MAX(id)
+                FROM user_logins
+                WHERE {key_column} IN ({','.join('?' * len(chunk))}) AND id <= ?
+                GROUP BY {key_column}, user_id
+            """
+            users_by_key: dict[str, list[tuple[int, int, int, int]]] = {}
+            async with db.execute(key_users_query, [*chunk, max_login_id]) as cursor:
+                async for key, user_id, date, min_login_id, max_user_login_id in cursor:
+                    users_by_key.setdefault(key, []).append((user_id, date, min_login_id, max_user_login_id))
+
+            # pairing up the users is pure Python, so keep it off the event loop
+            await asyncio.to_thread(_add_key_matches, matches, users_by_key, last_login_id, max_users_per_key)
+
+    if not matches:
+        return max_login_id
+
+    async with db_wrapper.connect(db_name='alt_flags') as db:
+        # drop the pairs which are already flagged, looking them up by the UNIQUE(type, flag_key) index
+        match_list = list(matches.values())
+        flagged_keys: set[str] = set()
+        for i in range(0, len(match_list), chunk_size):
+            keys = [match.flag_key for match in match_list[i:i+chunk_size]]
+            existing_flags_query = f"SELECT flag_key FROM alt_flags WHERE type = ? AND flag_key IN ({','.join('?' * len(keys))})"
+            async with db.execute(existing_flags_query, [flag_type, *keys]) as cursor:
+                async for row in cursor:
+                    flagged_keys.add(row[0])
+
+        new_flags: list[dict[str, Any]] = []
+        for match in match_list:
+            if match.flag_key in flagged_keys:
+                continue
+            if match.date_1 > match.date_2:
+                date = match.date_1
+                login_id = match.login_id_1
+            else:
+                date = match.date_2
+                login_id = match.login_id_2
+
+            flag_data: dict[str, Any] = {
+                "user_id_1": match.user_id_1,
+                "user_id_2": match.user_id_2,
+            }
+            if key_data_field:
+                flag_data[key_data_field] = match.key
+            flag_data.update({
+                "date_1": match.date_1,
+                "date_2": match.date_2,
+                "login_id_1": match.login_id_1,
+                "login_id_2": match.login_id_2
+            })
+            alt_flag_data: dict[str, Any] = {
+                "type": flag_type,
+                "flag_key": match.flag_key,
+                "data": json.dumps(flag_data),
+                "score": score,
+                "date": date,
+                "login_id": login_id
+            }
+            new_flags.append(alt_flag_data)
+
+        if not new_flags:
+            return max_login_id
+
+        # Get the id of the most recent alt flag
+        get_max_flag_id_query = """
+            SELECT MAX(id) FROM alt_flags
+        """
+        async with db.execute(get_max_flag_id_query) as cursor:
+            row = await cursor.fetchone()
+            prev_max_flag_id = -1 if not row or row[0] is None else row[0]
+
+        insert_flags_query = """
+            INSERT INTO alt_flags(type, flag_key, data, score, date, login_id)
+            VALUES (:type, :flag_key, :data, :score, :date, :login_id)
+            ON CONFLICT (type, flag_key) DO NOTHING
+        """
+        await db.executemany(insert_flags_query, new_flags)
+
+        # Now we need to insert the user_alt_flags entries
+        insert_user_alt_flags_query = """
+            WITH new_flags AS (
+                SELECT id, json_extract(data, '$.user_id_1') AS user_id_1, json_extract(data, '$.user_id_2') AS user_id_2
+                FROM alt_flags
+                WHERE type = :type AND id > :prev_max_flag_id
+            ),
+            new_user_flags AS (
+                SELECT user_id_1 AS user_id, id FROM new_flags
+                UNION ALL
+                SELECT user_id_2 AS user_id, id FROM new_flags
+            )
+            INSERT INTO user_alt_flags(user_id, flag_id)
+            SELECT user_id, id FROM new_user_flags WHERE true
+            ON CONFLICT(user_id, flag_id) DO NOTHING
+        """
+        await db.execute(insert_user_alt_flags_query, {"type": flag_type, "prev_max_flag_id": prev_max_flag_id})
+        await db.commit()
+
+    return max_login_id
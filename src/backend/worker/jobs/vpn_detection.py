@@ -6,7 +6,7 @@ from typing import Any
 from common.data.command import Command
 from common.data.db import DBWrapper
 from worker.data import handle
-from worker.jobs.base import Job
+from worker.jobs.base import Job, JobConcurrency
 
 @dataclass
 class VPNDetectionState:
@@ -115,7 +115,15 @@ class VPNDetectionJob(Job):
     
     @property
     def delay(self):
-        return timedelta(minutes=1)
+        return timedelta(minutes=15)  # Fallback for changes missed by watched_tables
+
+    @property
+    def concurrency(self) -> JobConcurrency:
+        return "cpu"
+
+    @property
+    def watched_tables(self) -> list[tuple[str, str]]:
+        return [('user_activity', 'user_ips'), ('user_activity', 'ip_addresses')]
     
     async def run(self):
         # Get the previous state
@@ -856,6 +856,7 @@ const de: Translation = {
     UNEXPECTED_ERROR: 'An unexpected error occurred.',
     NO_PROOFS_PENDING: 'There are no proofs pending validation.',
     NO_PROOFS_PENDING_FOR_GAME: 'No proofs pending validation for {game}.',
+    PROOFS_PENDING_COUNT: '{count} proofs pending validation',
     PROOF_ID: 'Proof ID: {id}',
     TIME_TRIAL_ID: 'Time Trial ID',
     PLAYER_ID: 'Player ID',
@@ -902,6 +903,7 @@ const de: Translation = {
     SEARCH_FOR_A_PLAYER_ABOVE: 'Search for a player above to view their timesheet.',
     LOGIN_TO_SUBMIT: 'Login to Submit',
     NO_RECORDS_FOUND: 'No records found for this track with the selected filters.',
+    RECORD_COUNT: '{count} records',
     BACK_TO_GAME_HOMEPAGE: 'Back to Game homepage',
     SHOW_TIMES: {
       PENDING_VALIDATION: 'Show times pending validation',
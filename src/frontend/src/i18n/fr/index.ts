@@ -855,6 +855,7 @@ const fr: Translation = {
     UNEXPECTED_ERROR: "Une erreur inattendue s'est produite.",
     NO_PROOFS_PENDING: "Il n'y a aucune preuve en attente de validation.",
     NO_PROOFS_PENDING_FOR_GAME: 'Aucune preuve en attente de validation pour {game}.',
+    PROOFS_PENDING_COUNT: '{count} proofs pending validation',
     PROOF_ID: 'ID de la preuve : {id}',
     TIME_TRIAL_ID: 'ID du contre-la-montre',
     PLAYER_ID: 'ID du joueur',
@@ -901,6 +902,7 @@ const fr: Translation = {
     SEARCH_FOR_A_PLAYER_ABOVE: 'Recherchez un joueur ci-dessus pour afficher sa feuille de temps.',
     LOGIN_TO_SUBMIT: 'Se connecter pour envoyer un temps',
     NO_RECORDS_FOUND: 'Aucun record trouvé pour ce circuit avec les filtres sélectionnés.',
+    RECORD_COUNT: '{count} records',
     BACK_TO_GAME_HOMEPAGE: "Retour à la page d'accueil du jeu",
     SHOW_TIMES: {
       PENDING_VALIDATION: 'Montrer les temps en attente de validation',
@@ -3208,6 +3208,11 @@ type RootTranslation = {
 		 * @param {string} game
 		 */
 		NO_PROOFS_PENDING_FOR_GAME: RequiredParams<'game'>
+		/**
+		 * {​c​o​u​n​t​}​ ​p​r​o​o​f​s​ ​p​e​n​d​i​n​g​ ​v​a​l​i​d​a​t​i​o​n
+		 * @param {number} count
+		 */
+		PROOFS_PENDING_COUNT: RequiredParams<'count'>
 		/**
 		 * P​r​o​o​f​ ​I​D​:​ ​{​i​d​}
 		 * @param {string} id
@@ -3383,6 +3388,11 @@ type RootTranslation = {
 		 * N​o​ ​r​e​c​o​r​d​s​ ​f​o​u​n​d​ ​f​o​r​ ​t​h​i​s​ ​t​r​c​k​ ​w​i​t​h​ ​t​h​e​ ​s​e​l​e​c​t​e​d​ ​f​i​l​t​e​r​s
 		 */
 		NO_RECORDS_FOUND: string
+		/**
+		 * {​c​o​u​n​t​}​ ​r​e​c​o​r​d​s
+		 * @param {number} count
+		 */
+		RECORD_COUNT: RequiredParams<'count'>
 		/**
 		 * B​a​c​k​ ​t​o​ ​G​a​m​e​ ​h​o​m​e​p​a​g​e
 		 */
@@ -8736,6 +8746,10 @@ export type TranslationFunctions = {
 		 * No proofs pending validation for {game}.
 		 */
 		NO_PROOFS_PENDING_FOR_GAME: (arg: { game: string }) => LocalizedString
+		/**
+		 * {count} proofs pending validation
+		 */
+		PROOFS_PENDING_COUNT: (arg: { count: number }) => LocalizedString
 		/**
 		 * Proof ID: {id}
 		 */
@@ -8908,6 +8922,10 @@ export type TranslationFunctions = {
 		 * No records found for this trck with the selected filters
 		 */
 		NO_RECORDS_FOUND: () => LocalizedString
+		/**
+		 * {count} records
+		 */
+		RECORD_COUNT: (arg: { count: number }) => LocalizedString
 		/**
 		 * Back to Game homepage
 		 */
@@ -9,7 +9,7 @@ export type AltFlag = {
   id: number;
   type: string;
   flag_key: string;
-  data: string;
+  data: string | null; // null when the list was fetched with include_data=false
   score: number;
   date: number;
   fingerprint_hash: string | null;
@@ -20,4 +20,5 @@ export type AltFlagList = {
   flags: AltFlag[];
   count: number;
   page_count: number;
+  next_cursor: string | null;
 };
@@ -26,10 +26,15 @@ export interface TimeTrial {
   player_name?: string | null;
   player_country_code?: string | null;
   validation_status: 'valid' | 'invalid' | 'unvalidated' | 'proofless';
+  rank?: number | null;
 }
 
 export interface TimeTrialListResponse {
   records: TimeTrial[];
+  count: number;
+  page: number;
+  page_count: number;
+  next_cursor: string | null;
 }
 
 export interface ProofWithValidationStatusResponseData {
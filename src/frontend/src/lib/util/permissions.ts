@@ -183,6 +183,7 @@ export const permissions = {
   create_db_backups: 'db_backup_create',
   submit_time_trial: 'time_trial_submit',
   validate_time_trial_proof: 'time_trial_proof_validate',
+  run_worker_jobs: 'worker_jobs_run',
 };
 
 export const team_permissions = {